@@ -1,14 +1,14 @@
+import threading
+
 import streamlit as st
-import pandas as pd
-import folium
-from streamlit_folium import st_folium
-import requests
-import plotly.express as px
-import plotly.graph_objects as go
-import random
-
-# Configuration
-API_URL = "http://127.0.0.1:8000/api/"
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import dashboard_metrics as perf
+import dashboard_client as api
+
+# pandas, folium and plotly are imported by the fragments that draw with them: the
+# title and the metrics show before they load (about a second on a cold start)
+
+# Configuration (API root: SMARTCITY_API_URL, see dashboard_client.py)
 st.set_page_config(page_title="Smart City Sousse", layout="wide")
 
 # --- CSS Styling ---
@@ -28,151 +28,128 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Anchors for valid land placement (Vehicles)
-DISTRICT_ANCHORS = [
-    (36.130, 10.380), # Ennfidha
-    (36.030, 10.500), # Hergla
-    (35.950, 10.470), # Sidi Bou Ali
-    (35.920, 10.300), # Kondar
-    (35.870, 10.560), # Akouda
-    (35.8750, 10.5400), # Kalaa Kebira
-    (35.8550, 10.6050), # Hammam Sousse
-    (35.825, 10.635), # Sousse Ville
-    (35.810, 10.620), # Sousse Jawhara
-    (35.800, 10.600), # Sousse Riadh
-    (35.800, 10.640), # Sidi Abdelhamid
-    (35.8180, 10.5500), # Kalaa Sghira
-    (35.780, 10.630), # Zaouia Ksiba Thrayet
-    (35.730, 10.580), # Msaken
-    (35.670, 10.320), # Sidi El Heni
-]
+# --- Instrumentation ---
+def record_fragment(record):
+    # Latest run of each fragment, shown in the debug panel
+    st.session_state.setdefault('perf', {})[record['fragment']] = record
 
 # --- Data Fetching ---
-def fetch_data(endpoint):
+@st.cache_data(ttl=5, show_spinner=False)
+def fetch_snapshot():
+    # One request per refresh: every fragment reads its own section of the snapshot
     try:
-        response = requests.get(f"{API_URL}{endpoint}/")
+        with perf.fetching():
+            response = api.get("dashboard/snapshot/")
+            perf.record_payload(len(response.content))
         if response.status_code == 200:
-            return pd.DataFrame(response.json())
-        return pd.DataFrame()
+            return response.json()
     except Exception as e:
         st.error(f"Error connecting to API: {e}")
-        return pd.DataFrame()
+    return {}
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_cube(group_by):
+    # Pre-aggregated maintenance measures (analytics/interventions/)
+    try:
+        response = api.get("analytics/interventions/", params={'group_by': group_by})
+        if response.status_code == 200:
+            return response.json()
+    except Exception as e:
+        st.error(f"Error connecting to API: {e}")
+    return {}
+
+def in_script(fn, *args):
+    # Runs fn on a fetch_many() worker thread with the script's context (st.cache_data, st.error)
+    ctx = get_script_run_ctx()
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return run
 
 # --- Fragment: Top Metrics ---
 @st.fragment
+@perf.instrument("metrics", record_fragment)
 def display_metrics():
     col1, col2, col3, col4 = st.columns(4)
 
-    df_sensors = fetch_data("capteurs")
-    df_interventions = fetch_data("interventions")
-    df_citizens = fetch_data("citoyens")
-    df_trips = fetch_data("trajets")
-
-    if not df_interventions.empty:
-        df_interventions['cout'] = pd.to_numeric(df_interventions['cout'], errors='coerce').fillna(0)
-    if not df_trips.empty:
-        df_trips['economie_co2'] = pd.to_numeric(df_trips['economie_co2'], errors='coerce').fillna(0)
-    if not df_citizens.empty:
-        df_citizens['score_ecologique'] = pd.to_numeric(df_citizens['score_ecologique'], errors='coerce').fillna(0)
-
-    with col1:
-        if not df_sensors.empty:
-            active_sensors = df_sensors[df_sensors['statut'] == 'actif'].shape[0]
-            st.markdown(f"""<div class="metric-card"><div class="metric-value">{active_sensors}/{df_sensors.shape[0]}</div><div class="metric-label">Capteurs Actifs</div></div>""", unsafe_allow_html=True)
-
-    with col2:
-        if not df_interventions.empty:
-            total_cost = df_interventions['cout'].sum()
-            st.markdown(f"""<div class="metric-card"><div class="metric-value">{total_cost:,.0f} TND</div><div class="metric-label">Coût Maintenance (Annuel)</div></div>""", unsafe_allow_html=True)
-
-    with col3:
-        if not df_citizens.empty:
-            avg_score = df_citizens['score_ecologique'].mean()
-            st.markdown(f"""<div class="metric-card"><div class="metric-value">{avg_score:.1f}</div><div class="metric-label">Score Écologique Moyen</div></div>""", unsafe_allow_html=True)
-
-    with col4:
-        if not df_trips.empty:
-            total_co2 = df_trips['economie_co2'].sum()
-            st.markdown(f"""<div class="metric-card"><div class="metric-value">{total_co2:,.1f} kg</div><div class="metric-label">CO2 Économisé (Trajets)</div></div>""", unsafe_allow_html=True)
+    kpis = fetch_snapshot().get('kpis')
+
+    perf.phase("render")
+    if kpis:
+        with col1:
+            st.markdown(f"""<div class="metric-card"><div class="metric-value">{kpis['capteurs_actifs']}/{kpis['capteurs_total']}</div><div class="metric-label">Capteurs Actifs</div></div>""", unsafe_allow_html=True)
+        with col2:
+            st.markdown(f"""<div class="metric-card"><div class="metric-value">{kpis['cout_maintenance']:,.0f} TND</div><div class="metric-label">Coût Maintenance (Annuel)</div></div>""", unsafe_allow_html=True)
+        with col3:
+            st.markdown(f"""<div class="metric-card"><div class="metric-value">{kpis['score_ecologique_moyen']:.1f}</div><div class="metric-label">Score Écologique Moyen</div></div>""", unsafe_allow_html=True)
+        with col4:
+            st.markdown(f"""<div class="metric-card"><div class="metric-value">{kpis['economie_co2']:,.1f} kg</div><div class="metric-label">CO2 Économisé (Trajets)</div></div>""", unsafe_allow_html=True)
 
     st.divider()
 
 # --- Fragment: Map ---
+HEATMAP_LAYERS = [("qualite_air", "Qualité de l'air (AQI)", True), ("trafic", "Trafic", False)]
+SENSOR_ICONS = {'qualité_air': "leaf", 'trafic': "road", 'énergie': "bolt", 'déchets': "trash", 'éclairage': "lightbulb"}
+
 @st.fragment
+@perf.instrument("map", record_fragment)
 def display_map_only():
     st.subheader("📍 Carte en Temps Réel (Gouvernorat de Sousse)")
     
-    df_sensors = fetch_data("capteurs")
-    df_vehicles = fetch_data("vehicules")
-    
-    if not df_sensors.empty:
-        df_sensors['latitude'] = pd.to_numeric(df_sensors['latitude'], errors='coerce')
-        df_sensors['longitude'] = pd.to_numeric(df_sensors['longitude'], errors='coerce')
+    carte = fetch_snapshot().get('carte', {})
+    sensors = carte.get('capteurs', {})
+    vehicles = carte.get('vehicules', {})
 
-    m = folium.Map(location=[35.8500, 10.6000], zoom_start=10, tiles="CartoDB dark_matter")
-
-    if not df_sensors.empty:
-        for _, row in df_sensors.iterrows():
-            color = "green" if row['statut'] == 'actif' else "red" if row['statut'] == 'hors_service' else "orange"
-            
-            if row['type_capteur'] == 'qualité_air': icon = "leaf"
-            elif row['type_capteur'] == 'trafic': icon = "road"
-            elif row['type_capteur'] == 'énergie': icon = "bolt"
-            elif row['type_capteur'] == 'déchets': icon = "trash"
-            elif row['type_capteur'] == 'éclairage': icon = "lightbulb"
-            else: icon = "info-circle"
-            
-            folium.Marker(
-                location=[row['latitude'], row['longitude']],
-                tooltip=f"<b>Type:</b> {row['type_capteur']}<br><b>Statut:</b> {row['statut']}<br><b>ID:</b> {row['id_capteur']}",
-                icon=folium.Icon(color=color, icon=icon, prefix='fa')
-            ).add_to(m)
-
-    if not df_vehicles.empty:
-        # Get simulation step for movement
-        step = st.session_state.get('sim_step', 0)
-        
-        for _, row in df_vehicles.iterrows():
-            # Smart Movement: Change anchor/offset based on simulation step
-            # Use hash of plate + step to deterministically move them per click
-            move_seed = hash(row['plaque_immatriculation'] + str(step))
-            
-            # Pick a new district anchor based on the seed
-            anchor_idx = move_seed % len(DISTRICT_ANCHORS)
-            anchor = DISTRICT_ANCHORS[anchor_idx]
-            
-            # Calculate small offset (jitter)
-            lat_off = (move_seed % 100 - 50) / 8000.0
-            lon_off = ((move_seed >> 2) % 100 - 50) / 8000.0
-            
-            folium.Marker(
-                location=[anchor[0] + lat_off, anchor[1] + lon_off],
-                tooltip=f"Véhicule {row['plaque_immatriculation']}",
-                icon=folium.Icon(color="blue", icon="car", prefix="fa")
-            ).add_to(m)
+    perf.phase("render")
+    import folium
+    from streamlit_folium import st_folium
 
+    m = folium.Map(location=[35.8500, 10.6000], zoom_start=10, tiles="CartoDB dark_matter")
+    # Heatmaps are interpolated and rendered server-side: the browser only loads PNG tiles
+    for layer, name, show in HEATMAP_LAYERS:
+        folium.TileLayer(
+            tiles=api.url_for(f"heatmap/{layer}/") + "{z}/{x}/{y}.png", attr="Smart City Sousse",
+            name=name, overlay=True, show=show, min_zoom=8, max_zoom=16,
+        ).add_to(m)
+
+    for id_capteur, lat, lon, type_capteur, statut in zip(
+        sensors.get('id', []), sensors.get('lat', []), sensors.get('lon', []), sensors.get('type', []), sensors.get('statut', [])
+    ):
+        color = "green" if statut == 'actif' else "red" if statut == 'hors_service' else "orange"
+        folium.Marker(
+            location=[lat, lon],
+            tooltip=f"<b>Type:</b> {type_capteur}<br><b>Statut:</b> {statut}<br><b>ID:</b> {id_capteur}",
+            icon=folium.Icon(color=color, icon=SENSOR_ICONS.get(type_capteur, "info-circle"), prefix='fa')
+        ).add_to(m)
+
+    # Positions are advanced server-side along each vehicle's current trajet
+    for plaque, lat, lon in zip(vehicles.get('plaques', []), vehicles.get('lat', []), vehicles.get('lon', [])):
+        folium.Marker(
+            location=[lat, lon],
+            tooltip=f"Véhicule {plaque}",
+            icon=folium.Icon(color="blue", icon="car", prefix="fa")
+        ).add_to(m)
+
+    folium.LayerControl(collapsed=True).add_to(m)
     st_folium(m, height=500, use_container_width=True, returned_objects=[])
 
 # --- Fragment: Sidebar Table ---
 @st.fragment
+@perf.instrument("sidebar_table", record_fragment)
 def display_sidebar_table():
     st.subheader("⚠️ État des Zones")
     
-    df_sensors = fetch_data("capteurs")
+    import pandas as pd
+
+    # Already sorted by failure rate, worst first
+    zones = pd.DataFrame(fetch_snapshot().get('zones', []))
     
-    if not df_sensors.empty:
-        total_counts = df_sensors.groupby('quartier').size().reset_index(name='total')
-        failure_counts = df_sensors[df_sensors['statut'] != 'actif'].groupby('quartier').size().reset_index(name='failed')
-        
-        merged = total_counts.merge(failure_counts, on='quartier', how='left').fillna(0)
-        merged['failure_rate'] = (merged['failed'] / merged['total'])
-        
-        # Sort by Failure Rate Descending (Worst First)
-        merged_sorted = merged.sort_values('failure_rate', ascending=False)
-        merged_sorted['Pannes'] = (merged_sorted['failure_rate'] * 100).astype(int).astype(str) + "%"
+    if not zones.empty:
+        zones['Pannes'] = (zones['taux_panne'] * 100).astype(int).astype(str) + "%"
         
+        perf.phase("render")
         st.dataframe(
-            merged_sorted[['quartier', 'Pannes']],
+            zones[['quartier', 'Pannes']],
             use_container_width=True,
             hide_index=True,
             column_config={
@@ -182,22 +159,25 @@ def display_sidebar_table():
         )
 
 # --- Fragment: Analytics ---
+STATUS_COLORS = {'actif': '#00cc96', 'en_maintenance': '#ffa15a', 'hors_service': '#ef553b'}
+CUBE_DIMENSIONS = ['type_intervention', 'quartier', 'type_capteur', 'proprietaire', 'technicien']
+
 @st.fragment
+@perf.instrument("analytics", record_fragment)
 def display_analytics():
     st.divider()
     st.subheader("Analyses Approfondies")
     
-    df_sensors = fetch_data("capteurs")
-    df_interventions = fetch_data("interventions")
-    df_citizens = fetch_data("citoyens")
-    df_trips = fetch_data("trajets")
-    
-    if not df_interventions.empty:
-        df_interventions['cout'] = pd.to_numeric(df_interventions['cout'], errors='coerce').fillna(0)
-    if not df_trips.empty:
-        df_trips['economie_co2'] = pd.to_numeric(df_trips['economie_co2'], errors='coerce').fillna(0)
-    if not df_citizens.empty:
-        df_citizens['score_ecologique'] = pd.to_numeric(df_citizens['score_ecologique'], errors='coerce').fillna(0)
+    import folium
+    import pandas as pd
+    import plotly.express as px
+    from streamlit_folium import st_folium
+
+    # The snapshot and the cube breakdown are fetched together (the dimension picked last run)
+    dimension = st.session_state.get('cube_dimension', CUBE_DIMENSIONS[0])
+    with perf.fetching():
+        snapshot, cube = api.fetch_many([in_script(fetch_snapshot), in_script(fetch_cube, f"mois,{dimension}")])
+    zones = pd.DataFrame(snapshot.get('zones', []))
 
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "🏭 Pollution", "📡 Disponibilité", "🌱 Citoyens", "🔧 Interventions", "🚗 Trajets"
@@ -205,141 +185,123 @@ def display_analytics():
 
     with tab1: # Pollution
         st.caption("ℹ️ Ces statistiques représentent les dernières 24 heures.")
-        if not df_sensors.empty:
-            air_sensors = df_sensors[df_sensors['type_capteur'] == 'qualité_air'].copy()
-            if not air_sensors.empty:
-                def simulate_aqi(row):
-                    base = 50
-                    if row['quartier'] == 'Medina': base = 120
-                    elif row['quartier'] == 'Cité Riadh': base = 100
-                    return base + (hash(str(row['id_capteur'])) % 41 - 20)
-                air_sensors['AQI'] = air_sensors.apply(simulate_aqi, axis=1)
-                district_aqi = air_sensors.groupby('quartier')['AQI'].mean().reset_index()
-                fig_aqi = px.bar(district_aqi.sort_values('AQI', ascending=False), x='quartier', y='AQI', color='AQI', color_continuous_scale='RdYlGn_r')
-                st.plotly_chart(fig_aqi, use_container_width=True)
+        district_aqi = pd.DataFrame(snapshot.get('qualite_air', []))
+        if not district_aqi.empty:
+            perf.phase("render")
+            fig_aqi = px.bar(district_aqi, x='quartier', y='aqi', color='aqi', color_continuous_scale='RdYlGn_r', hover_data=['dominant'], labels={'aqi': 'AQI', 'dominant': 'Polluant dominant'})
+            st.plotly_chart(fig_aqi, use_container_width=True)
 
     with tab2: # Availability
+        perf.phase("transform")
         st.markdown("### Disponibilité des Capteurs (Global & Par Zone)")
-        if not df_sensors.empty:
+        if not zones.empty:
+            statuts = list(STATUS_COLORS)
             col_graph1, col_graph2 = st.columns([1, 2])
             
             with col_graph1: # Global Pie
-                global_status = df_sensors.groupby('statut').size().reset_index(name='count')
+                global_status = pd.DataFrame({'statut': statuts, 'count': [zones[s].sum() for s in statuts]})
+                perf.phase("render")
                 fig_pie = px.pie(
                     global_status, 
                     values='count', names='statut', title="État Global",
-                    color='statut', color_discrete_map={'actif': '#00cc96', 'en_maintenance': '#ffa15a', 'hors_service': '#ef553b'},
+                    color='statut', color_discrete_map=STATUS_COLORS,
                     hole=0.4
                 )
                 st.plotly_chart(fig_pie, use_container_width=True)
 
             with col_graph2: # District Bar
-                availability = df_sensors.groupby(['quartier', 'statut']).size().reset_index(name='count')
-                total_per_dist = df_sensors.groupby('quartier').size().reset_index(name='total')
-                availability = availability.merge(total_per_dist, on='quartier')
+                perf.phase("transform")
+                availability = zones.melt(id_vars=['quartier', 'total'], value_vars=statuts, var_name='statut', value_name='count')
                 availability['percentage'] = (availability['count'] / availability['total'] * 100).round(1)
-                
                 # Sort by highest active %
-                actif_rows = availability[availability['statut'] == 'actif']
-                sorted_districts = actif_rows.sort_values('percentage', ascending=False)['quartier'].tolist()
-                all_d = availability['quartier'].unique().tolist()
-                for d in all_d: 
-                    if d not in sorted_districts: sorted_districts.append(d)
+                sorted_districts = zones.sort_values('taux_panne')['quartier'].tolist()
 
+                perf.phase("render")
                 fig_avail = px.bar(
                     availability, x='quartier', y='percentage', color='statut',
                     title="Détail par Arrondissement (%)",
                     text='percentage',
-                    color_discrete_map={'actif': '#00cc96', 'en_maintenance': '#ffa15a', 'hors_service': '#ef553b'},
+                    color_discrete_map=STATUS_COLORS,
                     category_orders={'quartier': sorted_districts}
                 )
                 fig_avail.update_traces(texttemplate='%{text}%', textposition='inside')
                 st.plotly_chart(fig_avail, use_container_width=True)
 
     with tab3: # Citizens
+        perf.phase("transform")
         st.markdown("### Top Citoyens")
-        if not df_citizens.empty:
-            unique_citizens = df_citizens.sort_values('score_ecologique', ascending=False).drop_duplicates(subset=['nom'])
-            top_citizens = unique_citizens.head(10)
-            
+        top_citizens = pd.DataFrame(snapshot.get('top_citoyens', []))
+        if not top_citizens.empty:
+            perf.phase("render")
             fig_citizens = px.bar(
                 top_citizens.sort_values('score_ecologique', ascending=True),
                 x='score_ecologique', y='nom', orientation='h', color='score_ecologique',
                 title="Classement (Score Écologique)", color_continuous_scale='Teal'
             )
             st.plotly_chart(fig_citizens, use_container_width=True)
-            st.dataframe(top_citizens[['nom', 'email', 'preferences_mobilite', 'score_ecologique']], use_container_width=True, hide_index=True)
+            st.dataframe(top_citizens[['rang', 'nom', 'email', 'preferences_mobilite', 'score_ecologique']], use_container_width=True, hide_index=True)
 
     with tab4: # Interventions
+        perf.phase("transform")
         st.markdown("### Interventions")
-        if not df_interventions.empty:
-            predictive = df_interventions[df_interventions['type_intervention'] == 'prédictive']
+        interventions = snapshot.get('interventions')
+        if interventions:
+            perf.phase("render")
             col_m1, col_m2 = st.columns(2)
-            with col_m1: st.metric("Nombre (Prédictif)", predictive.shape[0])
-            with col_m2: st.metric("Gain Est.", f"{predictive['cout'].sum() * 1.5:,.0f} TND")
+            with col_m1: st.metric("Nombre (Prédictif)", interventions['predictives'])
+            with col_m2: st.metric("Gain Est.", f"{interventions['cout_predictif'] * 1.5:,.0f} TND")
             
-            if not predictive.empty:
-                predictive['date'] = pd.to_datetime(predictive['date_heure']).dt.date
-                daily_savings = predictive.groupby('date')['cout'].sum().reset_index()
+            daily_savings = pd.DataFrame(interventions['cout_journalier'])
+            if not daily_savings.empty:
                 fig_pred = px.line(daily_savings, x='date', y='cout', title="Tendances des Coûts")
                 st.plotly_chart(fig_pred, use_container_width=True)
 
+        st.selectbox("Coûts mensuels par", CUBE_DIMENSIONS, key='cube_dimension')
+        breakdown = pd.DataFrame(cube.get('lignes', []))
+        if not breakdown.empty:
+            perf.phase("render")
+            fig_cube = px.bar(breakdown, x='mois', y='cout', color=dimension, hover_data=['nombre', 'duree', 'impact_co2'], title="Coûts de Maintenance (TND)")
+            st.plotly_chart(fig_cube, use_container_width=True)
+
     with tab5: # Trips
+        perf.phase("transform")
         st.markdown("### Trajets Écologiques")
-        if not df_trips.empty:
-            top_trips = df_trips.sort_values('economie_co2', ascending=False).head(5)
-            st.dataframe(top_trips[['origine', 'destination', 'duree', 'economie_co2']], use_container_width=True)
+        df_daily = pd.DataFrame(snapshot.get('journalier', []))
+        if not df_daily.empty:
+            perf.phase("render")
+            fig_daily = px.bar(df_daily, x='jour', y='economie_co2', hover_data=['trajets', 'utilisation'], title="CO2 Économisé par Jour (kg)")
+            st.plotly_chart(fig_daily, use_container_width=True)
+        top_trips = snapshot.get('top_trajets', [])
+        if top_trips:
+            perf.phase("render")
+            st.dataframe(pd.DataFrame(top_trips)[['origine', 'destination', 'duree', 'economie_co2']], use_container_width=True)
             
             m_trips = folium.Map(location=[35.83, 10.61], zoom_start=11, tiles="CartoDB dark_matter")
             colors = ['green', 'lime', 'yellow', 'orange', 'red']
             
-            for i, (_, row) in enumerate(top_trips.iterrows()):
-                try:
-                    def get_coords_fuzzy(address_str):
-                        address_lower = address_str.lower()
-                        district_map = {
-                            "ennfidha": (36.130, 10.380), "hergla": (36.030, 10.500), 
-                            "sidi bou ali": (35.950, 10.470), "kondar": (35.920, 10.300), 
-                            "akouda": (35.870, 10.560), "kalaa kebira": (35.8750, 10.5400), 
-                            "hammam sousse": (35.8550, 10.6050), "sousse ville": (35.825, 10.635), 
-                            "medina": (35.825, 10.635), "jawhara": (35.810, 10.620), "sousse jawhara": (35.810, 10.620),
-                            "riadh": (35.800, 10.600), "sousse riadh": (35.800, 10.600), "cité riadh": (35.800, 10.600),
-                            "sidi abdelhamid": (35.800, 10.640), "kalaa sghira": (35.8180, 10.5500), 
-                            "zaouia": (35.780, 10.630), "ksiba": (35.780, 10.630), "thrayet": (35.780, 10.630),
-                            "msaken": (35.730, 10.580), "sidi el heni": (35.670, 10.320)
-                        }
-                        for name, coords in district_map.items():
-                            if name in address_lower: return coords
-                        return (35.825, 10.635)
-
-                    start_coords = get_coords_fuzzy(row['origine'])
-                    end_coords = get_coords_fuzzy(row['destination'])
-                    
-                    # Independent Jitter
-                    h_s = hash(row['origine'])
-                    start_coords = (start_coords[0] + (h_s % 100 - 50)/7000.0, start_coords[1] + ((h_s >> 2) % 100 - 50)/7000.0)
-                    h_e = hash(row['destination'])
-                    end_coords = (end_coords[0] + (h_e % 100 - 50)/7000.0, end_coords[1] + ((h_e >> 2) % 100 - 50)/7000.0)
-                    
-                    folium.Marker(start_coords, icon=folium.Icon(color="green", icon="play", prefix='fa'), tooltip=f"Départ: {row['origine']}").add_to(m_trips)
-                    folium.Marker(end_coords, icon=folium.Icon(color="red", icon="stop", prefix='fa'), tooltip=f"Arrivée: {row['destination']}").add_to(m_trips)
-                    folium.PolyLine([start_coords, end_coords], color=colors[i%5], weight=4, tooltip=f"Trajet {i+1}: {row['economie_co2']}kg CO2").add_to(m_trips)
-                except: pass
-            
+            # Endpoints come resolved to coordinates by the backend
+            for i, trip in enumerate(top_trips):
+                start, end = trip['depart'], trip['arrivee']
+                # Small fixed offset per rank so trips between the same districts don't overlap
+                off = (i - 2) / 500.0
+                start_coords = (start[0] + off, start[1] + off)
+                end_coords = (end[0] - off, end[1] + off)
+
+                folium.Marker(start_coords, icon=folium.Icon(color="green", icon="play", prefix='fa'), tooltip=f"Départ: {trip['origine']}").add_to(m_trips)
+                folium.Marker(end_coords, icon=folium.Icon(color="red", icon="stop", prefix='fa'), tooltip=f"Arrivée: {trip['destination']}").add_to(m_trips)
+                folium.PolyLine([start_coords, end_coords], color=colors[i%5], weight=4, tooltip=f"Trajet {i+1}: {trip['economie_co2']}kg CO2").add_to(m_trips)
+
             st_folium(m_trips, height=400, use_container_width=True)
 
 # --- Main Layout ---
-if 'sim_step' not in st.session_state:
-    st.session_state.sim_step = 0
-
 st.title("Smart City Sousse")
 
 if st.button("🔄 Actualiser (Smart Sim)"):
     # Trigger Backend Simulation Step
     try:
-        requests.post(f"{API_URL}simulate/")
+        api.post("simulate/")
+        fetch_snapshot.clear()
         st.toast("Simulation Step Triggered! 🚦")
-        st.session_state.sim_step += 1 # Advance vehicle step
     except:
         st.error("Failed to trigger simulation.")
     st.rerun()
@@ -358,3 +320,16 @@ with col_table:
 
 # 3. Analytics
 display_analytics()
+
+# 4. Debug: per-fragment timings
+with st.expander("⏱️ Performance (debug)"):
+    import pandas as pd
+
+    latest = st.session_state.get('perf', {})
+    if latest:
+        st.markdown("**Dernière exécution**")
+        st.dataframe(pd.DataFrame(latest.values()).set_index('fragment'), use_container_width=True)
+    history = perf.summarize(perf.load_log())
+    if history:
+        st.markdown(f"**Historique** (`{perf.LOG_PATH}`, toutes sessions)")
+        st.dataframe(pd.DataFrame(history).set_index('fragment'), use_container_width=True)
@@ -0,0 +1,110 @@
+"""
+HTTP client used by dashboard.py.
+
+- One process-wide requests.Session: keep-alive connection pool shared by every
+  fragment and every Streamlit session, with timeouts and retry/backoff on idempotent
+  requests.
+- Responses are decompressed transparently: gzip/deflate always, brotli when the
+  `brotli` package is installed (urllib3 then advertises and decodes "br").
+- get() coalesces identical in-flight GETs: concurrent callers asking for the same
+  URL wait on one HTTP call and share its response (or its exception). The fetches
+  cached with st.cache_data in dashboard.py are already computed once per key; this
+  covers the callers outside those caches (scripts, uncached fragments).
+- fetch_many() runs the several fetches of one fragment in parallel on a small
+  thread pool: a session's fragments run one after another, so only this overlaps
+  their requests.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+API_URL = os.environ.get("SMARTCITY_API_URL", "http://127.0.0.1:8000/api/")
+TIMEOUT = (3.05, 30)  # (connect, read) seconds
+POOL_SIZE = 8
+RETRY = Retry(
+    total=3, backoff_factor=0.3,
+    status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET", "HEAD"}),
+)
+# "gzip,deflate", plus "br" when a brotli decoder is importable
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+_inflight = {}
+
+
+def session():
+    global _session
+    with _lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=RETRY)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            _session = s
+        return _session
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="dashboard-http")
+        return _executor
+
+
+def url_for(endpoint):
+    return endpoint if endpoint.startswith(("http://", "https://")) else API_URL + endpoint.lstrip("/")
+
+
+def _key(url, params):
+    return url, tuple(sorted((params or {}).items()))
+
+
+def get(endpoint, params=None):
+    """GET with in-flight coalescing; the body is read before the response is shared."""
+    url = url_for(endpoint)
+    key = _key(url, params)
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result()
+
+    try:
+        response = session().get(url, params=params, timeout=TIMEOUT)
+        response.content  # Load (and decompress) the body once, for every waiter
+        future.set_result(response)
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+    return future.result()
+
+
+def fetch_many(calls):
+    """
+    Runs `calls` in parallel and returns their results in order. A call is an endpoint to
+    GET or a callable without arguments (e.g. a cached fetch function). Each runs in a
+    copy of the caller's context (contextvars); the first failure is raised once the
+    calls before it are done.
+    """
+    calls = [c if callable(c) else partial(get, c) for c in calls]
+    futures = [_pool().submit(contextvars.copy_context().run, c) for c in calls]
+    return [f.result() for f in futures]
+
+
+def post(endpoint, **kwargs):
+    # Not retried: POSTs are not idempotent
+    return session().post(url_for(endpoint), timeout=TIMEOUT, **kwargs)
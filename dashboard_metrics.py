@@ -0,0 +1,143 @@
+"""
+Render-time instrumentation for dashboard.py.
+
+Each fragment wrapped with @instrument(name, sink) gets a FragmentTimer that splits
+its wall time into three phases:
+- fetch: HTTP calls made through fetch_data (also counts requests and payload bytes),
+- transform: pandas work,
+- render: building and emitting folium/plotly/streamlit elements.
+
+The fragment switches phase with phase("render") / phase("transform"); fetches switch
+to "fetch" and back on their own. Every finished run is handed to the sink and
+appended as one JSON line to LOG_PATH so hot fragments can be compared across sessions.
+"""
+import contextvars
+import functools
+import json
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+LOG_PATH = os.environ.get("DASHBOARD_METRICS_LOG", "dashboard_metrics.jsonl")
+PHASES = ("fetch", "transform", "render")
+
+_current = contextvars.ContextVar("fragment_timer", default=None)
+
+
+class FragmentTimer:
+    def __init__(self, name):
+        self.name = name
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.requests = 0
+        self.payload_bytes = 0
+        self.started = self._since = time.perf_counter()
+        self._phase = "transform"
+
+    def switch(self, phase):
+        """Charges the time since the last switch to the current phase; returns the previous phase."""
+        now = time.perf_counter()
+        self.durations[self._phase] += now - self._since
+        previous, self._phase, self._since = self._phase, phase, now
+        return previous
+
+    def finish(self):
+        self.switch(self._phase)
+        record = {"fragment": self.name, "ts": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        record.update({f"{p}_s": round(d, 4) for p, d in self.durations.items()})
+        record["total_s"] = round(time.perf_counter() - self.started, 4)
+        record["requests"] = self.requests
+        record["payload_bytes"] = self.payload_bytes
+        return record
+
+
+def phase(name):
+    """Switches the running fragment to `name` ("transform" or "render")."""
+    timer = _current.get()
+    if timer is not None:
+        timer.switch(name)
+
+
+@contextmanager
+def fetching():
+    """Charges the enclosed block to the "fetch" phase."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    previous = timer.switch("fetch")
+    try:
+        yield
+    finally:
+        timer.switch(previous)
+
+
+def record_payload(nbytes):
+    timer = _current.get()
+    if timer is not None:
+        timer.requests += 1
+        timer.payload_bytes += nbytes
+
+
+def append_log(record, path=None):
+    try:
+        with open(path or LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass  # Metrics must never break the dashboard
+
+
+def instrument(name, sink=None):
+    """Decorator timing every run of a fragment; the record goes to sink() and the log."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            timer = FragmentTimer(name)
+            token = _current.set(timer)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current.reset(token)
+                record = timer.finish()
+                if sink is not None:
+                    sink(record)
+                append_log(record)
+        return wrapper
+    return decorator
+
+
+def load_log(path=None, limit=5000):
+    """Last `limit` records of the metrics log."""
+    try:
+        with open(path or LOG_PATH, encoding="utf-8") as f:
+            lines = f.readlines()[-limit:]
+    except OSError:
+        return []
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def summarize(records):
+    """Per-fragment run count, p50/p95 total time and mean phase split, slowest first."""
+    by_fragment = {}
+    for r in records:
+        by_fragment.setdefault(r["fragment"], []).append(r)
+    rows = []
+    for fragment, runs in by_fragment.items():
+        totals = sorted(r["total_s"] for r in runs)
+        row = {
+            "fragment": fragment,
+            "runs": len(runs),
+            "p50_s": round(statistics.median(totals), 3),
+            "p95_s": round(totals[min(int(len(totals) * 0.95), len(totals) - 1)], 3),
+        }
+        for p in PHASES:
+            row[f"{p}_s"] = round(statistics.fmean(r.get(f"{p}_s", 0.0) for r in runs), 3)
+        row["payload_kb"] = round(statistics.fmean(r.get("payload_bytes", 0) for r in runs) / 1024, 1)
+        rows.append(row)
+    return sorted(rows, key=lambda r: r["p95_s"], reverse=True)
@@ -13,6 +13,7 @@ django.setup()
 from smartcity_backend.api.models import (
     Technicien, Capteur, Intervention, Citoyen, VehiculeAutonome, Trajet, Proprietaire
 )
+from smartcity_backend.api.districts import registry, get_gaussian_coords
 
 fake = Faker("fr_FR")
 
@@ -31,27 +32,6 @@ SOUSSE_STREETS = [
     "Rue de la République", "Av. Leopold Senghor"
 ]
 
-# Center Coordinates for Sousse Municipalities (Lat, Lon)
-# Bouficha removed as requested.
-# Coords adjusted to avoid water bodies (Sebkhet, Sea)
-DISTRICT_CENTERS = {
-    "Ennfidha": (36.130, 10.380),
-    "Hergla": (36.030, 10.500), # Moved slightly West
-    "Sidi Bou Ali": (35.950, 10.470),
-    "Kondar": (35.920, 10.300),
-    "Akouda": (35.870, 10.560),
-    "Kalaa Kebira": (35.870, 10.530),
-    "Hammam Sousse": (35.860, 10.590), # Moved slightly West
-    "Sousse Ville": (35.825, 10.635),
-    "Sousse Jawhara": (35.810, 10.620),
-    "Sousse Riadh": (35.800, 10.600),
-    "Sidi Abdelhamid": (35.800, 10.640), # Moved slightly West
-    "Kalaa Sghira": (35.820, 10.550),
-    "Zaouia Ksiba Thrayet": (35.780, 10.630),
-    "Msaken": (35.730, 10.580),
-    "Sidi El Heni": (35.670, 10.320), # Moved East of Sebkhet
-}
-
 def get_tunisian_name():
     return f"{random.choice(TUNISIAN_FIRST_NAMES)} {random.choice(TUNISIAN_LAST_NAMES)}"
 
@@ -61,16 +41,6 @@ def get_tunisian_phone():
 def get_sousse_address():
     return f"{random.randint(1, 150)}, {random.choice(SOUSSE_STREETS)}, {random.choice(['Sousse', 'Hammam Sousse', 'Kantaoui'])}"
 
-def get_gaussian_coords(district):
-    if district not in DISTRICT_CENTERS:
-        district = "Sousse Ville"
-    center_lat, center_lon = DISTRICT_CENTERS[district]
-    
-    # Reduced sigma to 0.01 to keep points tighter to centers and avoid water
-    lat = random.gauss(center_lat, 0.01)
-    lon = random.gauss(center_lon, 0.01)
-    return lat, lon
-
 def calculate_duration(lat1, lon1, lat2, lon2):
     # Haversine approx (or simple Euclidean for short distances)
     # 1 deg lat ~= 111 km
@@ -108,7 +78,7 @@ def generate_data():
     print("- Generating Sensors...")
     sensors = []
     sensor_types = ["qualité_air", "trafic", "énergie", "déchets", "éclairage"]
-    districts = list(DISTRICT_CENTERS.keys())
+    districts = list(registry().names)
     
     # Generate more sensors (100) to cover the larger area
     for _ in range(100):
@@ -197,7 +167,8 @@ def generate_data():
                 vehicule=random.choice(vehicles),
                 origine=f"{get_sousse_address()} ({q_start})",
                 destination=f"{get_sousse_address()} ({q_end})",
-                duree=duration,
+                date_depart=start,
+                date_arrivee=end,
                 economie_co2=round(random.uniform(1.0, 15.0), 2)
             )
 
@@ -19,6 +19,9 @@ cleanup() {
     echo -e "${RED}Stopping all services...${NC}"
     # Find and kill our specific processes
     pkill -f "manage.py runserver"
+    pkill -f "manage.py run_workers"
+    pkill -f "manage.py detect_anomalies"
+    pkill -f "manage.py retention"
     pkill -f "simulate_realtime.py"
     pkill -f "streamlit run dashboard.py"
     echo -e "${BLUE}Cleanup complete.${NC}"
@@ -42,6 +45,10 @@ else
     source venv/bin/activate
 fi
 
+# The API, the workers, the detector, retention and the simulator all write: they must
+# share the response cache so each write invalidates the API's copies (see api/caching.py)
+export SMARTCITY_CACHE="${SMARTCITY_CACHE:-file}"
+
 # Run migrations to be sure
 echo -e "${BLUE}Checking database...${NC}"
 python manage.py makemigrations
@@ -65,6 +72,21 @@ for i in {1..10}; do
 done
 echo ""
 
+# Start Background Job Workers (queued simulations, data generation)
+echo -e "${GREEN}Starting Job Workers...${NC}"
+python manage.py run_workers --workers 2 > workers.log 2>&1 &
+WORKERS_PID=$!
+
+# Start Anomaly Detector (tails readings and status changes, writes alerts)
+echo -e "${GREEN}Starting Anomaly Detector...${NC}"
+python manage.py detect_anomalies > anomalies.log 2>&1 &
+DETECTOR_PID=$!
+
+# Start Retention (archives old rows and vacuums the database, hourly)
+echo -e "${GREEN}Starting Retention...${NC}"
+python manage.py retention --intervalle 3600 --pause 0.5 > retention.log 2>&1 &
+RETENTION_PID=$!
+
 # Start Simulation
 echo -e "${GREEN}Starting Simulation...${NC}"
 python simulate_realtime.py > simulation.log 2>&1 &
@@ -79,6 +101,9 @@ echo -e "${BLUE}----------------------------------------${NC}"
 echo -e "${GREEN}✅ SYSTEM LAUNCHED SUCCESSFULLY${NC}"
 echo -e "${BLUE}----------------------------------------${NC}"
 echo -e "Backend PID: $BACKEND_PID"
+echo -e "Workers PID: $WORKERS_PID"
+echo -e "Detector PID: $DETECTOR_PID"
+echo -e "Retention PID: $RETENTION_PID"
 echo -e "Simulation PID: $SIM_PID"
 echo -e "Dashboard PID: $DASH_PID"
 echo -e ""
@@ -92,7 +117,7 @@ echo -e "${BLUE}----------------------------------------${NC}"
 # tail -f dashboard.log &
 
 # Trap for cleanup
-trap "kill $BACKEND_PID $SIM_PID $DASH_PID; exit" SIGINT SIGTERM
+trap "kill $BACKEND_PID $WORKERS_PID $DETECTOR_PID $RETENTION_PID $SIM_PID $DASH_PID; exit" SIGINT SIGTERM
 
 # Keep script running
 wait
@@ -11,34 +11,8 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smartcity_backend.settings")
 django.setup()
 
 from smartcity_backend.api.models import Capteur, Intervention, Trajet, VehiculeAutonome, Technicien
-
-# Center Coordinates for Sousse Municipalities (Lat, Lon)
-# Bouficha removed as requested.
-DISTRICT_CENTERS = {
-    "Ennfidha": (36.130, 10.380),
-    "Hergla": (36.030, 10.500),
-    "Sidi Bou Ali": (35.950, 10.470),
-    "Kondar": (35.920, 10.300),
-    "Akouda": (35.870, 10.560),
-    "Kalaa Kebira": (35.870, 10.530),
-    "Hammam Sousse": (35.860, 10.590),
-    "Sousse Ville": (35.825, 10.635),
-    "Sousse Jawhara": (35.810, 10.620),
-    "Sousse Riadh": (35.800, 10.600),
-    "Sidi Abdelhamid": (35.800, 10.640),
-    "Kalaa Sghira": (35.820, 10.550),
-    "Zaouia Ksiba Thrayet": (35.780, 10.630),
-    "Msaken": (35.730, 10.580),
-    "Sidi El Heni": (35.670, 10.320),
-}
-
-def get_gaussian_coords(district):
-    if district not in DISTRICT_CENTERS:
-        district = "Sousse Ville"
-    center_lat, center_lon = DISTRICT_CENTERS[district]
-    lat = random.gauss(center_lat, 0.01)
-    lon = random.gauss(center_lon, 0.01)
-    return lat, lon
+from smartcity_backend.api import fleet
+from smartcity_backend.api.districts import registry, get_gaussian_coords
 
 def calculate_duration(lat1, lon1, lat2, lon2):
     dist_km = math.sqrt((lat2-lat1)**2 + (lon2-lon1)**2) * 111
@@ -68,8 +42,8 @@ def simulate():
                     v = random.choice(vehicles)
                     start = timezone.now()
                     
-                    q_start = random.choice(list(DISTRICT_CENTERS.keys()))
-                    q_end = random.choice(list(DISTRICT_CENTERS.keys()))
+                    q_start = random.choice(registry().names)
+                    q_end = random.choice(registry().names)
                     lat1, lon1 = get_gaussian_coords(q_start)
                     lat2, lon2 = get_gaussian_coords(q_end)
                     
@@ -80,6 +54,7 @@ def simulate():
                         vehicule=v,
                         origine=f"Simulated ({q_start})",
                         destination=f"Simulated ({q_end})",
+                        date_depart=start,
                         duree=duration,
                         economie_co2=round(random.uniform(0.5, 5.0), 2)
                     )
@@ -100,6 +75,9 @@ def simulate():
                     )
                     print(f"[INTERVENTION] New intervention on {s.type_capteur}")
 
+            # 4. Move vehicles one tick along their trips
+            fleet.advance_fleet()
+
             time.sleep(2) # Update every 2 seconds
 
         except Exception as e:
@@ -0,0 +1,228 @@
+"""
+Streaming anomaly detection over pollutant readings (Mesure) and status changes
+(EvenementStatut).
+
+The detector tails both tables by id (`manage.py detect_anomalies`). It keeps a
+fixed amount of state per sensor in NumPy arrays: one slot per sensor, one column
+per pollutant. Each batch of new rows is processed as arrays:
+
+- 'pic': reading more than Z_SEUIL standard deviations from the sensor's EWMA.
+- 'derive': two-sided CUSUM of the standardized readings crossing CUSUM_H (slow
+  drift that no single reading betrays). The statistic restarts after an alert.
+- 'instabilite': exponentially decaying count of status changes (time constant
+  FLAP_TAU) reaching FLAP_SEUIL.
+
+Alerts are rate-limited per (sensor, type) by COOLDOWN and written with
+bulk_create, one batch per processed batch of rows.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from django.db import close_old_connections
+from django.db.models import Max
+
+from . import caching
+from .dbutils import raw_rows, timestamps
+from .models import Alerte, EvenementStatut, Intervention, Mesure
+
+POLLUANTS = [p for p, _ in Mesure.POLLUANT_CHOICES]
+TYPES = [t for t, _ in Alerte.TYPE_CHOICES]
+
+ALPHA = 0.02         # EWMA weight of a new reading (~50-reading memory)
+WARMUP = 20          # Readings before a sensor's statistics are trusted
+Z_SEUIL = 4.0
+CUSUM_K = 0.5        # Slack, in standard deviations
+CUSUM_H = 8.0
+FLAP_TAU = 3600.0    # Seconds
+FLAP_SEUIL = 4.0     # ~4 changes within an hour
+COOLDOWN = 600.0     # Seconds between two alerts of the same type for the same sensor
+MIN_STD = 1e-3
+BATCH_SIZE = 50000
+
+
+def _rounds(keys):
+    """Splits row indices into rounds where each key appears at most once, preserving order."""
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.r_[0, np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1]
+    rank = np.arange(len(keys)) - np.repeat(starts, np.diff(np.r_[starts, len(keys)]))
+    occurrence = np.empty(len(keys), dtype=np.int64)
+    occurrence[order] = rank
+    return [np.flatnonzero(occurrence == r) for r in range(int(occurrence.max()) + 1)] if len(keys) else []
+
+
+class Detector:
+    """Per-sensor online statistics; process_readings()/process_events() return unsaved Alerte rows."""
+
+    def __init__(self, capacity=1024):
+        self.slots = {}
+        self.ids = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        shape = (capacity, len(POLLUANTS))
+        old = getattr(self, 'count', None)
+        arrays = {
+            'count': np.zeros(shape), 'mean': np.zeros(shape), 'var': np.zeros(shape),
+            'cusum_pos': np.zeros(shape), 'cusum_neg': np.zeros(shape),
+            'flap_rate': np.zeros(capacity), 'last_flip': np.zeros(capacity),
+            'last_alert': np.full((capacity, len(TYPES)), -np.inf),
+        }
+        for name, array in arrays.items():
+            if old is not None:
+                previous = getattr(self, name)
+                array[:len(previous)] = previous
+            setattr(self, name, array)
+
+    def slots_for(self, capteur_ids):
+        """Slot of each sensor, allocating new ones (and growing the arrays) as needed."""
+        slots = np.empty(len(capteur_ids), dtype=np.int64)
+        for i, pk in enumerate(capteur_ids):
+            slot = self.slots.get(pk)
+            if slot is None:
+                slot = self.slots[pk] = len(self.ids)
+                self.ids.append(pk)
+            slots[i] = slot
+        if len(self.ids) > len(self.count):
+            self._allocate(max(len(self.ids), 2 * len(self.count)))
+        return slots
+
+    def _cooldown(self, slots, type_alerte, t, mask):
+        """Restricts mask to the sensors not alerted for this type within COOLDOWN, and records the new alerts."""
+        column = TYPES.index(type_alerte)
+        mask = mask & (t - self.last_alert[slots, column] >= COOLDOWN)
+        self.last_alert[slots[mask], column] = t[mask]
+        return mask
+
+    def process_readings(self, capteur_ids, polluants, dates, valeurs):
+        slots = self.slots_for(capteur_ids)
+        columns = np.array([POLLUANTS.index(p) for p in polluants], dtype=np.int64)
+        dates, t = timestamps(dates)
+        x = np.asarray(valeurs, dtype=float)
+        alerts = []
+        # A sensor may report the same pollutant twice in a batch: update in order
+        for rows in _rounds(slots * len(POLLUANTS) + columns):
+            s, c, xr, tr = slots[rows], columns[rows], x[rows], t[rows]
+            mean, var, count = self.mean[s, c], self.var[s, c], self.count[s, c]
+            ready = count >= WARMUP
+            std = np.maximum(np.sqrt(var), MIN_STD)
+            z = np.where(ready, (xr - mean) / std, 0.0)
+            # Spikes are clipped before feeding the CUSUM and the statistics, so one outlier
+            # neither reads as a drift nor inflates the variance
+            clipped = np.clip(z, -Z_SEUIL, Z_SEUIL)
+
+            cusum_pos = np.where(ready, np.maximum(0.0, self.cusum_pos[s, c] + clipped - CUSUM_K), 0.0)
+            cusum_neg = np.where(ready, np.maximum(0.0, self.cusum_neg[s, c] - clipped - CUSUM_K), 0.0)
+            pic = self._cooldown(s, 'pic', tr, ready & (np.abs(z) > Z_SEUIL))
+            derive = np.maximum(cusum_pos, cusum_neg) > CUSUM_H
+            derive_alert = self._cooldown(s, 'derive', tr, derive)
+            self.cusum_pos[s, c] = np.where(derive, 0.0, cusum_pos)
+            self.cusum_neg[s, c] = np.where(derive, 0.0, cusum_neg)
+
+            # EWMA mean and variance; plain running averages until 1/n drops below ALPHA
+            weight = np.maximum(ALPHA, 1.0 / (count + 1))
+            delta = np.where(ready, clipped * std, xr - mean)
+            self.mean[s, c] = mean + weight * delta
+            self.var[s, c] = (1 - weight) * (var + weight * delta ** 2)
+            self.count[s, c] = count + 1
+
+            for i in np.flatnonzero(pic):
+                alerts.append(self._alerte(rows[i], capteur_ids, dates, 'pic', POLLUANTS[c[i]], xr[i], z[i],
+                                           f"{POLLUANTS[c[i]]} à {xr[i]:.1f}, {z[i]:+.1f} écarts-types de la moyenne ({mean[i]:.1f})"))
+            for i in np.flatnonzero(derive_alert):
+                direction = 'hausse' if cusum_pos[i] > cusum_neg[i] else 'baisse'
+                alerts.append(self._alerte(rows[i], capteur_ids, dates, 'derive', POLLUANTS[c[i]], xr[i],
+                                           max(cusum_pos[i], cusum_neg[i]), f"Dérive à la {direction} de {POLLUANTS[c[i]]}"))
+        return alerts
+
+    def process_events(self, capteur_ids, dates, nouveaux_statuts):
+        slots = self.slots_for(capteur_ids)
+        dates, t = timestamps(dates)
+        alerts = []
+        for rows in _rounds(slots):
+            s, tr = slots[rows], t[rows]
+            elapsed = np.maximum(tr - self.last_flip[s], 0.0)
+            rate = self.flap_rate[s] * np.exp(-elapsed / FLAP_TAU) + 1.0
+            self.flap_rate[s] = rate
+            self.last_flip[s] = tr
+            for i in np.flatnonzero(self._cooldown(s, 'instabilite', tr, rate >= FLAP_SEUIL)):
+                alerts.append(self._alerte(rows[i], capteur_ids, dates, 'instabilite', '', None, rate[i],
+                                           f"{rate[i]:.1f} changements de statut récents (dernier: {nouveaux_statuts[rows[i]]})"))
+        return alerts
+
+    @staticmethod
+    def _alerte(row, capteur_ids, dates, type_alerte, polluant, valeur, score, message):
+        return Alerte(capteur_id=capteur_ids[row], date=dates[row].to_pydatetime(), type_alerte=type_alerte, polluant=polluant,
+                      valeur=None if valeur is None else float(valeur), score=round(float(score), 3), message=message[:200])
+
+
+class Stream:
+    """
+    Tails Mesure and EvenementStatut by id and feeds a Detector. With a rule engine
+    (rules.Engine), also tails Intervention by date_heure (its key is a UUID).
+    """
+
+    def __init__(self, detector=None, from_start=False, engine=None):
+        self.detector = detector or Detector()
+        self.engine = engine
+        self.last_mesure = 0 if from_start else (Mesure.objects.order_by('-pk').values_list('pk', flat=True).first() or 0)
+        self.last_evenement = 0 if from_start else (EvenementStatut.objects.order_by('-pk').values_list('pk', flat=True).first() or 0)
+        self.last_intervention = None if from_start else Intervention.objects.aggregate(d=Max('date_heure'))['d']
+        self.interventions_vues = set()  # Interventions already read at last_intervention
+
+    def _interventions(self, batch_size):
+        queryset = Intervention.objects.order_by('date_heure')
+        if self.last_intervention:
+            queryset = queryset.filter(date_heure__gte=self.last_intervention)
+        rows = [r for r in raw_rows(queryset.values_list('pk', 'capteur_id', 'date_heure', 'cout')[:batch_size])
+                if r[0] not in self.interventions_vues]
+        if rows:
+            dates, _ = timestamps([r[2] for r in rows])
+            self.last_intervention = dates[-1].to_pydatetime()
+            self.interventions_vues = {r[0] for r, d in zip(rows, dates) if d == dates[-1]}
+        return rows
+
+    def poll(self, batch_size=BATCH_SIZE):
+        """Processes the next batch of each table; returns (rows processed, alerts written)."""
+        alerts = []
+        if self.engine:
+            self.engine.refresh()
+        mesures = raw_rows(Mesure.objects.filter(pk__gt=self.last_mesure).order_by('pk')
+                            .values_list('pk', 'capteur_id', 'polluant', 'date', 'valeur')[:batch_size])
+        if mesures:
+            pks, capteurs, polluants, dates, valeurs = zip(*mesures)
+            alerts += self.detector.process_readings(capteurs, polluants, dates, valeurs)
+            if self.engine:
+                alerts += self.engine.process_readings(capteurs, polluants, dates, valeurs)
+            self.last_mesure = pks[-1]
+        evenements = raw_rows(EvenementStatut.objects.filter(pk__gt=self.last_evenement).order_by('pk')
+                               .values_list('pk', 'capteur_id', 'date', 'nouveau_statut')[:batch_size])
+        if evenements:
+            pks, capteurs, dates, statuts = zip(*evenements)
+            alerts += self.detector.process_events(capteurs, dates, statuts)
+            if self.engine:
+                alerts += self.engine.process_events(capteurs, dates, statuts)
+            self.last_evenement = pks[-1]
+        interventions = self._interventions(batch_size) if self.engine else []
+        if interventions:
+            _, capteurs, dates, couts = zip(*interventions)
+            alerts += self.engine.process_interventions(capteurs, dates, couts)
+        if self.engine:
+            alerts += self.engine.sweep()
+        if alerts:
+            Alerte.objects.bulk_create(alerts, batch_size=2000)
+            caching.bump(Alerte)
+        return len(mesures) + len(evenements) + len(interventions), len(alerts)
+
+    def run(self, poll=1.0, once=False, should_stop=lambda: False, on_batch=None):
+        while not should_stop():
+            close_old_connections()
+            processed, raised = self.poll()
+            if on_batch and processed:
+                on_batch(processed, raised)
+            if processed:
+                continue  # Catching up: no pause
+            if once:
+                return
+            time.sleep(poll)
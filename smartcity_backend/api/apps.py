@@ -2,4 +2,12 @@ from django.apps import AppConfig
 
 
 class ApiConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
     name = "smartcity_backend.api"
+
+    def ready(self):
+        from . import caching, cube, leaderboard, participations
+        caching.connect_signals()
+        cube.connect_signals()
+        leaderboard.connect_signals()
+        participations.connect_signals()
@@ -0,0 +1,190 @@
+"""
+Air Quality Index from pollutant readings (Mesure).
+
+Each pollutant's concentration is averaged over its standard window (24 h for
+particles, 8 h for ozone, 1 h for NO2) ending at the latest reading. The average is
+then mapped to a sub-index by linear interpolation between the US EPA breakpoints.
+The AQI is the highest sub-index, and that pollutant is the dominant one. Sensors
+and districts are computed as whole NumPy arrays: one query per pollutant, no
+per-row Python.
+
+Results are cached per BUCKET_MINUTES time bucket, under keys versioned on Mesure
+and Capteur.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Avg, Max
+
+from . import caching
+from .districts import registry
+from .models import Capteur, Mesure
+
+BUCKET_MINUTES = 15
+BUCKET_TTL = BUCKET_MINUTES * 60
+
+# pollutant -> (averaging window, concentration truncation step, [(C_lo, C_hi, I_lo, I_hi), ...])
+# PM in µg/m³, gases in ppb.
+BREAKPOINTS = {
+    'pm25': (timedelta(hours=24), 0.1, [
+        (0.0, 9.0, 0, 50), (9.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+        (55.5, 125.4, 151, 200), (125.5, 225.4, 201, 300), (225.5, 325.4, 301, 500),
+    ]),
+    'pm10': (timedelta(hours=24), 1, [
+        (0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+        (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500),
+    ]),
+    'o3': (timedelta(hours=8), 1, [
+        (0, 54, 0, 50), (55, 70, 51, 100), (71, 85, 101, 150),
+        (86, 105, 151, 200), (106, 200, 201, 300),
+    ]),
+    'no2': (timedelta(hours=1), 1, [
+        (0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
+        (361, 649, 151, 200), (650, 1249, 201, 300), (1250, 2049, 301, 500),
+    ]),
+}
+POLLUANTS = tuple(BREAKPOINTS)
+AQI_MAX = 500
+
+# Simulated readings: typical background levels and per-district pollution factors
+NIVEAUX_FOND = {'pm25': 10.0, 'pm10': 30.0, 'o3': 35.0, 'no2': 20.0}
+FACTEURS_QUARTIER = {'Sousse Ville': 1.8, 'Sousse Jawhara': 1.4, 'Sousse Riadh': 1.5, 'Msaken': 1.2, 'Kalaa Kebira': 1.1}
+
+
+def sub_index(polluant, concentrations):
+    """Vectorized sub-index of a pollutant for an array of averaged concentrations (NaN stays NaN)."""
+    _, step, table = BREAKPOINTS[polluant]
+    table = np.array(table, dtype=float)
+    c = np.floor(np.asarray(concentrations, dtype=float) / step) * step
+    # Segment whose upper bound is the first one >= c (above the table: the last segment, capped below)
+    i = np.clip(np.searchsorted(table[:, 1], c, side='left'), 0, len(table) - 1)
+    c_lo, c_hi, i_lo, i_hi = table[i].T
+    index = (i_hi - i_lo) / (c_hi - c_lo) * (np.clip(c, None, c_hi) - c_lo) + i_lo
+    # Gaps between segments (e.g. 9.05 for PM2.5) fall on the segment's lower bound
+    index = np.where(c < c_lo, i_lo, index)
+    return np.where(np.isnan(c), np.nan, np.minimum(np.round(index), AQI_MAX))
+
+
+def combine(concentrations):
+    """{polluant: array} -> (AQI array, dominant pollutant array); sensors without any reading get NaN / ''."""
+    indices = np.vstack([sub_index(p, concentrations[p]) for p in POLLUANTS])
+    valid = ~np.isnan(indices).all(axis=0)
+    filled = np.where(np.isnan(indices), -1, indices)
+    aqi = np.where(valid, filled.max(axis=0), np.nan)
+    dominant = np.where(valid, np.array(POLLUANTS)[filled.argmax(axis=0)], '')
+    return aqi, dominant
+
+
+def latest_reading():
+    return Mesure.objects.aggregate(d=Max('date'))['d']
+
+
+def _bucket(at):
+    """End of the BUCKET_MINUTES bucket containing `at` (so the bucket includes its latest readings)."""
+    start = at.replace(minute=at.minute - at.minute % BUCKET_MINUTES, second=0, microsecond=0)
+    return start if start == at else start + timedelta(minutes=BUCKET_MINUTES)
+
+
+def sensor_concentrations(at):
+    """Rolling-window mean concentration of every pollutant for every sensor with readings."""
+    ids, values = [], {}
+    for p, (window, _, _) in BREAKPOINTS.items():
+        rows = Mesure.objects.filter(polluant=p, date__gt=at - window, date__lte=at).values('capteur').annotate(c=Avg('valeur'))
+        values[p] = {r['capteur']: r['c'] for r in rows}
+        ids.extend(values[p])
+    ids = sorted(set(ids))
+    return ids, {p: np.array([values[p].get(i, np.nan) for i in ids], dtype=float) for p in POLLUANTS}
+
+
+def _compute_capteurs(at):
+    ids, conc = sensor_concentrations(at)
+    aqi, dominant = combine(conc)
+    districts = dict(Capteur.objects.filter(type_capteur='qualité_air').values_list('pk', 'district'))
+    return {
+        'date': at.isoformat(),
+        'id': [str(i) for i in ids],
+        'district': [districts.get(i) for i in ids],
+        **{p: [None if np.isnan(v) else round(float(v), 1) for v in conc[p]] for p in POLLUANTS},
+        'aqi': [None if np.isnan(v) else int(v) for v in aqi],
+        'dominant': dominant.tolist(),
+    }
+
+
+def _compute_quartiers(at):
+    capteurs = indices_capteurs(at)
+    if not capteurs['id']:
+        return {'date': capteurs['date'], 'quartiers': []}
+    # District level: the AQI of the district's mean concentrations
+    keys, slot = np.unique(np.array([d if d is not None else -1 for d in capteurs['district']]), return_inverse=True)
+    conc = {}
+    for p in POLLUANTS:
+        values = np.array(capteurs[p], dtype=float)
+        ok = ~np.isnan(values)
+        sums = np.bincount(slot[ok], weights=values[ok], minlength=len(keys))
+        counts = np.bincount(slot[ok], minlength=len(keys))
+        conc[p] = np.divide(sums, counts, out=np.full(len(keys), np.nan), where=counts > 0)
+    aqi, dominant = combine(conc)
+    sensors = np.bincount(slot, minlength=len(keys))
+
+    reg = registry()
+    rows = []
+    for k, district_id in enumerate(keys.tolist()):
+        if np.isnan(aqi[k]):
+            continue
+        info = reg.by_id.get(district_id)
+        rows.append({
+            'quartier': info.nom if info else 'Inconnu',
+            'aqi': int(aqi[k]),
+            'dominant': str(dominant[k]),
+            'capteurs': int(sensors[k]),
+            **{p: None if np.isnan(conc[p][k]) else round(float(conc[p][k]), 1) for p in POLLUANTS},
+        })
+    return {'date': capteurs['date'], 'quartiers': sorted(rows, key=lambda r: (-r['aqi'], r['quartier']))}
+
+
+def _cached(name, compute, at):
+    at = at or latest_reading()
+    if at is None:
+        return None
+    bucket = _bucket(at)
+    key = caching.versioned_key(f'aqi:{name}', (Mesure, Capteur), bucket.isoformat())
+    return caching.get_or_compute(key, lambda: compute(bucket), BUCKET_TTL)
+
+
+def indices_capteurs(at=None):
+    """Columnar per-sensor concentrations, AQI and dominant pollutant at `at` (default: latest reading)."""
+    return _cached('capteurs', _compute_capteurs, at) or {'date': None, 'id': []}
+
+
+def indices_quartiers(at=None):
+    """Per-district AQI, worst first."""
+    return _cached('quartiers', _compute_quartiers, at) or {'date': None, 'quartiers': []}
+
+
+# --- Simulated readings ---
+
+def simulated_readings(capteurs, at, rng=None):
+    """
+    One unsaved Mesure per pollutant for each (id, district_id) air sensor at `at`:
+    background level x district factor x traffic rush-hour cycle (ozone: afternoon peak) x noise.
+    """
+    rng = rng or np.random.default_rng()
+    if not capteurs:
+        return []
+    reg = registry()
+    ids = [c[0] for c in capteurs]
+    factor = np.array([FACTEURS_QUARTIER.get(getattr(reg.by_id.get(c[1]), 'nom', None), 1.0) for c in capteurs])
+    hour = at.hour + at.minute / 60
+    traffic = 1 + 0.5 * np.exp(-((hour - 8) ** 2) / 4) + 0.6 * np.exp(-((hour - 18) ** 2) / 4)
+    sun = 1 + 0.8 * np.exp(-((hour - 15) ** 2) / 8)
+    readings = []
+    for p in POLLUANTS:
+        cycle = sun if p == 'o3' else traffic
+        values = NIVEAUX_FOND[p] * (1 if p == 'o3' else factor) * cycle * rng.lognormal(0, 0.25, len(ids))
+        readings.extend(Mesure(capteur_id=i, polluant=p, date=at, valeur=round(float(v), 1)) for i, v in zip(ids, values))
+    return readings
+
+
+def air_sensors():
+    """(id, district_id) of the active air-quality sensors."""
+    return list(Capteur.objects.filter(type_capteur='qualité_air', statut='actif').values_list('pk', 'district'))
@@ -0,0 +1,310 @@
+"""
+Benchmark harness for the REST API and the simulation step.
+
+Two drivers:
+- run_in_process(): seeds a throwaway database with generate_test_data at each size and
+  measures list latency/throughput per ViewSet, simulate/ step latency against the
+  fleet size, single-row Intervention saves (cost cube upkeep), the dashboard's
+  data-load time and peak RSS, through django.test.Client.
+- run_load(): a locust-style driver, N concurrent users with their own keep-alive
+  session hitting a weighted endpoint mix on a live server for a fixed duration.
+
+startup() audits cold start: the imports `manage.py runserver` does before serving and
+the module-level imports of the dashboard, timed with `python -X importtime` in a fresh
+interpreter and summed per top-level package.
+
+Results are plain JSON. compare() flags every metric that got worse than the baseline
+by more than the threshold (lower is better, except throughput).
+"""
+import ast
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+# Router list endpoints timed by the in-process driver
+LIST_ENDPOINTS = {
+    'capteurs': 'capteur-list',
+    'interventions': 'intervention-list',
+    'citoyens': 'citoyen-list',
+    'trajets': 'trajet-list',
+    'vehicules': 'vehiculeautonome-list',
+    'proprietaires': 'proprietaire-list',
+    'techniciens': 'technicien-list',
+    'consultations': 'consultation-list',
+    'districts': 'district-list',
+}
+
+# What one dashboard run requests (see dashboard.py)
+DASHBOARD_REQUESTS = ['dashboard/snapshot/']
+
+# Weighted mix for the concurrent driver: (path, weight)
+LOAD_MIX = [
+    ('capteurs/', 4), ('interventions/', 2), ('citoyens/', 2),
+    ('trajets/', 2), ('vehicules/positions/', 1), ('trajets/journalier/', 1),
+    ('dashboard/snapshot/', 2),
+]
+
+HIGHER_IS_BETTER = ('rps',)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def summarize(latencies, elapsed=None, nbytes=None):
+    latencies = sorted(latencies)
+    stats = {
+        'n': len(latencies),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+    if elapsed:
+        stats['rps'] = round(len(latencies) / elapsed, 2)
+    if nbytes is not None:
+        stats['bytes'] = nbytes
+    return stats
+
+
+def time_requests(fn, repeat):
+    latencies = []
+    start = time.perf_counter()
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start, result
+
+
+def bench_size(rows, repeat=5, simulate_repeat=3, stdout=None):
+    """Seeds `rows` rows per large table in the current database and measures it."""
+    from .models import VehiculeAutonome
+
+    t0 = time.perf_counter()
+    call_command('generate_test_data', rows=rows, seed=rows, stdout=stdout)
+    result = {'seed_s': round(time.perf_counter() - t0, 2)}
+
+    client = Client()
+    result['list'] = {}
+    for name, url_name in LIST_ENDPOINTS.items():
+        url = reverse(url_name)
+        latencies, elapsed, response = time_requests(lambda: client.get(url), repeat)
+        # Seeding bumped every model version: the first request misses the cache, the rest hit it
+        result['list'][name] = dict(summarize(latencies, elapsed, len(response.content)),
+                                    cold_ms=round(latencies[0] * 1000, 2))
+
+    latencies, elapsed, _ = time_requests(lambda: client.post(reverse('simulate-step')), simulate_repeat)
+    result['simulate'] = dict(summarize(latencies, elapsed), fleet=VehiculeAutonome.objects.count())
+
+    result['intervention_save'] = intervention_save(repeat)
+    result['dashboard_load_s'] = round(dashboard_load(client), 3)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def intervention_save(repeat):
+    """One Intervention.save(): changing its cost (cube cells merged), then unchanged (cube skipped)."""
+    from .models import Intervention
+
+    intervention = Intervention.objects.order_by('pk').first()
+    if intervention is None:
+        return {}
+
+    def change_cost():
+        intervention.cout += 1
+        intervention.save()
+
+    changed, _, _ = time_requests(change_cost, repeat)
+    unchanged, _, _ = time_requests(intervention.save, repeat)
+    return {'cube': summarize(changed), 'unchanged': summarize(unchanged)}
+
+
+def dashboard_load(client):
+    """Time for one dashboard refresh worth of requests, from a cold snapshot cache."""
+    from . import caching, snapshot
+
+    caching.bump(*snapshot.WATCHED_MODELS)
+    t0 = time.perf_counter()
+    for path in DASHBOARD_REQUESTS:
+        client.get(f'/api/{path}').json()
+    return time.perf_counter() - t0
+
+
+# What runserver loads before its first request: settings, apps, models, then the URLconf and views
+MANAGE_STARTUP = (
+    "import os, django\n"
+    f"os.environ.setdefault('DJANGO_SETTINGS_MODULE', {os.environ.get('DJANGO_SETTINGS_MODULE', 'smartcity_backend.settings')!r})\n"
+    "django.setup()\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+)
+
+
+def module_imports(path):
+    """The import statements at the top level of a script, as source (run before its first output)."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_times(code, top=10):
+    """Runs `code` in a fresh interpreter under -X importtime: total import time and the slowest packages."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=settings.BASE_DIR,
+                          capture_output=True, text=True, check=True)
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        root = name.strip().split('.')[0]
+        packages[root] = packages.get(root, 0) + int(own)
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {'total_ms': round(sum(packages.values()) / 1000, 1),
+            'top': [[name, round(us / 1000, 1)] for name, us in slowest]}
+
+
+def startup(top=10):
+    """Cold-start import audit of the API server and of the dashboard."""
+    return {
+        'manage': import_times(MANAGE_STARTUP, top),
+        'dashboard': import_times(module_imports(os.path.join(settings.BASE_DIR, 'dashboard.py')), top),
+    }
+
+
+def run_in_process(sizes, repeat=5, stdout=None, progress=print):
+    """Benchmarks each size in turn. Seeding wipes the tables: only call this on a throwaway database."""
+    results = {'meta': meta(), 'startup': startup(), 'sizes': {}}
+    for rows in sizes:
+        progress(f"- {rows} rows")
+        results['sizes'][str(rows)] = bench_size(rows, repeat=repeat, stdout=stdout)
+    return results
+
+
+def run_load(base_url, users=10, duration=30.0, mix=LOAD_MIX, seed=0):
+    """Locust-style driver: `users` threads, each looping over weighted requests for `duration` seconds."""
+    import requests
+
+    paths = [p for p, _ in mix]
+    weights = [w for _, w in mix]
+    deadline = time.perf_counter() + duration
+    lock = threading.Lock()
+    latencies = {p: [] for p in paths}
+    errors = {p: 0 for p in paths}
+
+    def user(index):
+        rng = random.Random(seed + index)
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                path = rng.choices(paths, weights)[0]
+                t0 = time.perf_counter()
+                try:
+                    ok = session.get(base_url.rstrip('/') + '/' + path, timeout=30).ok
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    if ok:
+                        latencies[path].append(elapsed)
+                    else:
+                        errors[path] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    wall = time.perf_counter() - start
+
+    endpoints = {
+        p: dict(summarize(latencies[p], wall), errors=errors[p]) for p in paths if latencies[p]
+    }
+    everything = [l for p in paths for l in latencies[p]]
+    total = dict(summarize(everything, wall), errors=sum(errors.values())) if everything else {'errors': sum(errors.values())}
+    return {'meta': dict(meta(), users=users, duration_s=duration, url=base_url), 'load': {'endpoints': endpoints, 'total': total}}
+
+
+def meta():
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def flatten(results, prefix=''):
+    """{'sizes': {'1000': {'list': {'capteurs': {'p50_ms': 3}}}}} -> {'sizes.1000.list.capteurs.p50_ms': 3}"""
+    flat = {}
+    for key, value in results.items():
+        if key == 'meta':
+            continue
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + '.'))
+        elif isinstance(value, (int, float)):
+            flat[path] = value
+    return flat
+
+
+# Differences below these absolute amounts are timer noise, whatever the ratio
+NOISE_FLOOR = {'_ms': 5.0, '_s': 0.05, '_mb': 16.0}
+# Tail metrics need enough samples before they mean anything
+TAIL_METRICS = ('max_ms', 'p95_ms', 'rps')
+MIN_TAIL_SAMPLES = 20
+
+
+def _noise_floor(leaf):
+    for suffix, floor in NOISE_FLOOR.items():
+        if leaf.endswith(suffix):
+            return floor
+    return None
+
+
+def compare(current, baseline, threshold=0.2):
+    """Returns the metrics that regressed by more than `threshold` (0.2 = 20%)."""
+    cur, base = flatten(current), flatten(baseline)
+    regressions = []
+    for metric, old in base.items():
+        group, leaf = metric.rsplit('.', 1) if '.' in metric else ('', metric)
+        if metric not in cur or not old:
+            continue
+        if leaf in TAIL_METRICS and base.get(f'{group}.n', 0) < MIN_TAIL_SAMPLES:
+            continue
+        new = cur[metric]
+        if leaf in HIGHER_IS_BETTER:
+            change = (old - new) / old
+            # Compare throughput as time per request so fast endpoints get the same floor
+            noisy = new and (1000 / new - 1000 / old) < NOISE_FLOOR['_ms']
+        else:
+            floor = _noise_floor(leaf)
+            if floor is None:
+                continue
+            change = (new - old) / old
+            noisy = new - old < floor
+        if change > threshold and not noisy:
+            regressions.append({'metric': metric, 'baseline': old, 'current': new, 'change': round(change, 3)})
+    return regressions
+
+
+def load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def dump_json(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
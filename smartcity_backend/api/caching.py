@@ -0,0 +1,208 @@
+"""
+Read-through cache for API responses and aggregates, invalidated on write.
+
+Every model has a version stored in the cache. Cache keys embed the versions of the
+models a result was computed from (versioned_key()), so a write never has to find and
+delete stale entries: it bumps the model's version and the old keys simply stop being
+read (they expire on their own). A bump writes a new random version rather than
+incrementing: incr() is a read-modify-write on the file backend, where two processes
+bumping at once could both write the same number.
+
+Versions are bumped by post_save/post_delete and, for the bulk paths that send no
+signal (bulk_create/bulk_update, simulate/, generators), by calling bump() or by the
+invalidation_paused() context manager. Tables deleted from in bulk (BULK_DELETED) get
+no post_delete receiver, which would make Django fetch every row before deleting it:
+their bulk deletes bump them, and a delete that cascades to them bumps them through
+the receiver of the model deleted.
+
+get_or_compute() is single-flight: when a key is missing, one caller recomputes it
+while concurrent callers for the same key wait for the result, through a per-key
+lock in this process and a cache.add() lock across processes sharing the cache.
+A computation may itself call get_or_compute() for other keys (the snapshot reads
+the cube): locks are never shared between keys, so nesting cannot deadlock.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CASCADE
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+_MISSING = object()
+_key_locks = {}  # key -> [lock, callers using it]; dropped when the last one leaves
+_key_locks_guard = threading.Lock()
+_state = threading.local()  # .paused: models whose receivers are paused in this thread
+LOCK_TIMEOUT = 30  # Seconds a recompute may hold the cross-process lock
+LOCK_POLL = 0.05
+# Models without a post_delete receiver, so that queryset.delete() stays one query: the
+# readings, histories and derived tables that retention, the generators and the rollups
+# delete in bulk, and the link tables that go with their parents
+BULK_DELETED = {
+    'mesure', 'evenementstatut', 'alerte', 'trajetjournalier', 'positionvehicule', 'cubeintervention',
+    'rapportproprietaire', 'interventiontechnicien', 'participation', 'job', 'archive', 'repriseimport',
+}
+
+
+def default_timeout():
+    return getattr(settings, 'API_CACHE_TIMEOUT', 60)
+
+
+# --- Model versions ---
+
+def _version_key(model):
+    return f'ver:{model._meta.label_lower}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:16]  # Never repeats, so an evicted version never comes back either
+
+
+def versions(models):
+    """Current version of each model (a fresh one for models never seen or evicted)."""
+    keys = [_version_key(m) for m in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_version(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[k] for k in keys]
+
+
+def bump(*models):
+    if models:
+        cache.set_many({_version_key(m): _new_version() for m in models}, timeout=None)
+
+
+def versioned_key(prefix, models, *parts):
+    """'<prefix>:<digest of the model versions and parts>'; changes whenever one of the models is written."""
+    digest = hashlib.md5(repr((versions(models), parts)).encode('utf-8')).hexdigest()[:20]
+    return f'{prefix}:{digest}'
+
+
+def _paused(model):
+    return model in getattr(_state, 'paused', ())
+
+
+def _on_write(sender, **kwargs):
+    if not _paused(sender):
+        bump(sender)
+
+
+@lru_cache(maxsize=None)
+def _cascade(model):
+    """`model` and the models its deletes cascade to, recursively."""
+    models = {model}
+    for relation in model._meta.related_objects:
+        if relation.on_delete is CASCADE and relation.related_model not in models:
+            models |= _cascade(relation.related_model)
+    return frozenset(models)
+
+
+def _on_delete(sender, **kwargs):
+    # The cascaded rows of BULK_DELETED models are deleted without a signal
+    if not _paused(sender):
+        bump(*_cascade(sender))
+
+
+def connect_signals():
+    for model in apps.get_app_config('api').get_models():
+        post_save.connect(_on_write, sender=model, dispatch_uid=f'caching-save-{model.__name__}')
+        if model._meta.model_name not in BULK_DELETED:
+            post_delete.connect(_on_delete, sender=model, dispatch_uid=f'caching-delete-{model.__name__}')
+
+
+@contextmanager
+def invalidation_paused(*models):
+    """
+    Skips the invalidation receivers of `models` in this thread for a bulk write, then
+    bumps them once. Writes from other threads (concurrent requests) still bump.
+    """
+    previous = getattr(_state, 'paused', frozenset())
+    _state.paused = previous | set(models)
+    try:
+        yield
+    finally:
+        _state.paused = previous
+        bump(*models)
+
+
+# --- Single-flight ---
+
+@contextmanager
+def _key_lock(key):
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+def get_or_compute(key, compute, timeout=None):
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    timeout = default_timeout() if timeout is None else timeout
+
+    with _key_lock(key):
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            # Another process is computing it: wait for its result
+            time.sleep(LOCK_POLL)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if time.monotonic() > deadline:
+                break  # The holder died or is stuck: compute it ourselves
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+
+# --- ViewSets ---
+
+class CachedViewSetMixin:
+    """
+    Caches list/retrieve data (before rendering, so content negotiation still applies)
+    under keys versioned on the ViewSet's model plus `cache_models`.
+    """
+    cache_models = ()
+    cache_timeout = None
+
+    def get_cache_models(self):
+        return (self.queryset.model, *self.cache_models)
+
+    def cached_response(self, compute, models=None):
+        params = sorted((k, tuple(v)) for k, v in self.request.query_params.lists() if k != 'format')
+        key = versioned_key(
+            f'view:{self.basename}:{self.action}', models or self.get_cache_models(),
+            sorted(self.kwargs.items()), params,
+        )
+        return Response(get_or_compute(key, compute, self.cache_timeout))
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(CachedViewSetMixin, self).list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(CachedViewSetMixin, self).retrieve(request, *args, **kwargs).data)
@@ -0,0 +1,435 @@
+"""
+Maintenance cost cube: Intervention measures (count, cost, duration, CO2 impact)
+pre-aggregated per cell of dimensions (CubeIntervention).
+
+Cells are kept for three cuboids, each at two grains (day, and month for queries
+that do not need days):
+- 'type': by intervention type only. It is small enough to serve the daily trends
+  and totals over the whole history.
+- 'detail': by district, sensor type, intervention type and owner.
+- 'technicien': 'detail' plus the technician. An intervention counts fully for each
+  of its technicians, so totals per technician add up to more than the plain totals.
+A query reads the smallest cuboid that holds all of its dimensions.
+
+The cube is maintained incrementally. Intervention and InterventionTechnicien
+delete() and their managers' bulk_create() call remove()/add() with the ids being
+written. Those read the rows back, sum them per cell and merge the deltas into the
+stored cells. save() reads the row's cells before and after the write and merges
+the difference once (cells()/update()). A few rows are summed in Python, more with
+pandas. Deleting a sensor (or its owner) cascades to its interventions: a
+pre_delete receiver takes them out first. Deleting a technician or an owner also
+deletes their own cells (foreign keys of CubeIntervention). Other writes that
+bypass the models (queryset.update()/delete()) must be followed by rebuild(), or
+`manage.py build_cube`. Bulk loads pause the maintenance and rebuild once at the
+end (maintenance_paused()). Archiving (retention.py) deletes interventions without
+touching their cells.
+
+A sensor's district, type and owner are recorded as they are when its interventions
+are written.
+"""
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import pre_delete
+from django.utils import timezone
+
+from . import caching, retention
+from .dbutils import chunks
+from .districts import registry
+from .models import Capteur, CubeIntervention, Intervention, InterventionTechnicien, Proprietaire, Technicien
+
+# API dimension -> cell field
+DIMENSIONS = {
+    'jour': 'periode',
+    'mois': 'periode',
+    'quartier': 'district_id',
+    'type_capteur': 'type_capteur',
+    'type_intervention': 'type_intervention',
+    'proprietaire': 'proprietaire_id',
+    'technicien': 'technicien_id',
+}
+DETAIL = ('district_id', 'type_capteur', 'type_intervention', 'proprietaire_id')
+# Smallest first: queries read the first one that has their dimensions
+CUBOIDES = {
+    'type': ('type_intervention',),
+    'detail': DETAIL,
+    'technicien': DETAIL + ('technicien_id',),
+}
+KEY_FIELDS = ('cuboide', 'granularite', 'periode') + CUBOIDES['technicien']
+MESURES = ('nombre', 'cout', 'duree', 'impact_co2')
+VIDE = {'district_id': None, 'type_capteur': '', 'proprietaire_id': None, 'technicien_id': None}
+EXACT_LOOKUP_MAX = 50  # Merges up to this many cells look them up by key, bigger ones by period
+ROW_PATH_MAX = 50  # Up to this many ids are summed row by row: a pandas round trip costs more
+READ_BATCH = 200000
+QUERY_TTL = 30  # Seconds; bounds the staleness left by writers in other processes (per-process cache)
+
+_state = threading.local()
+
+
+class QueryError(ValueError):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+# --- Maintenance ---
+
+def _fields(prefix, par_technicien):
+    """values_list() fields: date, the detail dimensions (and technician), then the measures but the count."""
+    fields = [prefix + f for f in ('date_heure', 'capteur__district', 'capteur__type_capteur', 'type_intervention',
+                                   'capteur__proprietaire')]
+    if par_technicien:
+        fields.append('technicien')
+    return fields + [prefix + m for m in MESURES[1:]]
+
+
+def _read(queryset, prefix, par_technicien):
+    """
+    Interventions (prefix '') or technician links ('intervention__') summed per day and
+    detail dimensions, as a DataFrame. Reads raw rows in batches: the ORM converters and
+    SQLite's per-row date truncation would cost more than the aggregation itself.
+    """
+    import pandas as pd  # Loaded on first use: importing it would slow every process startup
+    from .dbutils import raw_batches, timestamps
+
+    columns = ['date_heure', *DETAIL] + (['technicien_id'] if par_technicien else [])
+    fields = _fields(prefix, par_technicien)
+    keys = columns[1:] + ['jour']
+    parts = []
+    for rows in raw_batches(queryset.order_by().values_list(*fields), READ_BATCH):
+        frame = pd.DataFrame(rows, columns=columns + list(MESURES[1:]))
+        dates, _ = timestamps(frame.pop('date_heure'))
+        frame['jour'] = dates.tz_convert(timezone.get_current_timezone()).tz_localize(None).normalize()
+        frame[['cout', 'impact_co2']] = frame[['cout', 'impact_co2']].astype(float)
+        frame['nombre'] = 1
+        parts.append(frame.groupby(keys, dropna=False, sort=False)[list(MESURES)].sum())
+    if not parts:
+        return None
+    frame = pd.concat(parts)
+    return (frame.groupby(level=keys, dropna=False, sort=False).sum() if len(parts) > 1 else frame).reset_index()
+
+
+def _clean(field):
+    """Cell field value from a raw column value (NaN for NULL, UUIDs as stored by the backend)."""
+    import pandas as pd
+
+    if field in ('proprietaire_id', 'technicien_id'):
+        to_python = (Proprietaire if field == 'proprietaire_id' else Technicien)._meta.pk.to_python
+        return lambda v: None if pd.isna(v) else to_python(v)
+    if field == 'district_id':
+        return lambda v: None if pd.isna(v) else int(v)
+    return lambda v: v
+
+
+def _accumulate(cells, frame, cuboides):
+    """Adds the cells of each cuboid, at both grains, from a frame of _read()."""
+    if frame is None:
+        return
+    for granularite in ('jour', 'mois'):
+        frame['periode'] = frame['jour'] if granularite == 'jour' else frame['jour'].dt.to_period('M').dt.start_time
+        for cuboide in cuboides:
+            dims = list(CUBOIDES[cuboide])
+            grouped = frame.groupby(['periode'] + dims, dropna=False, sort=False)[list(MESURES)].sum().reset_index()
+            values = {f: grouped[f].map(_clean(f)) if f in grouped else [VIDE[f]] * len(grouped) for f in CUBOIDES['technicien']}
+            periodes = grouped['periode'].dt.date
+            for row in zip(periodes, *(values[f] for f in CUBOIDES['technicien']), *(grouped[m] for m in MESURES)):
+                key, measures = (cuboide, granularite) + row[:6], row[6:]
+                cell = cells.setdefault(key, [0, 0.0, 0, 0.0])
+                for i, value in enumerate(measures):
+                    cell[i] += value
+
+
+def _accumulate_rows(cells, queryset, prefix, cuboides):
+    """_accumulate() for a few rows, read through the ORM (typed values) and summed without pandas."""
+    dims = CUBOIDES['technicien'] if 'technicien' in cuboides else DETAIL
+    tz = timezone.get_current_timezone()
+    for row in queryset.order_by().values_list(*_fields(prefix, 'technicien' in cuboides)):
+        values = dict(zip(dims, row[1:len(dims) + 1]))
+        cout, duree, impact_co2 = row[len(dims) + 1:]
+        measures = (1, float(cout), duree, float(impact_co2))
+        jour = timezone.localtime(row[0], tz).date()
+        for granularite, periode in (('jour', jour), ('mois', jour.replace(day=1))):
+            for cuboide in cuboides:
+                key = (cuboide, granularite, periode) + tuple(
+                    values[f] if f in CUBOIDES[cuboide] else VIDE[f] for f in CUBOIDES['technicien']
+                )
+                cell = cells.setdefault(key, [0, 0.0, 0, 0.0])
+                for i, value in enumerate(measures):
+                    cell[i] += value
+
+
+def _decimal(value):
+    return Decimal(f'{value:.2f}')
+
+
+def _key(cell):
+    return tuple(getattr(cell, f) for f in KEY_FIELDS)
+
+
+def _existing(keys):
+    """The stored cells with these keys."""
+    if len(keys) <= EXACT_LOOKUP_MAX:
+        condition = Q()
+        for k in keys:
+            condition |= Q(**{f if v is not None else f'{f}__isnull': v if v is not None else True for f, v in zip(KEY_FIELDS, k)})
+        querysets = [CubeIntervention.objects.filter(condition)]
+    else:
+        periods = {}
+        for k in keys:
+            periods.setdefault(k[:2], set()).add(k[2])
+        querysets = [CubeIntervention.objects.filter(cuboide=c, granularite=g, periode__in=chunk)
+                     for (c, g), days in periods.items() for chunk in chunks(sorted(days))]
+    found = {_key(cell): cell for queryset in querysets for cell in queryset}
+    return {k: found[k] for k in keys if k in found}
+
+
+def _merge(cells, sign):
+    if not cells:
+        return
+    with transaction.atomic():
+        existing = _existing(list(cells))
+        updated, created, emptied = [], [], []
+        for key, (nombre, cout, duree, impact_co2) in cells.items():
+            cell = existing.get(key)
+            if cell is None:
+                cell = CubeIntervention(**dict(zip(KEY_FIELDS, key)))
+                created.append(cell)
+            else:
+                updated.append(cell)
+            cell.nombre += sign * int(nombre)
+            cell.cout += sign * _decimal(cout)
+            cell.duree += sign * int(duree)
+            cell.impact_co2 += sign * _decimal(impact_co2)
+            if cell.nombre <= 0 and cell.pk:
+                emptied.append(cell.pk)
+        CubeIntervention.objects.bulk_update([c for c in updated if c.nombre > 0], MESURES, batch_size=2000)
+        CubeIntervention.objects.bulk_create([c for c in created if c.nombre > 0], batch_size=2000)
+        for chunk in chunks(emptied):
+            CubeIntervention.objects.filter(pk__in=chunk).delete()
+    caching.bump(CubeIntervention)
+
+
+def paused():
+    return getattr(_state, 'paused', False)
+
+
+@contextmanager
+def maintenance_paused():
+    """Skips the incremental maintenance during a bulk load, then rebuilds the cube once."""
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = False
+    rebuild()
+
+
+def _sum(cells, queryset, prefix, cuboides, ids):
+    if len(ids) <= ROW_PATH_MAX:
+        _accumulate_rows(cells, queryset, prefix, cuboides)
+    else:
+        _accumulate(cells, _read(queryset, prefix, 'technicien' in cuboides), cuboides)
+
+
+def _contributions(interventions=(), links=()):
+    cells = {}
+    for chunk in chunks(interventions):
+        _sum(cells, Intervention.objects.filter(pk__in=chunk), '', ('type', 'detail'), chunk)
+        _sum(cells, InterventionTechnicien.objects.filter(intervention__in=chunk), 'intervention__', ('technicien',), chunk)
+    for chunk in chunks(links):
+        _sum(cells, InterventionTechnicien.objects.filter(pk__in=chunk), 'intervention__', ('technicien',), chunk)
+    return cells
+
+
+def add(intervention_ids):
+    """Adds stored interventions (and their technicians) to the cube."""
+    if not paused():
+        _merge(_contributions(interventions=intervention_ids), 1)
+
+
+def remove(intervention_ids):
+    """Takes stored interventions out of the cube; call before changing or deleting them."""
+    if not paused():
+        _merge(_contributions(interventions=intervention_ids), -1)
+
+
+def add_links(link_ids):
+    if not paused():
+        _merge(_contributions(links=link_ids), 1)
+
+
+def remove_links(link_ids):
+    if not paused():
+        _merge(_contributions(links=link_ids), -1)
+
+
+def cells(intervention_ids=(), link_ids=()):
+    """The cells stored rows contribute to, with their measures; read before a write, for update()."""
+    return {} if paused() else _contributions(intervention_ids, link_ids)
+
+
+def update(before, intervention_ids=(), link_ids=()):
+    """Merges the difference between `before` (cells() of the same ids) and the rows as now stored."""
+    if paused():
+        return
+    after = _contributions(intervention_ids, link_ids)
+    delta = {}
+    for key in before.keys() | after.keys():
+        change = [new - old for new, old in zip(after.get(key, (0, 0.0, 0, 0.0)), before.get(key, (0, 0.0, 0, 0.0)))]
+        if any(change):
+            delta[key] = change
+    _merge(delta, 1)
+
+
+def _on_capteur_delete(sender, instance, **kwargs):
+    if not paused():
+        remove(Intervention.objects.filter(capteur=instance).values_list('pk', flat=True))
+
+
+def connect_signals():
+    pre_delete.connect(_on_capteur_delete, sender=Capteur, dispatch_uid='cube-capteur-delete')
+
+
+def rebuild():
+    """
+    Recomputes the cells from the Intervention table. Returns the number of cells written.
+
+    Cells before the archive horizon (a month start, see retention.py) sum interventions
+    no longer in the table: they are kept as they are.
+    """
+    interventions = Intervention.objects.all()
+    links = InterventionTechnicien.objects.all()
+    debut = retention.horizon(Intervention)
+    if debut:
+        interventions = interventions.filter(date_heure__gte=debut)
+        links = links.filter(intervention__date_heure__gte=debut)
+    cells = {}
+    _accumulate(cells, _read(interventions, '', False), ('type', 'detail'))
+    _accumulate(cells, _read(links, 'intervention__', True), ('technicien',))
+    # Raw statements: the ORM would load every cell to send delete signals, and prepare
+    # every value of every cell one by one on insert
+    meta = CubeIntervention._meta
+    connection = connections['default']
+    fields = [meta.get_field(f) for f in KEY_FIELDS + MESURES]
+    rows = [key + (int(m[0]), _decimal(m[1]), int(m[2]), _decimal(m[3])) for key, m in cells.items()]
+    prepared = []
+    for i, field in enumerate(fields[:len(KEY_FIELDS)]):
+        values = {row[i] for row in rows}
+        prepared.append({v: field.get_db_prep_save(v, connection) for v in values})
+    quote = connection.ops.quote_name
+    insert = (f"INSERT INTO {quote(meta.db_table)} ({', '.join(quote(f.column) for f in fields)}) "
+              f"VALUES ({', '.join(['%s'] * len(fields))})")
+    with transaction.atomic(), connection.cursor() as cursor:
+        if debut:
+            periode = meta.get_field('periode')
+            cursor.execute(f"DELETE FROM {quote(meta.db_table)} WHERE {quote(periode.column)} >= %s",
+                           [periode.get_db_prep_value(timezone.localdate(debut), connection)])
+        else:
+            cursor.execute(f"DELETE FROM {quote(meta.db_table)}")
+        for start in range(0, len(rows), 10000):
+            cursor.executemany(insert, [
+                tuple(p[v] for p, v in zip(prepared, row)) + row[len(KEY_FIELDS):] for row in rows[start:start + 10000]
+            ])
+    caching.bump(CubeIntervention)
+    return len(rows)
+
+
+# --- Queries ---
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise QueryError({name: f"Date invalide: {value!r} (AAAA-MM-JJ attendu)."})
+
+
+def _parse_ids(values):
+    try:
+        return [uuid.UUID(v) for v in values]
+    except ValueError:
+        raise QueryError({'filter': f"Identifiants invalides: {'|'.join(values)}."})
+
+
+def parse_query(group_by='', filters=(), debut=None, fin=None):
+    """
+    Validates the query parameters: group_by 'mois,quartier', filters ['type_intervention:prédictive|curative',
+    'quartier:Sahloul', 'proprietaire:<uuid>', ...], debut/fin ISO dates (fin excluded). Returns the arguments of query().
+    """
+    dimensions = [d for d in (group_by or '').split(',') if d]
+    unknown = [d for d in dimensions if d not in DIMENSIONS]
+    if unknown:
+        raise QueryError({'group_by': f"Dimensions inconnues: {', '.join(unknown)} (possibles: {', '.join(DIMENSIONS)})."})
+    parsed = {}
+    for item in filters:
+        dimension, _, values = item.partition(':')
+        if dimension not in DIMENSIONS or dimension in ('jour', 'mois') or not values:
+            raise QueryError({'filter': f"Filtre invalide: {item!r} (dimension:valeur|valeur attendu; dates: debut/fin)."})
+        parsed[dimension] = values.split('|')
+    if 'quartier' in parsed:
+        by_name = registry().by_name
+        missing = [v for v in parsed['quartier'] if v not in by_name]
+        if missing:
+            raise QueryError({'filter': f"Quartier inconnu: {', '.join(missing)}."})
+        parsed['quartier'] = [by_name[v].id for v in parsed['quartier']]
+    for dimension in ('proprietaire', 'technicien'):
+        if dimension in parsed:
+            parsed[dimension] = _parse_ids(parsed[dimension])
+    debut = _parse_date(debut, 'debut') if debut else None
+    fin = _parse_date(fin, 'fin') if fin else None
+    return {'group_by': tuple(dict.fromkeys(dimensions)), 'filters': parsed, 'debut': debut, 'fin': fin}
+
+
+def _labels(dimension, values):
+    """Display value of each key of a dimension."""
+    values = set(values)
+    if dimension == 'quartier':
+        return {v: getattr(registry().by_id.get(v), 'nom', 'Inconnu') for v in values}
+    if dimension == 'proprietaire':
+        return dict(Proprietaire.objects.filter(pk__in=values).values_list('pk', 'nom'))
+    if dimension == 'technicien':
+        return dict(Technicien.objects.filter(pk__in=values).values_list('pk', 'nom'))
+    return {v: v.isoformat() if isinstance(v, date) else v for v in values}
+
+
+def _compute(group_by, filters, debut, fin):
+    needed = {DIMENSIONS[d] for d in (*group_by, *filters)} - {'periode'}
+    cuboide = next(name for name, fields in CUBOIDES.items() if needed <= set(fields))
+    by_month = (not debut or debut.day == 1) and (not fin or fin.day == 1)
+    granularite = 'mois' if by_month and 'jour' not in group_by else 'jour'
+    cells = CubeIntervention.objects.filter(cuboide=cuboide, granularite=granularite)
+    if debut:
+        cells = cells.filter(periode__gte=debut)
+    if fin:
+        cells = cells.filter(periode__lt=fin)
+    for dimension, values in filters.items():
+        cells = cells.filter(**{f'{DIMENSIONS[dimension]}__in': values})
+
+    names = [f'dim_{d}' for d in group_by]
+    columns = [TruncMonth('periode') if d == 'mois' and granularite == 'jour' else F(DIMENSIONS[d]) for d in group_by]
+    rows = list(
+        cells.order_by().values(**dict(zip(names, columns)))
+        .annotate(nombre=Sum('nombre'), cout=Sum('cout'), duree=Sum('duree'), impact_co2=Sum('impact_co2'))
+        .order_by(*names)
+    )
+    labels = {d: _labels(d, [r[n] for r in rows]) for d, n in zip(group_by, names)}
+    lignes = [
+        {**{d: labels[d].get(r[n], r[n]) for d, n in zip(group_by, names)},
+         'nombre': r['nombre'], 'cout': float(r['cout']), 'duree': r['duree'], 'impact_co2': float(r['impact_co2'])}
+        for r in rows
+    ]
+    total = {m: sum(l[m] for l in lignes) for m in MESURES}
+    total['cout'], total['impact_co2'] = round(total['cout'], 2), round(total['impact_co2'], 2)
+    return {'granularite': granularite, 'group_by': list(group_by), 'lignes': lignes, 'total': total}
+
+
+def query(group_by=(), filters=None, debut=None, fin=None):
+    """Sums of the measures per combination of the group_by dimensions, cached until the cube changes."""
+    filters = filters or {}
+    key = caching.versioned_key('cube:interventions', (CubeIntervention,), group_by, sorted(filters.items()), debut, fin)
+    return caching.get_or_compute(key, lambda: _compute(group_by, filters, debut, fin), QUERY_TTL)
@@ -0,0 +1,44 @@
+"""
+Helpers shared by the modules that read or write rows in bulk.
+"""
+from django.db import connections
+
+
+def chunks(ids):
+    """Splits `ids` into lists short enough for one `pk__in` filter on this backend."""
+    ids = list(ids)
+    size = connections['default'].ops.bulk_batch_size(['pk'], ids) or len(ids) or 1
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def timestamps(dates):
+    """Datetimes or raw database values (SQLite: ISO strings, UTC) -> aware UTC Timestamps and epoch seconds."""
+    import pandas as pd  # Loaded on first use: importing it would slow every process startup
+
+    ts = pd.DatetimeIndex(pd.to_datetime(pd.Series(dates), utc=True, format='ISO8601'))
+    return ts, (ts - pd.Timestamp(0, tz='UTC')).total_seconds().to_numpy()
+
+
+def raw_rows(queryset):
+    """
+    Rows of a values_list() queryset as the database driver returns them. Skips Django's
+    per-value converters (a UUID and a datetime object per row), which cost more than the
+    processing itself at 100k rows per second. UUIDs come back in their column form.
+    """
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def raw_batches(queryset, size):
+    """
+    raw_rows() in batches of `size`, read through a server-side cursor where the backend
+    has one (PostgreSQL), so memory stays bounded whatever the number of rows.
+    """
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connections[queryset.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(size):
+            yield rows
@@ -0,0 +1,197 @@
+"""
+District registry shared by the API, the simulators, the generators and (through
+/api/districts/) the dashboard.
+
+The District table is read once per process into an immutable DistrictRegistry.
+Its polygons are indexed on a regular grid, so locating thousands of sensors only
+runs point-in-polygon tests against the one or two districts overlapping each cell.
+"""
+import random
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
+
+DEFAULT_DISTRICT = "Sousse Ville"
+GRID_SIZE = 64  # Cells per side of the polygon index
+
+DistrictInfo = namedtuple('DistrictInfo', ['id', 'nom', 'latitude', 'longitude', 'polygone'])
+
+
+def points_in_polygon(lats, lons, polygon):
+    """Vectorized even-odd ray casting: boolean mask of the points inside `polygon`."""
+    inside = np.zeros(len(lats), dtype=bool)
+    n = len(polygon)
+    for k in range(n):
+        lat1, lon1 = polygon[k]
+        lat2, lon2 = polygon[(k + 1) % n]
+        crosses = (lat1 > lats) != (lat2 > lats)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lon_at = lon1 + (lats - lat1) * (lon2 - lon1) / (lat2 - lat1)
+        inside ^= crosses & (lons < lon_at)
+    return inside
+
+
+def _is_convex(polygon):
+    signs = set()
+    n = len(polygon)
+    for k in range(n):
+        (a0, a1), (b0, b1), (c0, c1) = polygon[k], polygon[(k + 1) % n], polygon[(k + 2) % n]
+        cross = (b0 - a0) * (c1 - b1) - (b1 - a1) * (c0 - b0)
+        if cross:
+            signs.add(cross > 0)
+    return len(signs) <= 1
+
+
+class PolygonGrid:
+    """Uniform grid over the polygons' bounding box; each cell lists the polygons overlapping it."""
+
+    def __init__(self, polygons, size=GRID_SIZE):
+        self.polygons = [np.asarray(p, dtype=float) for p in polygons]
+        self.size = size
+        usable = [p for p in self.polygons if len(p) >= 3]
+        if not usable:
+            self.cells = {}
+            self.interior = {}
+            return
+        points = np.vstack(usable)
+        self.lat0, self.lon0 = points.min(axis=0)
+        lat1, lon1 = points.max(axis=0)
+        self.dlat = (lat1 - self.lat0) / size or 1.0
+        self.dlon = (lon1 - self.lon0) / size or 1.0
+
+        self.cells = {}
+        self.interior = {}  # cell -> polygon index when one convex polygon covers the whole cell
+        for idx, poly in enumerate(self.polygons):
+            if len(poly) < 3:
+                continue
+            (plat0, plon0), (plat1, plon1) = poly.min(axis=0), poly.max(axis=0)
+            i0, j0 = self._cell(plat0, plon0)
+            i1, j1 = self._cell(plat1, plon1)
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.cells.setdefault((i, j), []).append(idx)
+            if _is_convex(poly.tolist()):
+                # Every grid corner over the polygon in one pass: a cell is inside when its 4 corners are
+                ii, jj = np.meshgrid(np.arange(i0, i1 + 2), np.arange(j0, j1 + 2), indexing='ij')
+                corners = points_in_polygon((self.lat0 + ii * self.dlat).ravel(),
+                                            (self.lon0 + jj * self.dlon).ravel(), poly).reshape(ii.shape)
+                full = corners[:-1, :-1] & corners[1:, :-1] & corners[:-1, 1:] & corners[1:, 1:]
+                for a, b in zip(*np.nonzero(full)):
+                    self.interior[(i0 + int(a), j0 + int(b))] = idx
+
+    def _cell(self, lat, lon):
+        i = min(max(int((lat - self.lat0) // self.dlat), 0), self.size - 1)
+        j = min(max(int((lon - self.lon0) // self.dlon), 0), self.size - 1)
+        return i, j
+
+    def locate(self, lats, lons):
+        """Polygon index of each point, -1 when a point falls in no polygon."""
+        result = np.full(len(lats), -1, dtype=np.int64)
+        if not self.cells:
+            return result
+        ci = np.floor((lats - self.lat0) / self.dlat).astype(np.int64)
+        cj = np.floor((lons - self.lon0) / self.dlon).astype(np.int64)
+        in_grid = (ci >= 0) & (ci < self.size) & (cj >= 0) & (cj < self.size)
+        keys = np.where(in_grid, ci * self.size + cj, -1)
+
+        for key in np.unique(keys[in_grid]):
+            members = np.flatnonzero(keys == key)
+            cell = divmod(int(key), self.size)
+            if cell in self.interior:
+                result[members] = self.interior[cell]
+                continue
+            for idx in self.cells.get(cell, ()):
+                todo = members[result[members] == -1]
+                if not todo.size:
+                    break
+                hit = points_in_polygon(lats[todo], lons[todo], self.polygons[idx])
+                result[todo[hit]] = idx
+        return result
+
+
+class DistrictRegistry:
+    """Immutable snapshot of the District table."""
+
+    def __init__(self, districts):
+        self.districts = tuple(districts)
+        self.by_name = MappingProxyType({d.nom: d for d in self.districts})
+        self.by_id = MappingProxyType({d.id: d for d in self.districts})
+        self.centers = MappingProxyType({d.nom: (d.latitude, d.longitude) for d in self.districts})
+        self.sorted_names = tuple(sorted(self.by_name))
+        self._ids = np.array([d.id for d in self.districts], dtype=np.int64)
+        self._centroids = np.array([(d.latitude, d.longitude) for d in self.districts], dtype=float).reshape(-1, 2)
+        self._grid = PolygonGrid([d.polygone for d in self.districts])
+
+    @property
+    def names(self):
+        return tuple(self.by_name)
+
+    def default(self):
+        return self.by_name.get(DEFAULT_DISTRICT) or self.districts[0]
+
+    def coordinates(self, ids):
+        """Centroid (lat, lon) of each district id, as an (n, 2) array; NaN for unknown ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        result = np.full((len(ids), 2), np.nan)
+        if self.districts:
+            idx = np.minimum(np.searchsorted(self._ids, ids), len(self._ids) - 1)  # _ids are in pk order
+            known = self._ids[idx] == ids
+            result[known] = self._centroids[idx[known]]
+        return result
+
+    def locate(self, lats, lons):
+        """District id for each (lat, lon); points outside every polygon go to the nearest centroid."""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        if not self.districts:
+            return np.zeros(len(lats), dtype=np.int64)
+        idx = self._grid.locate(lats, lons)
+        outside = np.flatnonzero(idx == -1)
+        if outside.size:
+            d2 = (lats[outside, None] - self._centroids[None, :, 0]) ** 2 + \
+                 (lons[outside, None] - self._centroids[None, :, 1]) ** 2
+            idx[outside] = d2.argmin(axis=1)
+        return self._ids[idx]
+
+
+@lru_cache(maxsize=1)
+def registry():
+    from .models import District
+
+    rows = District.objects.order_by('pk').values_list('pk', 'nom', 'latitude', 'longitude', 'polygone')
+    return DistrictRegistry(
+        DistrictInfo(pk, nom, lat, lon, tuple(tuple(pt) for pt in (poly or ())))
+        for pk, nom, lat, lon, poly in rows
+    )
+
+
+def reload_registry():
+    """Drops the cached registry (after editing the District table)."""
+    registry.cache_clear()
+
+
+def assign_districts(capteurs, force=False):
+    """
+    Sets district and quartier on Capteur objects from their coordinates (one vectorized
+    pass). Only those without a district, unless force=True (their coordinates changed).
+    With no districts loaded yet (fresh database), the district is left unset.
+    """
+    if not force:
+        capteurs = [c for c in capteurs if c.district_id is None]
+    if not capteurs:
+        return
+    reg = registry()
+    if not reg.districts:
+        return
+    ids = reg.locate([float(c.latitude) for c in capteurs], [float(c.longitude) for c in capteurs])
+    for capteur, district_id in zip(capteurs, ids.tolist()):
+        capteur.district_id = district_id
+        capteur.quartier = reg.by_id[district_id].nom
+
+
+def get_gaussian_coords(district):
+    reg = registry()
+    info = reg.by_name.get(district) or reg.default()
+    return random.gauss(info.latitude, 0.01), random.gauss(info.longitude, 0.01)
@@ -0,0 +1,180 @@
+"""
+Vehicle position model.
+
+Each vehicle has one PositionVehicule row and moves along the straight line
+between the origin and destination of its current Trajet. A tick advances every
+vehicle at once with NumPy; vehicles that reach their destination pick up their
+next trajet (deterministic round-robin over their own trips, by departure).
+"""
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+
+from . import caching, gazetteer
+from .dbutils import chunks
+from .districts import registry
+from .models import PositionVehicule, Trajet, VehiculeAutonome
+
+TICK_MINUTES = 5  # Simulated minutes per tick
+
+def _stable_hash(text):
+    # crc32 is stable across processes, unlike hash() which depends on PYTHONHASHSEED
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def _stable_district(text):
+    reg = registry()
+    info = reg.by_name[reg.sorted_names[_stable_hash(text) % len(reg.sorted_names)]]
+    return info.latitude, info.longitude
+
+
+def resolve_place(label, district_id=None):
+    """Maps an origin/destination to (lat, lon), preferring the district resolved at write time."""
+    if district_id is None:
+        district_id = gazetteer.match(label)
+    info = registry().by_id.get(district_id)
+    if info is not None:
+        return info.latitude, info.longitude
+    # Unknown place: pin it to a stable district instead of the city center
+    return _stable_district(label)
+
+
+def parking_position(plaque):
+    """Deterministic resting position for a vehicle without any trajet."""
+    h = _stable_hash(plaque)
+    lat, lon = _stable_district(plaque)
+    return lat + ((h >> 8) % 100 - 50) / 8000.0, lon + ((h >> 16) % 100 - 50) / 8000.0
+
+
+def ensure_positions():
+    """Creates the missing PositionVehicule rows (vehicles added since the last tick)."""
+    missing = VehiculeAutonome.objects.filter(position__isnull=True).values_list('id_vehicule', 'plaque_immatriculation')
+    rows = []
+    for vehicule_id, plaque in missing.iterator(chunk_size=2000):
+        lat, lon = parking_position(plaque)
+        rows.append(PositionVehicule(vehicule_id=vehicule_id, latitude=lat, longitude=lon, progression=1.0))
+    if rows:
+        PositionVehicule.objects.bulk_create(rows, batch_size=1000)
+        caching.bump(PositionVehicule)
+    return len(rows)
+
+
+# Trip order of a vehicle: by departure (undated trips first, on every backend), then id
+TRIP_ORDER = (F('date_depart').asc(nulls_first=True), 'pk')
+# Columns of a trajet used to move its vehicle (read with the positions as trajet__<column>)
+TRIP_COLUMNS = ('origine', 'destination', 'district_origine', 'district_destination', 'duree', 'date_depart')
+
+
+def _first(trips):
+    return Subquery(trips.order_by(*TRIP_ORDER).values('pk')[:1])
+
+
+def _next_trajets(current):
+    """
+    Picks, for each vehicle of `current` ({vehicule_id: (trajet_id, date_depart)} of its
+    current trajet, trajet_id None without one), the trajet following it, or its first
+    trajet after the last one. Each pick is one seek on the (vehicule, date_depart) index:
+    the cost does not grow with the trip history.
+    """
+    trips = Trajet.objects.filter(vehicule=OuterRef('vehicule_id'))
+    after = {
+        # Current trip undated: the undated ones after it, then every dated one
+        True: trips.filter(Q(date_depart__isnull=False) | Q(date_depart__isnull=True, pk__gt=OuterRef('trajet_id'))),
+        # The >= bound alone lets the database seek the index to the current departure
+        False: trips.filter(date_depart__gte=OuterRef('trajet__date_depart')).filter(
+            Q(date_depart__gt=OuterRef('trajet__date_depart')) | Q(pk__gt=OuterRef('trajet_id'))),
+    }
+    groups = {}
+    for vehicule_id, (trajet_id, date_depart) in current.items():
+        groups.setdefault(None if trajet_id is None else date_depart is None, []).append(vehicule_id)
+    picks = {}
+    for undated, ids in groups.items():
+        # Without a current trip (None), or past the last one, a vehicle starts over at its first
+        picked = {'premier': _first(trips)}
+        if undated is not None:
+            picked['suivant'] = _first(after[undated])
+        for chunk in chunks(ids):
+            rows = PositionVehicule.objects.filter(vehicule_id__in=chunk).annotate(**picked)
+            for row in rows.values('vehicule_id', *picked):
+                pk = row.get('suivant') or row['premier']
+                if pk is not None:
+                    picks[row['vehicule_id']] = pk
+    chosen = Trajet.objects.only('pk', *TRIP_COLUMNS).in_bulk(list(picks.values()))
+    return {vehicule_id: chosen[pk] for vehicule_id, pk in picks.items()}
+
+
+def _coordinates(labels, district_ids, parked):
+    """resolve_place() for every vehicle at once: one lookup for the resolved districts, `parked` without a trajet."""
+    coords = registry().coordinates([-1 if d is None else d for d in district_ids])
+    for i in np.flatnonzero(np.isnan(coords[:, 0])):
+        coords[i] = parked[i] if labels[i] is None else resolve_place(labels[i], district_ids[i])
+    return coords
+
+
+@transaction.atomic
+def advance_fleet(ticks=1, minutes_per_tick=TICK_MINUTES):
+    """Advances every vehicle by `ticks` ticks. Returns the number of vehicles moved."""
+    ensure_positions()
+    rows = PositionVehicule.objects.order_by('vehicule_id').values_list(
+        'vehicule_id', 'trajet_id', 'progression', 'latitude', 'longitude', 'tick', *(f'trajet__{c}' for c in TRIP_COLUMNS)
+    )
+    columns = [list(c) for c in zip(*rows)]
+    if not columns:
+        return 0
+    vehicules, trajets, progress, lats, lons, tick, origine, destination, district_origine, district_destination, duree, depart = columns
+
+    n = len(vehicules)
+    progress = np.array(progress, dtype=float)
+    has_trip = np.array([t is not None for t in trajets], dtype=bool)
+    duree = np.maximum(np.array([d or 1 for d in duree], dtype=float), 1.0)
+    progress = np.where(has_trip, progress + ticks * minutes_per_tick / duree, 1.0)
+
+    # Vehicles that arrived (or never had a trajet) start their next trip
+    finished = np.flatnonzero(progress >= 1.0)
+    if finished.size:
+        nexts = _next_trajets({vehicules[i]: (trajets[i], depart[i]) for i in finished})
+        for i in finished:
+            trajet = nexts.get(vehicules[i])
+            if trajet is not None:
+                trajets[i], progress[i] = trajet.pk, 0.0
+                origine[i], destination[i] = trajet.origine, trajet.destination
+                district_origine[i], district_destination[i] = trajet.district_origine_id, trajet.district_destination_id
+    progress = np.clip(progress, 0.0, 1.0)
+
+    parked = np.column_stack([np.array(lats, dtype=float), np.array(lons, dtype=float)])
+    start = _coordinates(origine, district_origine, parked)
+    end = _coordinates(destination, district_destination, parked)
+    coords = start + (end - start) * progress[:, None]
+
+    # One CASE ... WHEN update per batch of 1000 vehicles
+    PositionVehicule.objects.bulk_update(
+        [PositionVehicule(vehicule_id=v, trajet_id=t, progression=p, latitude=la, longitude=lo, tick=k + ticks)
+         for v, t, p, la, lo, k in zip(vehicules, trajets, progress.tolist(), coords[:, 0].tolist(), coords[:, 1].tolist(), tick)],
+        ['trajet', 'progression', 'latitude', 'longitude', 'tick'], batch_size=1000,
+    )
+    caching.bump(PositionVehicule)  # bulk_update sends no post_save
+    return n
+
+
+def positions_payload():
+    """Compact column-oriented payload for /api/vehicules/positions/."""
+    ensure_positions()
+    rows = PositionVehicule.objects.order_by('vehicule__plaque_immatriculation').values_list(
+        'vehicule__plaque_immatriculation', 'latitude', 'longitude', 'progression', 'tick'
+    )
+    plaques, lat, lon, progression, ticks = [], [], [], [], []
+    for plaque, la, lo, prog, tick in rows.iterator(chunk_size=2000):
+        plaques.append(plaque)
+        lat.append(round(la, 5))
+        lon.append(round(lo, 5))
+        progression.append(round(prog, 3))
+        ticks.append(tick)
+    return {
+        "tick": max(ticks, default=0),
+        "plaques": plaques,
+        "lat": lat,
+        "lon": lon,
+        "progression": progression,
+    }
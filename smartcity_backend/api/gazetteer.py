@@ -0,0 +1,131 @@
+"""
+Gazetteer: resolves free-text places ("Simulated (Msaken)", "12 Rue X, Sahloul, 4000 Sousse")
+to a District id.
+
+District names come from the shared registry (districts.py); together with the
+aliases below they are compiled once per process into an Aho-Corasick automaton, so a
+label is matched in a single pass whatever the number of aliases. Trajets resolve
+their districts at write time (Trajet.sync_districts), so readers join on the
+integer key and never run this matcher themselves.
+"""
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+from .districts import registry, reload_registry
+
+# Neighbourhoods and spelling variants found in generated/legacy addresses -> district
+ALIASES = {
+    "medina": "Sousse Ville", "la medina": "Sousse Ville", "trocadero": "Sousse Ville",
+    "corniche": "Sousse Ville", "sidi boujaafar": "Sousse Ville", "centre-ville": "Sousse Ville",
+    "jawhara": "Sousse Jawhara", "sahloul": "Sousse Jawhara", "khezama": "Sousse Jawhara",
+    "riadh": "Sousse Riadh", "cite riadh": "Sousse Riadh", "bouhsina": "Sousse Riadh",
+    "kantaoui": "Hammam Sousse", "el kantaoui": "Hammam Sousse",
+    "kalaa seghira": "Kalaa Sghira", "kalaa kbira": "Kalaa Kebira",
+    "zaouia": "Zaouia Ksiba Thrayet", "ksiba": "Zaouia Ksiba Thrayet", "thrayet": "Zaouia Ksiba Thrayet",
+    "enfidha": "Ennfidha",
+}
+
+_PARENS = re.compile(r"\(([^()]*)\)\s*$")
+
+
+def normalize(text):
+    """Lowercases and strips accents ("Cité Riadh" -> "cite riadh")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every pattern occurrence in one scan of the text."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pattern, value in patterns.items():
+            node = 0
+            for ch in pattern:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.out[node].append((len(pattern), value))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def iter_matches(self, text):
+        """Yields (end_index, length, value) for every match."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, value in self.out[node]:
+                yield i, length, value
+
+
+@lru_cache(maxsize=1)
+def _tables():
+    reg = registry()
+    by_name = {normalize(d.nom): d.id for d in reg.districts}
+    patterns = dict(by_name)
+    for alias, nom in ALIASES.items():
+        if normalize(nom) in by_name:
+            patterns.setdefault(alias, by_name[normalize(nom)])
+    return by_name, AhoCorasick(patterns)
+
+
+def clear_cache():
+    reload_registry()
+    _tables.cache_clear()
+    match.cache_clear()
+
+
+def _is_word_boundary(text, start, end):
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
+
+
+@lru_cache(maxsize=8192)
+def match(label):
+    """Returns the District id named in `label`, or None when nothing matches."""
+    if not label:
+        return None
+    by_name, automaton = _tables()
+    text = normalize(label)
+
+    # "... (Msaken)" suffix written by the simulators is authoritative
+    suffix = _PARENS.search(text)
+    if suffix and suffix.group(1).strip() in by_name:
+        return by_name[suffix.group(1).strip()]
+
+    # Otherwise the longest whole-word alias wins, the first one on ties
+    best = None
+    for end, length, value in automaton.iter_matches(text):
+        start = end - length + 1
+        if not _is_word_boundary(text, start, end + 1):
+            continue
+        if best is None or length > best[0] or (length == best[0] and start < best[1]):
+            best = (length, start, value)
+    return best[2] if best else None
+
+
+def resolve(label):
+    """Like match() but falls back to the default district."""
+    district_id = match(label)
+    if district_id is None:
+        district_id = registry().default().id
+    return district_id
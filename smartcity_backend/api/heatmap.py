@@ -0,0 +1,274 @@
+"""
+Heatmaps interpolated from point sensors, served as XYZ map tiles.
+
+Layers:
+- 'qualite_air': the AQI of each air-quality sensor (see aqi.py).
+- 'trafic': the traffic sensors, valued by the number of trajets starting or ending in
+  their district over the last 24 h of trips (the sensors report no counts yet).
+
+Values are interpolated by inverse-distance weighting over the K nearest sensors,
+within MAX_DISTANCE_KM, on the governorate's bounding box. Neighbours come from a
+KD-tree (scipy's cKDTree when installed, a chunked NumPy search otherwise) and a
+whole tile is evaluated as arrays.
+
+A layer's interpolator is built once per data version. Tiles (PNG bytes or value
+grids) are cached under keys versioned on the models the layer reads, so new
+readings or trips invalidate them.
+"""
+import math
+import struct
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count, Max
+
+from . import aqi, caching
+from .districts import registry
+from .models import Capteur, District, Mesure, Trajet
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Optional dependency
+    cKDTree = None
+
+TILE_SIZE = 256
+SAMPLE = 64  # Interpolated points per tile side
+MIN_ZOOM, MAX_ZOOM = 8, 16
+GRID_SIZE = 128  # Overview grid (GET /api/heatmap/<layer>/)
+K_NEIGHBOURS = 8
+POWER = 2
+MAX_DISTANCE_KM = 4.0
+ALPHA = 170
+KM_PER_DEGREE = 111.32
+TILE_TTL = 300
+BROWSER_TTL = 60  # Cache-Control max-age of PNG tiles
+FALLBACK_CELLS = 4_000_000  # Distances computed at once by the NumPy neighbour search
+
+# (upper bound, RGB): the AQI categories; traffic uses a sequential ramp on its own scale
+AQI_COLORS = [
+    (50, (0, 228, 0)), (100, (255, 255, 0)), (150, (255, 126, 0)),
+    (200, (255, 0, 0)), (300, (143, 63, 151)), (math.inf, (126, 0, 35)),
+]
+TRAFIC_COLORS = [(0.25, (255, 255, 178)), (0.5, (254, 204, 92)), (0.75, (253, 141, 60)), (math.inf, (227, 26, 28))]
+
+
+# --- Layers ---
+
+def _air_points():
+    capteurs = aqi.indices_capteurs()
+    aqis = dict(zip(capteurs['id'], capteurs.get('aqi', [])))
+    points, values = [], []
+    rows = Capteur.objects.filter(type_capteur='qualité_air').values_list('pk', 'latitude', 'longitude')
+    for pk, lat, lon in rows.iterator(chunk_size=5000):
+        value = aqis.get(str(pk))
+        if value is not None:
+            points.append((float(lat), float(lon)))
+            values.append(value)
+    return np.array(points, dtype=float).reshape(-1, 2), np.array(values, dtype=float)
+
+
+def _trafic_points():
+    latest = Trajet.objects.aggregate(d=Max('date_depart'))['d']
+    counts = {}
+    if latest is not None:
+        recent = Trajet.objects.filter(date_depart__gt=latest - timedelta(hours=24))
+        for field in ('district_origine', 'district_destination'):
+            for district_id, n in recent.values(field).annotate(n=Count('pk')).values_list(field, 'n'):
+                counts[district_id] = counts.get(district_id, 0) + n
+    rows = list(Capteur.objects.filter(type_capteur='trafic').values_list('latitude', 'longitude', 'district'))
+    points = np.array([(float(la), float(lo)) for la, lo, _ in rows], dtype=float).reshape(-1, 2)
+    return points, np.array([counts.get(d, 0) for _, _, d in rows], dtype=float)
+
+
+LAYERS = {
+    'qualite_air': {'points': _air_points, 'models': (Mesure, Capteur, District), 'colors': AQI_COLORS, 'scale': None},
+    'trafic': {'points': _trafic_points, 'models': (Trajet, Capteur, District), 'colors': TRAFIC_COLORS, 'scale': 'max'},
+}
+
+
+def bounding_box():
+    """(lat_min, lon_min, lat_max, lon_max) of the district polygons (centroids when there are none)."""
+    points = [p for d in registry().districts for p in (d.polygone or [(d.latitude, d.longitude)])]
+    if not points:
+        return None
+    lats, lons = zip(*points)
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+# --- Interpolation ---
+
+class Interpolator:
+    """Inverse-distance weighting over the K nearest points, in a local km projection."""
+
+    def __init__(self, points, values):
+        self.values = np.asarray(values, dtype=float)
+        self.lat0 = float(points[:, 0].mean()) if len(points) else 0.0
+        self.xy = self._project(points)
+        self.tree = cKDTree(self.xy) if cKDTree is not None and len(self.xy) else None
+
+    def _project(self, latlon):
+        latlon = np.asarray(latlon, dtype=float).reshape(-1, 2)
+        return np.column_stack([latlon[:, 0] * KM_PER_DEGREE, latlon[:, 1] * KM_PER_DEGREE * math.cos(math.radians(self.lat0))])
+
+    def _neighbours(self, xy, k):
+        if self.tree is not None:
+            distances, indices = self.tree.query(xy, k=k, distance_upper_bound=MAX_DISTANCE_KM)
+            return distances.reshape(len(xy), k), indices.reshape(len(xy), k)
+        # NumPy fallback: only the points near the queried area, then exact k nearest by chunks
+        distances = np.full((len(xy), k), np.inf)
+        indices = np.zeros((len(xy), k), dtype=np.int64)
+        low, high = xy.min(axis=0) - MAX_DISTANCE_KM, xy.max(axis=0) + MAX_DISTANCE_KM
+        candidates = np.flatnonzero(((self.xy >= low) & (self.xy <= high)).all(axis=1))
+        if not len(candidates):
+            return distances, indices
+        near = self.xy[candidates]
+        kk = min(k, len(candidates))
+        rows = max(1, FALLBACK_CELLS // len(candidates))
+        for start in range(0, len(xy), rows):
+            chunk = xy[start:start + rows]
+            d = np.sqrt(((chunk[:, None, :] - near[None, :, :]) ** 2).sum(axis=2))
+            nearest = np.argpartition(d, kk - 1, axis=1)[:, :kk] if kk < d.shape[1] else np.argsort(d, axis=1)[:, :kk]
+            distances[start:start + len(chunk), :kk] = np.take_along_axis(d, nearest, axis=1)
+            indices[start:start + len(chunk), :kk] = candidates[nearest]
+        distances[distances > MAX_DISTANCE_KM] = np.inf
+        return distances, indices
+
+    def evaluate(self, lats, lons):
+        """Interpolated values at the given points; NaN farther than MAX_DISTANCE_KM from every sensor."""
+        shape = np.shape(lats)
+        result = np.full(int(np.prod(shape)), np.nan)
+        if not len(self.xy):
+            return result.reshape(shape)
+        xy = self._project(np.column_stack([np.ravel(lats), np.ravel(lons)]))
+        k = min(K_NEIGHBOURS, len(self.xy))
+        distances, indices = self._neighbours(xy, k)
+        found = np.isfinite(distances)
+        indices = np.where(found, indices, 0)
+        # A sensor right on the pixel gets all the weight
+        weights = np.where(found, 1.0 / np.maximum(distances, 1e-6) ** POWER, 0.0)
+        total = weights.sum(axis=1)
+        covered = total > 0
+        result[covered] = (weights[covered] * self.values[indices[covered]]).sum(axis=1) / total[covered]
+        return result.reshape(shape)
+
+
+_INTERPOLATORS = {}
+
+
+def interpolator(layer):
+    """The layer's interpolator for the current data version (rebuilt after writes)."""
+    key = caching.versioned_key(f'heatmap:{layer}', LAYERS[layer]['models'])
+    cached = _INTERPOLATORS.get(layer)
+    if cached is None or cached[0] != key:
+        cached = (key, Interpolator(*LAYERS[layer]['points']()))
+        _INTERPOLATORS[layer] = cached
+    return cached[1]
+
+
+# --- Tiles ---
+
+def tile_bounds(z, x, y):
+    """(lat_north, lon_west, lat_south, lon_east) of an XYZ (Web Mercator) tile."""
+    n = 2 ** z
+
+    def lat(t):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * t / n))))
+
+    return lat(y), x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180
+
+
+def _upsample(grid, size):
+    """Bilinear resize of a square grid (NaN spreads to the pixels it touches)."""
+    n = grid.shape[0]
+    at = (np.arange(size) + 0.5) * n / size - 0.5
+    i0 = np.clip(np.floor(at).astype(int), 0, n - 1)
+    i1 = np.clip(i0 + 1, 0, n - 1)
+    t = np.clip(at - i0, 0, 1)
+    rows = grid[i0] * (1 - t)[:, None] + grid[i1] * t[:, None]
+    return rows[:, i0] * (1 - t)[None, :] + rows[:, i1] * t[None, :]
+
+
+def tile_values(layer, z, x, y, size=TILE_SIZE):
+    """
+    size x size interpolated values of a tile (pixel centers, Mercator rows), NaN where
+    unknown. IDW surfaces are smooth: they are evaluated on at most SAMPLE x SAMPLE
+    points, then resized.
+    """
+    north, west, south, east = tile_bounds(z, x, y)
+    box = bounding_box()
+    if box is None or south > box[2] or north < box[0] or west > box[3] or east < box[1]:
+        return np.full((size, size), np.nan)  # Outside the governorate
+    sample = min(size, SAMPLE)
+    rows = y + (np.arange(sample) + 0.5) / sample
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * rows / 2 ** z))))
+    lons = west + (np.arange(sample) + 0.5) / sample * (east - west)
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing='ij')
+    values = interpolator(layer).evaluate(grid_lat, grid_lon)
+    return values if sample == size else _upsample(values, size)
+
+
+def colorize(values, layer):
+    """RGBA pixels for a value grid; unknown values are transparent."""
+    colors = LAYERS[layer]['colors']
+    scaled = values
+    if LAYERS[layer]['scale'] == 'max':
+        sensors = interpolator(layer).values
+        top = sensors.max() if len(sensors) else 0
+        scaled = values / top if top else values * 0  # Keeps NaN
+    bounds = np.array([b for b, _ in colors])
+    palette = np.array([c for _, c in colors], dtype=np.uint8)
+    known = ~np.isnan(scaled)
+    slot = np.searchsorted(bounds, np.where(known, scaled, 0), side='left').clip(0, len(colors) - 1)
+    rgba = np.zeros(values.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = palette[slot]
+    rgba[..., 3] = np.where(known, ALPHA, 0)
+    return rgba
+
+
+def encode_png(rgba):
+    """Minimal RGBA PNG encoder (no imaging dependency)."""
+    height, width = rgba.shape[:2]
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # Filter byte 0 per row
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)) + chunk(b'IEND', b'')
+
+
+def _tile_key(layer, kind, z, x, y):
+    return caching.versioned_key(f'heatmap:tile:{layer}:{kind}', LAYERS[layer]['models'], z, x, y)
+
+
+def png_tile(layer, z, x, y):
+    return caching.get_or_compute(
+        _tile_key(layer, 'png', z, x, y), lambda: encode_png(colorize(tile_values(layer, z, x, y), layer)), TILE_TTL
+    )
+
+
+def value_tile(layer, z, x, y, size=64):
+    """Coarser value grid of a tile for clients that colour it themselves (null: no data)."""
+    def compute():
+        values = tile_values(layer, z, x, y, size)
+        return {'z': z, 'x': x, 'y': y, 'bounds': tile_bounds(z, x, y), 'size': size,
+                'valeurs': [[None if np.isnan(v) else round(float(v), 1) for v in row] for row in values]}
+    return caching.get_or_compute(_tile_key(layer, 'json', z, x, y), compute, TILE_TTL)
+
+
+def overview(layer, size=GRID_SIZE):
+    """Whole-governorate value grid (north row first), for an image overlay."""
+    def compute():
+        box = bounding_box()
+        if box is None:
+            return {'bounds': None, 'valeurs': []}
+        lat_min, lon_min, lat_max, lon_max = box
+        lats = lat_max - (np.arange(size) + 0.5) / size * (lat_max - lat_min)
+        lons = lon_min + (np.arange(size) + 0.5) / size * (lon_max - lon_min)
+        grid_lat, grid_lon = np.meshgrid(lats, lons, indexing='ij')
+        values = interpolator(layer).evaluate(grid_lat, grid_lon)
+        return {'bounds': box, 'size': size,
+                'valeurs': [[None if np.isnan(v) else round(float(v), 1) for v in row] for row in values]}
+    return caching.get_or_compute(caching.versioned_key(f'heatmap:grid:{layer}', LAYERS[layer]['models'], size), compute, TILE_TTL)
@@ -0,0 +1,356 @@
+"""
+Bulk import of sensor inventories (Capteur) and intervention history (Intervention)
+from CSV or Parquet files, e.g. when a new municipality is onboarded.
+
+load() streams the file in batches of `batch_size` rows (pandas.read_csv chunks or
+pyarrow record batches), so memory stays bounded by one batch. Each batch is checked
+column by column (choices, numbers, dates, identifiers), its references are resolved
+against lookup dicts built once per run (owners by id or name, known sensor ids), and
+the valid rows are inserted in one transaction. Invalid rows go to a rejects CSV with
+their line number and reason; they do not stop the import.
+
+A checkpoint row (RepriseImport) records how many lines are done. It is saved in the
+transaction that inserts the batch, so it never disagrees with the rows stored:
+load(..., resume=True) goes on from there after a crash or an interrupt.
+The rows are written with raw statements, so the cost cube is rebuilt once at the end
+of an intervention import (see cube.py).
+"""
+import os
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import caching, cube
+from .dbutils import chunks
+from .districts import registry
+from .models import Capteur, CubeIntervention, Intervention, Proprietaire, RepriseImport
+
+BATCH_SIZE = 50000
+FORMATS = ('csv', 'parquet')
+
+
+class ImportFileError(ValueError):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+# --- Column checks ---
+# Each check takes the batch and the running errors Series (one reason per line, '' when
+# valid) and returns the parsed column; only the first reason of a line is kept.
+
+def _reject(errors, mask, message):
+    errors[np.asarray(mask, dtype=bool) & (errors == '').to_numpy()] = message
+
+
+def _text(frame, column):
+    return frame[column].astype('string').fillna('').str.strip()
+
+
+def _choice(frame, errors, column, choices):
+    values = _text(frame, column)
+    _reject(errors, ~values.isin([key for key, _ in choices]), f"{column} invalide")
+    return values
+
+
+def _number(frame, errors, column, low=None, high=None):
+    values = pd.to_numeric(frame[column], errors='coerce')
+    bad = values.isna()
+    if low is not None:
+        bad |= values < low
+    if high is not None:
+        bad |= values > high
+    _reject(errors, bad, f"{column} invalide")
+    return values
+
+
+def _datetime(frame, errors, column):
+    """Aware UTC timestamps; times without an offset are in the current time zone."""
+    values = _text(frame, column)
+    aware = values.str.contains(r'(?:Z|[+-]\d\d:?\d\d)$', regex=True)
+    parsed = pd.Series(pd.NaT, index=frame.index, dtype='datetime64[ns, UTC]')
+    if aware.any():
+        parsed[aware] = pd.to_datetime(values[aware], errors='coerce', format='ISO8601', utc=True)
+    if (~aware).any():
+        naive = pd.to_datetime(values[~aware], errors='coerce', format='ISO8601')
+        parsed[~aware] = naive.dt.tz_localize(
+            str(timezone.get_current_timezone()), ambiguous='NaT', nonexistent='NaT',
+        ).dt.tz_convert('UTC')
+    _reject(errors, parsed.isna(), f"{column} invalide")
+    return parsed
+
+
+def _date(frame, errors, column):
+    parsed = pd.to_datetime(_text(frame, column), errors='coerce', format='ISO8601')
+    _reject(errors, parsed.isna(), f"{column} invalide")
+    return parsed
+
+
+def _uuid(frame, errors, column, required=True):
+    """32-digit hex strings ('' for an empty optional column)."""
+    values = _text(frame, column).str.lower().str.replace('-', '', regex=False)
+    bad = ~values.str.fullmatch(r'[0-9a-f]{32}')
+    if not required:
+        bad &= values != ''
+    _reject(errors, bad, f"{column} invalide")
+    return values
+
+
+def _new_ids(frame, errors, model, column):
+    """Optional primary keys: duplicates in the batch or already stored are rejected."""
+    if column not in frame:
+        return None
+    ids = _uuid(frame, errors, column, required=False)
+    given = ids != ''
+    _reject(errors, given & ids.duplicated(keep='first'), f"{column} en double")
+    stored = set()
+    for chunk in chunks(set(ids[given & (errors == '')])):
+        stored.update(pk.hex for pk in model.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+    _reject(errors, ids.isin(stored), f"{column} déjà importé")
+    return ids
+
+
+def _pks(ids, n):
+    """UUID primary keys: the given ones, new ones for empty (or missing) ids."""
+    if ids is None:
+        return [uuid.uuid4() for _ in range(n)]
+    return [uuid.UUID(v) if v else uuid.uuid4() for v in ids]
+
+
+def _insert(model, columns):
+    """
+    Raw INSERT of {field name: values}. bulk_create() would prepare every value of every
+    row one by one and send a statement per ~100 rows on SQLite; here each distinct value
+    is prepared once and the rows go through executemany().
+    """
+    meta = model._meta
+    db = connections['default']  # Resolved once: the `connection` proxy is a thread-local lookup
+    prepared = []
+    for name, values in columns.items():
+        field, memo = meta.get_field(name), {}
+        prepared.append([memo[v] if v in memo else memo.setdefault(v, field.get_db_prep_save(v, db))
+                         for v in values])
+    quote = db.ops.quote_name
+    insert = (f"INSERT INTO {quote(meta.db_table)} ({', '.join(quote(meta.get_field(n).column) for n in columns)}) "
+              f"VALUES ({', '.join(['%s'] * len(columns))})")
+    with db.cursor() as cursor:
+        cursor.executemany(insert, list(zip(*prepared)))
+
+
+# --- Kinds ---
+# build() checks a batch and returns the columns of its valid rows, ready for _insert().
+
+class _Kind:
+    model = None
+    columns = ()
+    related = ()
+
+    def __init__(self):
+        self.lookups = None
+
+    def lookup(self):
+        """Reference dicts, read once per run."""
+        return {}
+
+    def build(self, frame, errors):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class _Capteurs(_Kind):
+    model = Capteur
+    columns = ('type_capteur', 'latitude', 'longitude', 'statut', 'date_installation', 'proprietaire')
+    related = (Capteur,)
+
+    def lookup(self):
+        # An owner is named by its id or, when unambiguous, by its nom
+        owners, names = {}, {}
+        for pk, nom in Proprietaire.objects.values_list('pk', 'nom'):
+            owners[pk.hex] = pk
+            names.setdefault(nom.strip().lower(), []).append(pk)
+        for nom, pks in names.items():
+            owners.setdefault(nom, pks[0] if len(pks) == 1 else None)
+        return owners
+
+    def build(self, frame, errors):
+        ids = _new_ids(frame, errors, Capteur, 'id_capteur')
+        type_capteur = _choice(frame, errors, 'type_capteur', Capteur.TYPE_CHOICES)
+        latitude = _number(frame, errors, 'latitude', -90, 90).round(6)
+        longitude = _number(frame, errors, 'longitude', -180, 180).round(6)
+        statut = _choice(frame, errors, 'statut', Capteur.STATUT_CHOICES)
+        installation = _date(frame, errors, 'date_installation')
+        names = _text(frame, 'proprietaire').str.lower()
+        keys = names.str.replace('-', '', regex=False).where(names.str.fullmatch(r'[0-9a-f-]{32,36}'), names)
+        owners = keys.map(self.lookups)
+        _reject(errors, owners.isna(), "proprietaire inconnu ou ambigu")
+
+        valid = (errors == '').to_numpy()
+        # district/quartier from the coordinates, as CapteurManager.bulk_create() does
+        reg = registry()
+        districts = reg.locate(latitude[valid].to_numpy(float), longitude[valid].to_numpy(float)).tolist()
+        return {
+            'id_capteur': _pks(ids[valid] if ids is not None else None, int(valid.sum())),
+            'type_capteur': type_capteur[valid], 'latitude': latitude[valid], 'longitude': longitude[valid],
+            'statut': statut[valid], 'date_installation': installation[valid].dt.date,
+            'proprietaire': owners[valid],
+            'district': [d if d in reg.by_id else None for d in districts],
+            'quartier': [reg.by_id[d].nom if d in reg.by_id else 'Sousse' for d in districts],
+        }
+
+
+class _Interventions(_Kind):
+    model = Intervention
+    columns = ('capteur', 'date_heure', 'type_intervention', 'duree', 'cout', 'impact_co2')
+    related = (Intervention, CubeIntervention)
+
+    def lookup(self):
+        return {pk.hex for pk in Capteur.objects.values_list('pk', flat=True)}
+
+    def build(self, frame, errors):
+        ids = _new_ids(frame, errors, Intervention, 'id_intervention')
+        capteurs = _uuid(frame, errors, 'capteur')
+        known = self.lookups
+        _reject(errors, ~np.fromiter((c in known for c in capteurs), bool, len(capteurs)), "capteur inconnu")
+        date_heure = _datetime(frame, errors, 'date_heure')
+        type_intervention = _choice(frame, errors, 'type_intervention', Intervention.TYPE_CHOICES)
+        duree = _number(frame, errors, 'duree', 0, 2 ** 31 - 1)
+        _reject(errors, duree % 1 != 0, "duree invalide")
+        cout = _number(frame, errors, 'cout', 0, 10 ** 8 - 0.01).round(2)
+        impact = _number(frame, errors, 'impact_co2', 0, 10 ** 8 - 0.01).round(2)
+
+        valid = (errors == '').to_numpy()
+        return {
+            'id_intervention': _pks(ids[valid] if ids is not None else None, int(valid.sum())),
+            'capteur': capteurs[valid].tolist(),  # Hex strings, prepared once per sensor
+            'date_heure': date_heure[valid].dt.to_pydatetime(), 'type_intervention': type_intervention[valid],
+            'duree': duree[valid].astype('int64').tolist(), 'cout': cout[valid].tolist(),
+            'impact_co2': impact[valid].tolist(),
+        }
+
+    def finish(self):
+        # The rows bypass InterventionManager.bulk_create(): one rebuild instead of a merge per batch
+        cube.rebuild()
+
+
+KINDS = {'capteurs': _Capteurs, 'interventions': _Interventions}
+
+
+# --- Reading ---
+
+def file_format(path, fmt=None):
+    fmt = fmt or Path(path).suffix.lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ImportFileError({'format': f"Format inconnu: {fmt!r} (csv ou parquet)."})
+    return fmt
+
+
+def _columns(path, fmt):
+    if fmt == 'csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    import pyarrow.parquet as pq
+    return list(pq.ParquetFile(path).schema_arrow.names)
+
+
+def _batches(path, fmt, batch_size, skip):
+    """DataFrames of at most batch_size rows, the first `skip` data rows left out."""
+    if fmt == 'csv':
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=batch_size,
+                               skiprows=range(1, skip + 1))
+        return
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        yield batch.slice(skip).to_pandas().astype('string')
+        skip = 0
+
+
+# --- Checkpoints ---
+
+def checkpoint(path):
+    """The checkpoint of an interrupted import of `path`, or None."""
+    return RepriseImport.objects.filter(fichier=str(Path(path).resolve())).first()
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return {'taille': stat.st_size, 'modifie': stat.st_mtime_ns}
+
+
+def _read_checkpoint(path, kind):
+    state = checkpoint(path)
+    if state is None:
+        return None
+    if state.type_import != kind or (state.taille, state.modifie) != tuple(_signature(path).values()):
+        raise ImportFileError({'reprise': "Le fichier a changé depuis l'import interrompu."})
+    return state
+
+
+# --- Import ---
+
+def load(path, kind, fmt=None, batch_size=BATCH_SIZE, rejects=None, resume=False, progress=None):
+    """
+    Imports `path` as `kind` ('capteurs' or 'interventions').
+
+    Returns {'lues', 'importees', 'rejetees', 'rejets', 'duree_s'} for the whole file,
+    lines loaded by an interrupted run included when resuming.
+    """
+    if kind not in KINDS:
+        raise ImportFileError({'type': f"Type inconnu: {kind!r} ({', '.join(KINDS)})."})
+    if batch_size < 1:
+        raise ImportFileError({'batch_size': "Doit être positif."})
+    fmt = file_format(path, fmt)
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ImportFileError({'format': "Installer pyarrow pour lire du Parquet."})
+    spec = KINDS[kind]()
+    missing = [c for c in spec.columns if c not in _columns(path, fmt)]
+    if missing:
+        raise ImportFileError({'colonnes': f"Colonnes manquantes: {', '.join(missing)}."})
+
+    state = _read_checkpoint(path, kind) if resume else None
+    if state is None:
+        RepriseImport.objects.filter(fichier=str(Path(path).resolve())).delete()
+        state = RepriseImport(fichier=str(Path(path).resolve()), type_import=kind, **_signature(path))
+    rejects = Path(rejects) if rejects else Path(f"{path}.rejets.csv")
+    if not resume or state.lues == 0:
+        rejects.unlink(missing_ok=True)
+
+    start = time.perf_counter()
+    spec.lookups = spec.lookup()
+    with caching.invalidation_paused(*spec.related):
+        for frame in _batches(path, fmt, batch_size, state.lues):
+            frame.index = pd.RangeIndex(state.lues + 1, state.lues + 1 + len(frame), name='ligne')
+            errors = pd.Series('', index=frame.index, dtype=object)
+            columns = spec.build(frame, errors)
+            bad = frame[errors != '']
+            with transaction.atomic():
+                _insert(spec.model, columns)
+                state.lues += len(frame)
+                state.importees += len(frame) - len(bad)
+                state.rejetees += len(bad)
+                state.save()
+            if len(bad):
+                bad.assign(erreur=errors[errors != '']).to_csv(
+                    rejects, mode='a', header=not rejects.exists(),
+                )
+            if progress:
+                progress(state.lues, state.importees, state.rejetees, time.perf_counter() - start)
+        spec.finish()
+    if state.pk:
+        state.delete()
+    return {
+        'lues': state.lues, 'importees': state.importees, 'rejetees': state.rejetees,
+        'rejets': str(rejects) if state.rejetees else None,
+        'duree_s': round(time.perf_counter() - start, 2),
+    }
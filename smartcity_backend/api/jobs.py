@@ -0,0 +1,181 @@
+"""
+Local background job queue, stored in the Job table (no external broker).
+
+submit() records a pending Job and returns at once. `manage.py run_workers` runs a
+pool of worker processes; each claims the oldest pending job with a conditional
+UPDATE (so two workers never run the same job) and calls the handler registered for
+its type. Handlers report progress through JobContext.progress(), which doubles as
+the cancellation point: once POST /api/jobs/<id>/annuler/ has been called, the next
+progress() raises JobCancelled.
+"""
+import io
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import close_old_connections
+from django.db.models import Exists
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import simulation
+from .models import Capteur, Citoyen, Intervention, Job, Trajet
+
+HANDLERS = {}
+PARAMETRES = {}
+EXCLUSIVE = set()  # Types that must run alone (e.g. generation wipes the tables the others write to)
+COMMAND_ONLY = set()  # Types too destructive to accept from POST /api/jobs/, queued by a management command
+STALE_AFTER = timedelta(minutes=10)  # A running job not heard from since is considered lost
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def handler(type_job, parametres=(), exclusive=False, api=True):
+    """Registers the function running jobs of `type_job`, and the parameters it accepts."""
+    def register(fn):
+        HANDLERS[type_job] = fn
+        PARAMETRES[type_job] = frozenset(parametres)
+        if exclusive:
+            EXCLUSIVE.add(type_job)
+        if not api:
+            COMMAND_ONLY.add(type_job)
+        return fn
+    return register
+
+
+class JobContext:
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, fraction, message=""):
+        """Records progress (0 to 1); raises JobCancelled if cancellation was requested."""
+        updated = Job.objects.filter(pk=self.job.pk, annulation_demandee=False).update(
+            progression=min(max(float(fraction), 0.0), 1.0), message=message[:200], date_maj=timezone.now()
+        )
+        if not updated:
+            raise JobCancelled()
+
+
+def submit(type_job, parametres=None):
+    return Job.objects.create(type_job=type_job, parametres=parametres or {})
+
+
+def cancel(job):
+    """Pending jobs are cancelled right away; running ones at their next progress()."""
+    now = timezone.now()
+    if Job.objects.filter(pk=job.pk, statut='en_attente').update(
+        statut='annule', annulation_demandee=True, date_fin=now, date_maj=now
+    ):
+        return
+    Job.objects.filter(pk=job.pk, statut='en_cours').update(annulation_demandee=True)
+
+
+def claim(worker):
+    """
+    Atomically takes the oldest pending job that may start now, or returns None.
+
+    The check and the claim are one conditional UPDATE: an exclusive job starts only
+    when nothing runs, other jobs only when no exclusive job runs. A pending exclusive
+    job also holds back the jobs queued after it.
+    """
+    running = Job.objects.filter(statut='en_cours')
+    candidates = Job.objects.filter(statut='en_attente').order_by('date_creation').values_list('pk', 'type_job')[:10]
+    for pk, type_job in candidates:
+        exclusive = type_job in EXCLUSIVE
+        blockers = running if exclusive else running.filter(type_job__in=EXCLUSIVE)
+        now = timezone.now()
+        if Job.objects.filter(~Exists(blockers), pk=pk, statut='en_attente').update(
+            statut='en_cours', worker=worker, date_debut=now, date_maj=now
+        ):
+            return Job.objects.get(pk=pk)
+        if exclusive:
+            return None
+    return None
+
+
+def run(job):
+    ctx = JobContext(job)
+    fields = {}
+    try:
+        result = HANDLERS[job.type_job](ctx, **job.parametres)
+        fields = {'statut': 'termine', 'progression': 1.0, 'resultat': result}
+    except JobCancelled:
+        fields = {'statut': 'annule'}
+    except Exception:
+        fields = {'statut': 'echoue', 'erreur': traceback.format_exc()}
+    finally:
+        now = timezone.now()
+        Job.objects.filter(pk=job.pk).update(date_fin=now, date_maj=now, **fields)
+    return fields['statut']
+
+
+def fail_stale():
+    """Marks as failed the running jobs whose worker stopped reporting (crashed or killed)."""
+    return Job.objects.filter(statut='en_cours', date_maj__lt=timezone.now() - STALE_AFTER).update(
+        statut='echoue', erreur="Worker perdu (aucune progression reçue)", date_fin=timezone.now()
+    )
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def work(poll=1.0, once=False, should_stop=lambda: False):
+    """Worker loop: runs jobs until should_stop(), or until the queue is empty with once=True."""
+    name = worker_name()
+    while not should_stop():
+        close_old_connections()
+        job = claim(name)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll)
+            continue
+        run(job)
+
+
+# --- Handlers ---
+
+@handler('simulation', parametres=('steps',))
+def run_simulation(ctx, steps=1):
+    steps = max(int(steps), 1)
+    totals = {}
+    for i in range(steps):
+        ctx.progress(i / steps, f"Pas {i + 1}/{steps}")
+        for key, n in simulation.run_step().items():
+            totals[key] = totals.get(key, 0) + n
+    return dict(totals, steps=steps)
+
+
+@handler('simulation_batch', exclusive=True, parametres=('steps', 'dt', 'start', 'seed'))
+def run_simulation_batch(ctx, steps=1, dt=60, start=None, seed=None):
+    start = parse_datetime(start) if start else None
+    return simulation.run_batch(int(steps), simulation.parse_dt(dt), start=start, seed=seed, progress=ctx.progress)
+
+
+@handler('generation', exclusive=True, api=False, parametres=(
+    'rows', 'capteurs', 'interventions', 'citoyens', 'vehicules', 'trajets', 'batch_size', 'seed',
+))
+def run_generation(ctx, **options):
+    call_command('generate_test_data', stdout=io.StringIO(), progress=ctx.progress, **options)
+    return {
+        'capteurs': Capteur.objects.count(),
+        'interventions': Intervention.objects.count(),
+        'citoyens': Citoyen.objects.count(),
+        'trajets': Trajet.objects.count(),
+    }
+
+
+@handler('rapport', parametres=('debut', 'fin', 'proprietaires', 'workers'))
+def run_reports(ctx, debut=None, fin=None, proprietaires=None, workers=1):
+    from . import reports  # Loads pandas: only the workers that run a report pay for it
+
+    default_debut, default_fin = reports.last_month()
+    debut = reports.parse_mois(debut) if debut else default_debut
+    fin = reports.parse_mois(fin) if fin else default_fin
+    return reports.run(debut, fin, proprietaires=proprietaires, workers=int(workers), progress=ctx.progress)
@@ -0,0 +1,175 @@
+"""
+Citizen eco-score leaderboard.
+
+The top of the ranking is read from the database through the score index
+(citoyen_score_idx). Ranks come from an in-process order-statistics structure: a
+Fenwick tree counting citizens per score, so the rank of a score (1 + the number of
+citizens scoring strictly more) takes O(log S) for a score range S, whatever the
+population. Ties share a rank ("1224" ranking).
+
+The tree is built with one query and then kept up to date by post_save on Citoyen.
+Writes it cannot follow (deletes, bulk_create/update, queryset.update(), other
+processes) change the Citoyen cache version (caching.py) or are bounded by max_age;
+either way the next read rebuilds it.
+"""
+import threading
+import time
+
+import numpy as np
+from django.db.models.signals import post_init, post_save
+
+from . import caching
+from .models import Citoyen
+
+TOP_DEFAULT = 10
+TOP_MAX = 1000
+SCORE_MARGIN = 100  # Room left above and below the current scores before a rebuild is needed
+
+
+class FenwickTree:
+    """Counts per slot, with O(log n) point updates and prefix sums."""
+
+    def __init__(self, counts):
+        tree = [0] + [int(c) for c in counts]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, slot, delta):
+        i = slot + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, slot):
+        """Sum of the counts of slots 0..slot."""
+        total, i = 0, min(slot + 1, len(self))
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class Leaderboard:
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._tree = None
+        self._low = 0
+        self._total = 0
+        self._version = None
+        self._built_at = 0.0
+
+    # --- Structure ---
+
+    def _current_version(self):
+        return caching.versions([Citoyen])[0]
+
+    def _stale(self):
+        if self._tree is None or self._version != self._current_version():
+            return True
+        max_age = caching.default_timeout() if self.max_age is None else self.max_age
+        return time.monotonic() - self._built_at > max_age
+
+    def _build(self):
+        version = self._current_version()
+        scores = np.fromiter(Citoyen.objects.values_list('score_ecologique', flat=True).iterator(chunk_size=10000), dtype=np.int64)
+        low = int(scores.min()) - SCORE_MARGIN if scores.size else -SCORE_MARGIN
+        high = int(scores.max()) + SCORE_MARGIN if scores.size else SCORE_MARGIN
+        self._tree = FenwickTree(np.bincount(scores - low, minlength=high - low + 1))
+        self._low = low
+        self._total = int(scores.size)
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def _ensure(self):
+        if self._stale():
+            self._build()
+
+    def invalidate(self):
+        with self._lock:
+            self._tree = None
+
+    def _slot(self, score):
+        slot = score - self._low
+        return slot if 0 <= slot < len(self._tree) else None
+
+    def apply(self, old_score=None, new_score=None):
+        """Moves one citizen from old_score to new_score (None: absent), as seen by this process's write."""
+        with self._lock:
+            if self._tree is None:
+                return
+            slots = [self._slot(s) for s in (old_score, new_score) if s is not None]
+            if None in slots:
+                self._tree = None  # Outside the tree's range: rebuild on the next read
+                return
+            if old_score is not None:
+                self._tree.add(self._slot(old_score), -1)
+                self._total -= 1
+            if new_score is not None:
+                self._tree.add(self._slot(new_score), 1)
+                self._total += 1
+            # This write is accounted for: adopt the version it produced
+            self._version = self._current_version()
+
+    # --- Queries ---
+
+    def rank_of_score(self, score):
+        """1 + the number of citizens with a strictly higher score."""
+        with self._lock:
+            self._ensure()
+            slot = score - self._low
+            if slot >= len(self._tree):
+                return 1
+            above = self._total - self._tree.prefix(slot) if slot >= 0 else self._total
+            return above + 1
+
+    def total(self):
+        with self._lock:
+            self._ensure()
+            return self._total
+
+    def rank(self, citoyen):
+        return self.rank_of_score(citoyen.score_ecologique)
+
+    def top(self, n):
+        """The n best citizens with their rank, best first (ties by id)."""
+        rows = list(Citoyen.objects.order_by('-score_ecologique', 'pk').values(
+            'id_citoyen', 'nom', 'score_ecologique', 'preferences_mobilite'
+        )[:n])
+        for row in rows:
+            row['rang'] = self.rank_of_score(row['score_ecologique'])
+        return rows
+
+
+LEADERBOARD = Leaderboard()
+
+
+# --- Signals ---
+
+def _remember_score(sender, instance, **kwargs):
+    # Read from __dict__: a deferred score must not cost a query
+    instance._score_initial = instance.__dict__.get('score_ecologique')
+
+
+def _on_save(sender, instance, created, **kwargs):
+    if created:
+        LEADERBOARD.apply(None, instance.score_ecologique)
+    elif instance._score_initial is None:
+        LEADERBOARD.invalidate()  # Previous score unknown (deferred or set by hand)
+    else:
+        LEADERBOARD.apply(instance._score_initial, instance.score_ecologique)
+    instance._score_initial = instance.__dict__.get('score_ecologique')
+
+
+def connect_signals():
+    # After caching.connect_signals(), so that apply() adopts the version this write produced.
+    # Deletes are left to caching's receiver: the version bump triggers a rebuild (and a
+    # post_delete receiver here would disable fast queryset deletes).
+    post_init.connect(_remember_score, sender=Citoyen, dispatch_uid='leaderboard-init')
+    post_save.connect(_on_save, sender=Citoyen, dispatch_uid='leaderboard-save')
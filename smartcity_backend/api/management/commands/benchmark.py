@@ -0,0 +1,71 @@
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from smartcity_backend.api import bench
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the API (in-process on seeded throwaway databases, or against a live server with --url)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000', help='Comma-separated dataset sizes, e.g. 1000,100000,1000000')
+        parser.add_argument('--repeat', type=int, default=10, help='Requests per list endpoint')
+        parser.add_argument('--url', help='Run the concurrent load driver against this API root instead')
+        parser.add_argument('--startup', action='store_true',
+                            help='Only audit the import time of the API server and the dashboard (python -X importtime)')
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--duration', type=float, default=30.0, help='Load test duration in seconds')
+        parser.add_argument('--output', default='bench_results.json')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown before failing (0.2 = 20%%)')
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            self.stdout.write(f"Load test: {options['users']} users for {options['duration']}s on {options['url']}")
+            results = bench.run_load(options['url'], users=options['users'], duration=options['duration'])
+        elif options['startup']:
+            results = {'meta': bench.meta(), 'startup': bench.startup()}
+        else:
+            sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+            results = self.run_isolated(sizes, options['repeat'])
+
+        for target, audit in results.get('startup', {}).items():
+            self.stdout.write(f"Startup imports, {target}: {audit['total_ms']} ms ("
+                              + ', '.join(f"{name} {ms} ms" for name, ms in audit['top'][:5]) + ")")
+        bench.dump_json(results, options['output'])
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']) or '.', exist_ok=True)
+            bench.dump_json(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(f"No baseline at {options['baseline']} (use --save-baseline)"))
+            return
+        regressions = bench.compare(results, bench.load_json(options['baseline']), options['threshold'])
+        for r in regressions:
+            self.stdout.write(self.style.ERROR(
+                f"{r['metric']}: {r['baseline']} -> {r['current']} (+{r['change'] * 100:.0f}%)"
+            ))
+        if regressions:
+            raise CommandError(f"{len(regressions)} metric(s) regressed beyond {options['threshold'] * 100:.0f}%")
+        self.stdout.write(self.style.SUCCESS('No regression against the baseline'))
+
+    def run_isolated(self, sizes, repeat):
+        # Seeding wipes tables, so it runs in a throwaway SQLite file, never in the real database
+        with tempfile.TemporaryDirectory() as tmp:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                return bench.run_in_process(sizes, repeat=repeat, stdout=io.StringIO(), progress=self.stdout.write)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,13 @@
+import time
+
+from django.core.management.base import BaseCommand
+from smartcity_backend.api import cube
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the maintenance cost cube from the Intervention table'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        cells = cube.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"built {cells} cube cells in {time.perf_counter() - start:.2f}s"))
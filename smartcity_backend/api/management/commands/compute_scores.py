@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from smartcity_backend.api import scoring
+
+
+class Command(BaseCommand):
+    help = 'Recomputes citizen eco-scores from mobility preferences and consultation participations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every citizen, not only the flagged ones')
+
+    def handle(self, *args, **options):
+        summary = scoring.compute_scores(full=options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f"scored {summary['citoyens']} citoyens ({summary['modifies']} changed) in {summary['duree_s']}s"
+        ))
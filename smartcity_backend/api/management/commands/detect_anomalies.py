@@ -0,0 +1,31 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from smartcity_backend.api import anomalies, rules
+
+
+class Command(BaseCommand):
+    help = 'Streams new sensor readings, status changes and interventions through the anomaly detector and the alert rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between polls when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once caught up')
+        parser.add_argument('--depuis-debut', action='store_true',
+                            help='Replay the whole history instead of starting from the latest rows')
+
+    def handle(self, *args, **options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+        stream = anomalies.Stream(from_start=options['depuis_debut'], engine=rules.Engine())
+        totals = {'lignes': 0, 'alertes': 0}
+
+        def on_batch(processed, raised):
+            totals['lignes'] += processed
+            totals['alertes'] += raised
+            if raised:
+                self.stdout.write(f"{processed} rows, {raised} alert(s)")
+
+        self.stdout.write("Detecting anomalies")
+        stream.run(poll=options['poll'], once=options['once'], should_stop=lambda: bool(stopping), on_batch=on_batch)
+        self.stdout.write(self.style.SUCCESS(f"processed {totals['lignes']} rows, raised {totals['alertes']} alert(s)"))
@@ -1,23 +1,72 @@
+from django.apps import apps
 from django.core.management.base import BaseCommand
 from smartcity_backend.api.models import (
     Proprietaire, Capteur, Technicien, Intervention,
     Citoyen, VehiculeAutonome, Trajet, InterventionTechnicien,
-    Participation, Consultation
+    Participation, Consultation, EvenementStatut, Mesure, Alerte, TrajetJournalier, Archive
 )
 from faker import Faker
 import random
 import uuid
 from django.utils import timezone
 import unidecode
+from smartcity_backend.api import aqi, caching, cube, jobs, scoring
+from smartcity_backend.api.participations import counting_paused, recount as recount_participants
+from smartcity_backend.api.districts import registry
 
 class Command(BaseCommand):
     help = 'Generates Tunisian-specific synthetic data for the Smart City platform'
+    # progress(fraction, message): set by the job queue (jobs.py), not available on the command line
+    stealth_options = ('progress',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, help='Scale every large table (sensors, interventions, citizens, trips) to N rows')
+        parser.add_argument('--capteurs', type=int, default=180)
+        parser.add_argument('--interventions', type=int, default=50)
+        parser.add_argument('--citoyens', type=int, default=100)
+        parser.add_argument('--vehicules', type=int, default=20)
+        parser.add_argument('--trajets', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, help='Seed the generators for a reproducible dataset')
+        parser.add_argument('--async', action='store_true', dest='queue', help='Queue a generation job for run_workers and return its id')
 
     def handle(self, *args, **kwargs):
-        self.stdout.write("Cleaning old data...")
+        if kwargs['queue']:
+            # The only way to queue a generation: POST /api/jobs/ refuses it (see jobs.COMMAND_ONLY)
+            parametres = {k: v for k, v in kwargs.items() if k in jobs.PARAMETRES['generation'] and v is not None}
+            job = jobs.submit('generation', parametres)
+            self.stdout.write(f"Job {job.pk} queued.")
+            return
+        # Wiping and bulk-loading every table: pause the per-row cache invalidation and
+        # bump every model once at the end.
+        # The maintenance cube and the participation counts are rebuilt once at the end too.
+        with caching.invalidation_paused(*apps.get_app_config('api').get_models()), cube.maintenance_paused(), counting_paused():
+            self.generate(**kwargs)
+
+    def step(self, label, fraction):
+        self.stdout.write(label)
+        if self.progress:
+            self.progress(fraction, label.strip('-. '))
+
+    def generate(self, **kwargs):
+        self.progress = kwargs.get('progress')
+        if kwargs['rows']:
+            rows = kwargs['rows']
+            kwargs.update(capteurs=rows, interventions=rows, citoyens=rows, trajets=rows, vehicules=max(20, rows // 100))
+        batch_size = kwargs['batch_size']
+        if kwargs['seed'] is not None:
+            random.seed(kwargs['seed'])
+            Faker.seed(kwargs['seed'])
+
+        self.step("Cleaning old data...", 0.0)
         Trajet.objects.all().delete()
+        TrajetJournalier.objects.all().delete()
+        Archive.objects.all().delete()  # The archive horizon no longer applies to the new data
         InterventionTechnicien.objects.all().delete()
         Intervention.objects.all().delete()
+        Mesure.objects.all().delete()
+        EvenementStatut.objects.all().delete()
+        Alerte.objects.all().delete()
         Capteur.objects.all().delete()
         Proprietaire.objects.all().delete()
         Technicien.objects.all().delete()
@@ -60,14 +109,16 @@ class Command(BaseCommand):
             zip_code = random.choice(['4000', '4051', '4011', '4002', '4089'])
             return f"{random.randint(1, 150)} {street_type} {street_name}, {district}, {zip_code} Sousse"
 
+        email_counter = iter(range(1, 10**9))
+
         def generate_email(name):
             normalized = unidecode.unidecode(name.lower().replace(' ', '.'))
             domain = random.choice(['gmail.com', 'yahoo.fr', 'topnet.tn', 'gnet.tn'])
-            # Add random digits to ensure uniqueness
-            return f"{normalized}.{random.randint(1, 9999)}@{domain}"
+            # A running number keeps emails unique even for millions of citizens
+            return f"{normalized}.{next(email_counter)}@{domain}"
 
         # 1. Proprietaires
-        self.stdout.write("- Generating Proprietaires...")
+        self.step("- Generating Proprietaires...", 0.05)
         proprietaires = []
         for _ in range(5):
             is_muni = random.choice([True, False])
@@ -82,7 +133,7 @@ class Command(BaseCommand):
             proprietaires.append(p)
 
         # 2. Technicians
-        self.stdout.write("- Generating Technicians...")
+        self.step("- Generating Technicians...", 0.07)
         technicians = []
         for _ in range(10):
             t = Technicien.objects.create(
@@ -92,53 +143,43 @@ class Command(BaseCommand):
             technicians.append(t)
 
         # 3.Capteurs
-        self.stdout.write("- Generating Sensors...")
+        self.step("- Generating Sensors...", 0.1)
         sensors = []
         sensor_types = ['qualité_air', 'trafic', 'énergie', 'déchets', 'éclairage']
         
-        DISTRICTS_DATA = [
-            {'name': 'Medina', 'lat': 35.8245, 'lon': 10.6345},
-            {'name': 'Sahloul', 'lat': 35.8360, 'lon': 10.5900},
-            {'name': 'Khezama', 'lat': 35.8450, 'lon': 10.6200},
-            {'name': 'Kalaa Sghira', 'lat': 35.8180, 'lon': 10.5500},
-            {'name': 'Hammam Sousse', 'lat': 35.8550, 'lon': 10.6050},
-            {'name': 'Cité Riadh', 'lat': 35.8050, 'lon': 10.6100},
-        ]
-        DISTRICT_ANCHORS = [(d['lat'], d['lon']) for d in DISTRICTS_DATA] 
-
-        for _ in range(180):
-            # Pick a random district OBJECT
-            district_obj = random.choice(DISTRICTS_DATA)
-            anchor_lat = district_obj['lat']
-            anchor_lon = district_obj['lon']
-            quartier_name = district_obj['name']
-            
-            lat = anchor_lat + random.uniform(-0.004, 0.004)
-            lon = anchor_lon + random.uniform(-0.004, 0.004)
+        districts = registry().districts
+
+        for _ in range(kwargs['capteurs']):
+            # Pick a random district; quartier/district are derived from the coordinates on insert
+            district_obj = random.choice(districts)
+            lat = district_obj.latitude + random.uniform(-0.004, 0.004)
+            lon = district_obj.longitude + random.uniform(-0.004, 0.004)
 
             statut = random.choices(['actif', 'en_maintenance', 'hors_service'], weights=[70, 20, 10])[0]
 
-            s = Capteur.objects.create(
+            sensors.append(Capteur(
                 type_capteur=random.choice(sensor_types),
-                latitude=lat,
-                longitude=lon,
+                latitude=round(lat, 6),
+                longitude=round(lon, 6),
                 statut=statut,
-                quartier=quartier_name, # Storing the region name!
                 date_installation=fake.date_between(start_date='-2y', end_date='today'),
                 proprietaire=random.choice(proprietaires)
-            )
-            sensors.append(s)
+            ))
+        Capteur.objects.bulk_create(sensors, batch_size=batch_size)
+        # A first pollutant reading for the air-quality sensors (see aqi.py)
+        Mesure.objects.bulk_create(aqi.simulated_readings(aqi.air_sensors(), timezone.now()), batch_size=batch_size)
 
         # 4. Interventions
-        self.stdout.write("- Generating Interventions...")
-        for _ in range(50):
+        self.step("- Generating Interventions...", 0.25)
+        interventions, links = [], []
+        for _ in range(kwargs['interventions']):
             sensor = random.choice(sensors)
             t_worker = random.choice(technicians)
             t_validator = random.choice(technicians)
             while t_validator == t_worker:
                 t_validator = random.choice(technicians)
 
-            intervention = Intervention.objects.create(
+            intervention = Intervention(
                 capteur=sensor,
                 date_heure=timezone.make_aware(fake.date_time_this_year()),
                 type_intervention=random.choice(['prédictive', 'corrective', 'curative']),
@@ -146,13 +187,14 @@ class Command(BaseCommand):
                 cout=round(random.uniform(50.0, 500.0), 2),
                 impact_co2=round(random.uniform(0.5, 50.0), 2)
             )
-            
-            
-            InterventionTechnicien.objects.create(intervention=intervention, technicien=t_worker, role='intervenant')
-            InterventionTechnicien.objects.create(intervention=intervention, technicien=t_validator, role='validateur')
+            interventions.append(intervention)
+            links.append(InterventionTechnicien(intervention=intervention, technicien=t_worker, role='intervenant'))
+            links.append(InterventionTechnicien(intervention=intervention, technicien=t_validator, role='validateur'))
+        Intervention.objects.bulk_create(interventions, batch_size=batch_size)
+        InterventionTechnicien.objects.bulk_create(links, batch_size=batch_size)
 
         # 5. Consultations (Public Projects)
-        self.stdout.write("- Generating Consultations...")
+        self.step("- Generating Consultations...", 0.4)
         PROJECT_TOPICS = [
             'Aménagement piste cyclable Sahloul',
             'Nouveaux capteurs air Medina',
@@ -173,28 +215,22 @@ class Command(BaseCommand):
             consultations.append(c)
 
         # 6. Citizens & Participations
-        self.stdout.write("- Generating Citizens & Participations with SCORING...")
+        self.step("- Generating Citizens & Participations with SCORING...", 0.45)
         
-        MOBILITY_SCORES = {
-            'Marche': 15,
-            'Vélo': 10,
-            'Transports en commun': 5,
-            'Véhicule électrique': 5,
-            'Voiture Thermique': 0 
-        }
-        PARTICIPATION_BONUS = 20
-
-        for _ in range(100):
+        # Initial scores; the citizens stay flagged for scoring.compute_scores()
+
+        citizens, participations = [], []
+        for _ in range(kwargs['citoyens']):
             name = get_tunisian_name()
             mobility_pref = random.choice(['Vélo', 'Marche', 'Transports en commun', 'Véhicule électrique'])
             
-            base_score = MOBILITY_SCORES.get(mobility_pref, 0)
+            base_score = scoring.MOBILITY_SCORES.get(mobility_pref, 0)
             
             num_participations = random.choices([0, 1, 2, 3], weights=[50, 30, 15, 5])[0]
 
-            total_score = base_score + (num_participations * PARTICIPATION_BONUS)
+            total_score = base_score + (num_participations * scoring.PARTICIPATION_BONUS)
 
-            citoyen = Citoyen.objects.create(
+            citoyen = Citoyen(
                 nom=name,
                 adresse=get_sousse_address(),
                 email=generate_email(name),
@@ -202,22 +238,22 @@ class Command(BaseCommand):
                 score_ecologique=total_score,
                 preferences_mobilite=mobility_pref
             )
+            citizens.append(citoyen)
             
             if num_participations > 0:
                 target_consultations = random.sample(consultations, k=min(num_participations, len(consultations)))
                 for consult in target_consultations:
-                    Participation.objects.create(
-                        citoyen=citoyen,
-                        consultation=consult
-                     
-                    )
+                    participations.append(Participation(citoyen=citoyen, consultation=consult))
+        Citoyen.objects.bulk_create(citizens, batch_size=batch_size)
+        Participation.objects.bulk_create(participations, batch_size=batch_size)
+        recount_participants()
 
         # 7. Vehicles
-        self.stdout.write("- Generating Vehicles...")
+        self.step("- Generating Vehicles...", 0.65)
         vehicles = []
         used_plates = set()
         
-        while len(vehicles) < 20:
+        while len(vehicles) < kwargs['vehicules']:
         
             x = random.randint(240, 259) 
             y = random.randint(1, 9999)
@@ -225,23 +261,29 @@ class Command(BaseCommand):
             
             if plate not in used_plates:
                 used_plates.add(plate)
-                v = VehiculeAutonome.objects.create(
+                vehicles.append(VehiculeAutonome(
                     plaque_immatriculation=plate,
                     type_vehicule=random.choice(['Bus', 'Navette', 'Voiture']),
                     energie_utilisee='Électrique'
-                )
-                vehicles.append(v)
-
-        # 7. Trajets
-        self.stdout.write("- Generating Trips...")
-        for _ in range(50):
-            if not vehicles: break
-            Trajet.objects.create(
+                ))
+        VehiculeAutonome.objects.bulk_create(vehicles, batch_size=batch_size)
+
+        # 8. Trajets
+        self.step("- Generating Trips...", 0.7)
+        trips = []
+        for _ in range(kwargs['trajets'] if vehicles else 0):
+            trajet = Trajet(
                 vehicule=random.choice(vehicles),
                 origine=get_sousse_address(),
                 destination=get_sousse_address(),
+                date_depart=timezone.make_aware(fake.date_time_this_month()),
                 duree=random.randint(5, 60),
                 economie_co2=round(random.uniform(1.0, 15.0), 2)
             )
+            # bulk_create skips Trajet.save(): derive arrival time and districts here
+            trajet.sync_duree()
+            trajet.sync_districts()
+            trips.append(trajet)
+        Trajet.objects.bulk_create(trips, batch_size=batch_size)
 
         self.stdout.write(self.style.SUCCESS('generated synthetic data'))
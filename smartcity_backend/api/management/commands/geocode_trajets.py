@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from smartcity_backend.api import gazetteer
+from smartcity_backend.api.models import Trajet
+
+
+class Command(BaseCommand):
+    help = 'Resolves district_origine/district_destination for trajets written before the gazetteer existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--all', action='store_true', help='Re-resolve every trajet, not only the missing ones')
+
+    def handle(self, *args, **options):
+        gazetteer.clear_cache()
+        queryset = Trajet.objects.only('id_trajet', 'origine', 'destination', 'district_origine', 'district_destination')
+        if not options['all']:
+            queryset = queryset.filter(Q(district_origine__isnull=True) | Q(district_destination__isnull=True))
+
+        # Keyset pagination: never read and write the same cursor at once
+        queryset = queryset.order_by('pk')
+        done, last_pk = 0, None
+        while True:
+            page = queryset.filter(pk__gt=last_pk) if last_pk else queryset
+            batch = list(page[:options['batch_size']])
+            if not batch:
+                break
+            for trajet in batch:
+                # The gazetteer caches per label, so repeated addresses cost one dict lookup
+                trajet.district_origine_id = gazetteer.resolve(trajet.origine)
+                trajet.district_destination_id = gazetteer.resolve(trajet.destination)
+            Trajet.objects.bulk_update(batch, ['district_origine', 'district_destination'])
+            done += len(batch)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f'geocoded {done} trajets'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from smartcity_backend.api import imports
+
+
+class Command(BaseCommand):
+    help = 'Imports a sensor inventory or an intervention history from a CSV or Parquet file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('type', choices=sorted(imports.KINDS), help='What the file holds')
+        parser.add_argument('fichier', help='CSV or Parquet file')
+        parser.add_argument('--format', choices=imports.FORMATS, help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=imports.BATCH_SIZE, help='Rows per transaction')
+        parser.add_argument('--rejets', help='CSV of the rejected rows (default: <fichier>.rejets.csv)')
+        parser.add_argument('--reprendre', action='store_true', help='Resume an interrupted import of the same file')
+
+    def handle(self, *args, **options):
+        def progress(lues, importees, rejetees, elapsed):
+            self.stdout.write(f"  {lues} rows read, {importees} imported, {rejetees} rejected "
+                              f"({lues / max(elapsed, 1e-9):.0f} rows/s)")
+
+        try:
+            summary = imports.load(
+                options['fichier'], options['type'], fmt=options['format'], batch_size=options['batch_size'],
+                rejects=options['rejets'], resume=options['reprendre'], progress=progress,
+            )
+        except FileNotFoundError:
+            raise CommandError(f"Fichier introuvable: {options['fichier']}")
+        except imports.ImportFileError as exc:
+            raise CommandError(' '.join(exc.errors.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['importees']} of {summary['lues']} rows imported in {summary['duree_s']}s"
+            + (f", {summary['rejetees']} rejected: {summary['rejets']}" if summary['rejetees'] else "")
+        ))
@@ -0,0 +1,34 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from smartcity_backend.api import reports
+
+
+class Command(BaseCommand):
+    help = 'Computes the monthly availability, SLA and maintenance cost reports of every owner'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help='First month, YYYY-MM (default: last month)')
+        parser.add_argument('--fin', help='Month after the last one, YYYY-MM (default: this month)')
+        parser.add_argument('--proprietaire', action='append', dest='proprietaires', help='Only this owner (repeatable)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes, one owner at a time each (default: one per CPU)')
+        parser.add_argument('--dossier', help='Directory of the CSV/Parquet files (default: settings.REPORT_DIR)')
+
+    def handle(self, *args, **options):
+        debut, fin = reports.last_month()
+        try:
+            debut = reports.parse_mois(options['debut']) if options['debut'] else debut
+            fin = reports.parse_mois(options['fin']) if options['fin'] else fin
+        except ValueError:
+            raise CommandError("Mois attendu au format AAAA-MM.")
+        if debut >= fin:
+            raise CommandError("--debut doit précéder --fin.")
+        try:
+            summary = reports.run(debut, fin, proprietaires=options['proprietaires'], workers=options['workers'],
+                                  dossier=options['dossier'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['lignes']} rows for {summary['proprietaires']} owners in {summary['duree_s']}s: "
+            f"{summary['csv']}" + (f", {summary['parquet']}" if summary['parquet'] else "")
+        ))
@@ -0,0 +1,41 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from smartcity_backend.api import retention
+
+
+class Command(BaseCommand):
+    help = 'Archives the rows past their retention (settings.RETENTION_DAYS), then analyzes and vacuums the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modele', action='append', dest='modeles', choices=sorted(retention.POLICIES),
+                            help='Only this table (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=retention.BATCH_SIZE, help='Rows per archive file and delete')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to wait between batches')
+        parser.add_argument('--dossier', help='Archive directory (default: settings.ARCHIVE_DIR)')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Full VACUUM first (SQLite: switches an existing file to incremental auto-vacuum)')
+        parser.add_argument('--intervalle', type=float, help='Run again every N seconds instead of exiting')
+
+    def handle(self, *args, **options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+        vacuum = options['vacuum']
+        while not stopping:
+            summary = retention.run(options['modeles'], batch_size=options['batch_size'], dossier=options['dossier'],
+                                    pause=options['pause'], vacuum=vacuum)
+            vacuum = False
+            for a in summary['archives']:
+                if a['lignes']:
+                    self.stdout.write(f"{a['modele']}: {a['lignes']} rows before {a['limite']} archived "
+                                      f"in {a['fichiers']} files ({a['duree_s']}s)")
+            self.stdout.write(self.style.SUCCESS(
+                f"maintenance done, {summary['maintenance']['pages_liberees']} pages freed"
+            ))
+            if not options['intervalle']:
+                break
+            deadline = time.monotonic() + options['intervalle']
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(1)
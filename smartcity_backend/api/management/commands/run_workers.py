@@ -0,0 +1,51 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from smartcity_backend.api import jobs
+
+
+def _serve(poll, once):
+    stopping = []
+    # Finish the current job, then exit
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    jobs.work(poll=poll, once=once, should_stop=lambda: bool(stopping))
+
+
+class Command(BaseCommand):
+    help = 'Runs background job workers (simulation steps, data generation) until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between queue polls when idle')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        lost = jobs.fail_stale()
+        if lost:
+            self.stdout.write(self.style.WARNING(f"{lost} job(s) from lost workers marked as failed"))
+
+        n = max(options['workers'], 1)
+        self.stdout.write(f"Starting {n} worker(s)")
+        if n == 1:
+            _serve(options['poll'], options['once'])
+            return
+
+        # Children must not share the parent's database connection
+        connections.close_all()
+        ctx = multiprocessing.get_context('fork')
+        procs = [ctx.Process(target=_serve, args=(options['poll'], options['once'])) for _ in range(n)]
+        for p in procs:
+            p.start()
+        # Forward SIGTERM: each child finishes its current job, then exits
+        signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in procs if p.is_alive()])
+        try:
+            for p in procs:
+                p.join()
+        except KeyboardInterrupt:
+            # SIGINT reached the children too: wait for their current jobs
+            for p in procs:
+                p.join()
+        self.stdout.write("Workers stopped")
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionVehicule',
+            fields=[
+                ('vehicule', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='position', serialize=False, to='api.vehiculeautonome')),
+                ('progression', models.FloatField(default=0.0, help_text='Avancement sur le trajet (0 à 1)')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('tick', models.IntegerField(default=0)),
+                ('trajet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.trajet')),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_positionvehicule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trajet',
+            name='date_arrivee',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trajet',
+            name='date_depart',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='trajet',
+            name='duree',
+            field=models.IntegerField(help_text='Durée en minutes (dérivée de date_depart/date_arrivee)'),
+        ),
+        migrations.AddIndex(
+            model_name='trajet',
+            index=models.Index(fields=['vehicule', 'date_depart'], name='trajet_vehicule_depart_idx'),
+        ),
+    ]
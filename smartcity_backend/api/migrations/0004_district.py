@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+DISTRICTS = [
+    ("Ennfidha", 36.130, 10.380), ("Hergla", 36.030, 10.500), ("Sidi Bou Ali", 35.950, 10.470),
+    ("Kondar", 35.920, 10.300), ("Akouda", 35.870, 10.560), ("Kalaa Kebira", 35.870, 10.530),
+    ("Hammam Sousse", 35.860, 10.590), ("Sousse Ville", 35.825, 10.635), ("Sousse Jawhara", 35.810, 10.620),
+    ("Sousse Riadh", 35.800, 10.600), ("Sidi Abdelhamid", 35.800, 10.640), ("Kalaa Sghira", 35.820, 10.550),
+    ("Zaouia Ksiba Thrayet", 35.780, 10.630), ("Msaken", 35.730, 10.580), ("Sidi El Heni", 35.670, 10.320),
+]
+
+
+def seed_districts(apps, schema_editor):
+    District = apps.get_model("api", "District")
+    District.objects.bulk_create(
+        [District(nom=nom, latitude=lat, longitude=lon) for nom, lat, lon in DISTRICTS],
+        ignore_conflicts=True,
+    )
+
+
+def unseed_districts(apps, schema_editor):
+    apps.get_model("api", "District").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_trajet_dates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='District',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trajet',
+            name='district_destination',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.district'),
+        ),
+        migrations.AddField(
+            model_name='trajet',
+            name='district_origine',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.district'),
+        ),
+        migrations.RunPython(seed_districts, unseed_districts),
+    ]
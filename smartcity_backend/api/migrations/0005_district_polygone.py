@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Governorate bounding box (lat_min, lon_min, lat_max, lon_max)
+BBOX = (35.55, 10.20, 36.25, 10.75)
+
+
+def _clip(polygon, site, other):
+    """Keeps the part of `polygon` closer to `site` than to `other` (Sutherland-Hodgman)."""
+    mid = ((site[0] + other[0]) / 2, (site[1] + other[1]) / 2)
+    normal = (other[0] - site[0], other[1] - site[1])
+
+    def side(p):
+        return (p[0] - mid[0]) * normal[0] + (p[1] - mid[1]) * normal[1]
+
+    result = []
+    for k, current in enumerate(polygon):
+        previous = polygon[k - 1]
+        s_cur, s_prev = side(current), side(previous)
+        if (s_cur <= 0) != (s_prev <= 0):
+            t = s_prev / (s_prev - s_cur)
+            result.append((previous[0] + t * (current[0] - previous[0]), previous[1] + t * (current[1] - previous[1])))
+        if s_cur <= 0:
+            result.append(current)
+    return result
+
+
+def seed_polygons(apps, schema_editor):
+    """Approximate contours: Voronoi cells of the centroids, clipped to the governorate box."""
+    District = apps.get_model("api", "District")
+    Capteur = apps.get_model("api", "Capteur")
+    districts = list(District.objects.all())
+    lat0, lon0, lat1, lon1 = BBOX
+    for district in districts:
+        site = (district.latitude, district.longitude)
+        cell = [(lat0, lon0), (lat0, lon1), (lat1, lon1), (lat1, lon0)]
+        for other in districts:
+            if other.pk != district.pk:
+                cell = _clip(cell, site, (other.latitude, other.longitude))
+        district.polygone = [[round(lat, 6), round(lon, 6)] for lat, lon in cell]
+    District.objects.bulk_update(districts, ["polygone"])
+
+    # Voronoi cells == nearest centroid, which is all existing sensors need
+    for capteur in Capteur.objects.filter(district__isnull=True).iterator():
+        lat, lon = float(capteur.latitude), float(capteur.longitude)
+        nearest = min(districts, key=lambda d: (d.latitude - lat) ** 2 + (d.longitude - lon) ** 2, default=None)
+        if nearest is not None:
+            capteur.district_id = nearest.pk
+            capteur.quartier = nearest.nom
+            capteur.save(update_fields=["district", "quartier"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_district'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='capteur',
+            name='district',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='capteurs', to='api.district'),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='polygone',
+            field=models.JSONField(blank=True, default=list, help_text='Contour [[lat, lon], ...]'),
+        ),
+        migrations.RunPython(seed_polygons, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:48
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_district_polygone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id_job', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('type_job', models.CharField(choices=[('simulation', 'Simulation'), ('generation', 'Génération de données')], max_length=20)),
+                ('parametres', models.JSONField(blank=True, default=dict)),
+                ('statut', models.CharField(choices=[('en_attente', 'En Attente'), ('en_cours', 'En Cours'), ('termine', 'Terminé'), ('echoue', 'Échoué'), ('annule', 'Annulé')], default='en_attente', max_length=20)),
+                ('progression', models.FloatField(default=0.0, help_text='Avancement (0 à 1)')),
+                ('message', models.CharField(blank=True, default='', max_length=200)),
+                ('resultat', models.JSONField(blank=True, null=True)),
+                ('erreur', models.TextField(blank=True, default='')),
+                ('annulation_demandee', models.BooleanField(default=False)),
+                ('worker', models.CharField(blank=True, default='', max_length=100)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('date_maj', models.DateTimeField(auto_now=True, help_text='Dernier signe de vie du worker')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='job_statut_creation_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorlogeSimulation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instant', models.DateTimeField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='type_job',
+            field=models.CharField(choices=[('simulation', 'Simulation'), ('simulation_batch', 'Simulation accélérée'), ('generation', 'Génération de données')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='EvenementStatut',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(db_index=True)),
+                ('ancien_statut', models.CharField(choices=[('actif', 'Actif'), ('en_maintenance', 'En Maintenance'), ('hors_service', 'Hors Service')], max_length=20)),
+                ('nouveau_statut', models.CharField(choices=[('actif', 'Actif'), ('en_maintenance', 'En Maintenance'), ('hors_service', 'Hors Service')], max_length=20)),
+                ('capteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evenements', to='api.capteur')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['capteur', 'date'], name='evenement_capteur_date_idx')],
+            },
+        ),
+    ]
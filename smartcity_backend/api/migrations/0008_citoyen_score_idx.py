@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_evenementstatut_horloge'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='citoyen',
+            index=models.Index(models.OrderBy(models.F('score_ecologique'), descending=True), models.F('id_citoyen'), name='citoyen_score_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_citoyen_score_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citoyen',
+            name='score_perime',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:58
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def drop_duplicates(apps, schema_editor):
+    # Keep the first participation of each (citoyen, consultation) pair
+    Participation = apps.get_model("api", "Participation")
+    duplicated = (
+        Participation.objects.values('citoyen', 'consultation')
+        .annotate(n=Count('pk'), keep=Min('pk')).filter(n__gt=1)
+    )
+    for row in duplicated:
+        Participation.objects.filter(citoyen=row['citoyen'], consultation=row['consultation']).exclude(pk=row['keep']).delete()
+
+
+def count_participants(apps, schema_editor):
+    Consultation = apps.get_model("api", "Consultation")
+    Participation = apps.get_model("api", "Participation")
+    count = Participation.objects.filter(consultation=OuterRef('pk')).order_by().values('consultation').annotate(n=Count('pk')).values('n')
+    Consultation.objects.update(nb_participants=Coalesce(Subquery(count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_citoyen_score_perime'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='consultation',
+            name='nb_participants',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='participation',
+            constraint=models.UniqueConstraint(fields=('citoyen', 'consultation'), name='participation_unique'),
+        ),
+        migrations.RunPython(count_participants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_participation_unique_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Mesure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('polluant', models.CharField(choices=[('pm25', 'PM2.5'), ('pm10', 'PM10'), ('o3', 'O3'), ('no2', 'NO2')], max_length=10)),
+                ('date', models.DateTimeField()),
+                ('valeur', models.FloatField()),
+                ('capteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mesures', to='api.capteur')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['polluant', 'date', 'capteur'], name='mesure_polluant_date_idx'), models.Index(fields=['date'], name='mesure_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_mesure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alerte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_alerte', models.CharField(choices=[('pic', 'Pic de mesure'), ('derive', 'Dérive'), ('instabilite', 'Statut instable')], max_length=20)),
+                ('polluant', models.CharField(blank=True, default='', max_length=10)),
+                ('date', models.DateTimeField()),
+                ('valeur', models.FloatField(blank=True, null=True)),
+                ('score', models.FloatField(help_text='z-score, statistique CUSUM ou taux de bascules selon le type')),
+                ('message', models.CharField(max_length=200)),
+                ('acquittee', models.BooleanField(default=False)),
+                ('capteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertes', to='api.capteur')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-date'], name='alerte_date_idx'), models.Index(fields=['capteur', '-date'], name='alerte_capteur_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_alerte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alerte',
+            name='district',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alertes', to='api.district'),
+        ),
+        migrations.AlterField(
+            model_name='alerte',
+            name='capteur',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alertes', to='api.capteur'),
+        ),
+        migrations.AlterField(
+            model_name='alerte',
+            name='score',
+            field=models.FloatField(help_text='z-score, statistique CUSUM, taux de bascules ou valeur de la règle selon le type'),
+        ),
+        migrations.AlterField(
+            model_name='alerte',
+            name='type_alerte',
+            field=models.CharField(choices=[('pic', 'Pic de mesure'), ('derive', 'Dérive'), ('instabilite', 'Statut instable'), ('regle', 'Règle')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='intervention',
+            name='date_heure',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.CreateModel(
+            name='RegleAlerte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('type_regle', models.CharField(choices=[('mesure', 'Seuil de mesure'), ('statut', 'Proportion de capteurs dans un statut'), ('silence', 'Capteur silencieux'), ('intervention', "Coût d'intervention")], max_length=20)),
+                ('type_capteur', models.CharField(blank=True, choices=[('qualité_air', 'Qualité Air'), ('trafic', 'Trafic'), ('énergie', 'Énergie'), ('déchets', 'Déchets'), ('éclairage', 'Éclairage')], default='', max_length=50)),
+                ('polluant', models.CharField(blank=True, choices=[('pm25', 'PM2.5'), ('pm10', 'PM10'), ('o3', 'O3'), ('no2', 'NO2')], default='', max_length=10)),
+                ('statut', models.CharField(blank=True, choices=[('actif', 'Actif'), ('en_maintenance', 'En Maintenance'), ('hors_service', 'Hors Service')], default='', max_length=20)),
+                ('operateur', models.CharField(choices=[('>', '>'), ('>=', '≥'), ('<', '<'), ('<=', '≤')], default='>', max_length=2)),
+                ('seuil', models.FloatField(default=0, help_text='Valeur, pourcentage de capteurs (statut) ou coût')),
+                ('fenetre_minutes', models.PositiveIntegerField(default=0, help_text='Moyenne (mesure) ou somme (intervention) glissante; durée de silence (silence)')),
+                ('delai_minutes', models.PositiveIntegerField(default=10, help_text='Délai minimal entre deux notifications')),
+                ('active', models.BooleanField(default=True)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+                ('district', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='regles', to='api.district')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='alerte',
+            name='regle',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alertes', to='api.reglealerte'),
+        ),
+    ]
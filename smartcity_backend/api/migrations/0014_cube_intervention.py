@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+DETAIL = ('district', 'type_capteur', 'type_intervention', 'proprietaire')
+
+
+def fill_cube(apps, schema_editor):
+    # Same cells as cube.rebuild(), from the existing interventions
+    CubeIntervention = apps.get_model("api", "CubeIntervention")
+    Intervention = apps.get_model("api", "Intervention")
+    InterventionTechnicien = apps.get_model("api", "InterventionTechnicien")
+    sources = (
+        (Intervention.objects.all(), '', {'type': ('type_intervention',), 'detail': DETAIL}),
+        (InterventionTechnicien.objects.all(), 'intervention__', {'technicien': DETAIL + ('technicien',)}),
+    )
+    cells = {}
+    for queryset, prefix, cuboides in sources:
+        paths = {'district': 'capteur__district', 'type_capteur': 'capteur__type_capteur',
+                 'type_intervention': 'type_intervention', 'proprietaire': 'capteur__proprietaire'}
+        for cuboide, dims in cuboides.items():
+            fields = [prefix + paths[d] if d in paths else d for d in dims]
+            rows = (queryset.order_by().annotate(jour_cube=TruncDate(prefix + 'date_heure')).values_list('jour_cube', *fields)
+                    .annotate(Count('pk'), Sum(prefix + 'cout'), Sum(prefix + 'duree'), Sum(prefix + 'impact_co2')))
+            for jour, *values in rows:
+                key = dict(zip(dims, values[:len(dims)]))
+                for granularite, periode in (('jour', jour), ('mois', jour.replace(day=1))):
+                    cell = cells.setdefault((cuboide, granularite, periode, tuple(key.items())), [0, 0, 0, 0])
+                    for i, value in enumerate(values[len(dims):]):
+                        cell[i] += value or 0
+    CubeIntervention.objects.bulk_create([
+        CubeIntervention(cuboide=cuboide, granularite=granularite, periode=periode,
+                         **{f'{d}_id' if d in ('district', 'proprietaire', 'technicien') else d: v for d, v in key},
+                         nombre=m[0], cout=m[1], duree=m[2], impact_co2=m[3])
+        for (cuboide, granularite, periode, key), m in cells.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_regle_alerte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CubeIntervention',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cuboide', models.CharField(choices=[('type', "Type d'intervention"), ('detail', 'Détail'), ('technicien', 'Détail par technicien')], max_length=10)),
+                ('granularite', models.CharField(choices=[('jour', 'Jour'), ('mois', 'Mois')], max_length=4)),
+                ('periode', models.DateField(help_text='Jour, ou premier jour du mois')),
+                ('type_capteur', models.CharField(blank=True, choices=[('qualité_air', 'Qualité Air'), ('trafic', 'Trafic'), ('énergie', 'Énergie'), ('déchets', 'Déchets'), ('éclairage', 'Éclairage')], max_length=50)),
+                ('type_intervention', models.CharField(choices=[('prédictive', 'Prédictive'), ('corrective', 'Corrective'), ('curative', 'Curative')], max_length=20)),
+                ('nombre', models.IntegerField(default=0)),
+                ('cout', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('duree', models.BigIntegerField(default=0)),
+                ('impact_co2', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('district', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.district')),
+                ('proprietaire', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.proprietaire')),
+                ('technicien', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.technicien')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cuboide', 'granularite', 'periode'], name='cube_periode_idx')],
+            },
+        ),
+        migrations.RunPython(fill_cube, migrations.RunPython.noop),
+    ]
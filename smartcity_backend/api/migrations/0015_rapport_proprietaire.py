@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_cube_intervention'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='type_job',
+            field=models.CharField(choices=[('simulation', 'Simulation'), ('simulation_batch', 'Simulation accélérée'), ('generation', 'Génération de données'), ('rapport', 'Rapports propriétaires')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='RapportProprietaire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(help_text='Premier jour du mois')),
+                ('nb_capteurs', models.IntegerField(default=0, help_text='Capteurs installés pendant le mois')),
+                ('disponibilite', models.FloatField(blank=True, help_text='Part du temps capteur en service (%)', null=True)),
+                ('heures_indisponibilite', models.FloatField(default=0.0)),
+                ('violations_sla', models.IntegerField(default=0, help_text='Pannes plus longues que le délai de rétablissement')),
+                ('changements_statut', models.IntegerField(default=0)),
+                ('nb_interventions', models.IntegerField(default=0)),
+                ('cout_interventions', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('duree_interventions', models.BigIntegerField(default=0, help_text='Minutes')),
+                ('impact_co2', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('date_calcul', models.DateTimeField(auto_now=True)),
+                ('proprietaire', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rapports', to='api.proprietaire')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('proprietaire', 'mois'), name='rapport_proprietaire_mois')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_rapport_proprietaire'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Archive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modele', models.CharField(max_length=50)),
+                ('limite', models.DateTimeField(help_text='Les lignes antérieures sont archivées')),
+                ('lignes', models.BigIntegerField(default=0)),
+                ('dossier', models.CharField(max_length=500)),
+                ('date_debut', models.DateTimeField(auto_now_add=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modele', 'limite'], name='archive_modele_limite_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrajetJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('trajets', models.IntegerField(default=0)),
+                ('economie_co2', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('minutes', models.BigIntegerField(default=0)),
+                ('vehicule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.vehiculeautonome')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('jour', 'vehicule'), name='trajet_journalier_jour_vehicule')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepriseImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fichier', models.CharField(max_length=500, unique=True)),
+                ('type_import', models.CharField(max_length=20)),
+                ('taille', models.BigIntegerField(help_text="Taille du fichier à l'import, en octets")),
+                ('modifie', models.BigIntegerField(help_text='Date de modification du fichier, en ns')),
+                ('lues', models.BigIntegerField(default=0)),
+                ('importees', models.BigIntegerField(default=0)),
+                ('rejetees', models.BigIntegerField(default=0)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,6 +1,18 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from datetime import timedelta
 import uuid
 
+class District(models.Model):
+    # Integer key that sensors and trajets join on; cached per process by districts.registry()
+    nom = models.CharField(max_length=100, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    polygone = models.JSONField(default=list, blank=True, help_text="Contour [[lat, lon], ...]")
+
+    def __str__(self):
+        return self.nom
+
 class Proprietaire(models.Model):
     TYPE_CHOICES = [
         ('municipalité', 'Municipalité'),
@@ -16,6 +28,20 @@ class Proprietaire(models.Model):
     def __str__(self):
         return self.nom
 
+class CapteurManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        # district/quartier are derived from the coordinates, in one vectorized pass
+        from .caching import bump
+        from .districts import assign_districts
+        objs = list(objs)
+        assign_districts(objs)
+        created = super().bulk_create(objs, *args, **kwargs)
+        for obj in created:
+            obj._statut_initial = obj.statut  # Later save()s record their status changes
+            obj._position_initiale = obj._position()  # ... and re-derive a moved sensor's district
+        bump(self.model)  # bulk_create sends no post_save
+        return created
+
 class Capteur(models.Model):
     TYPE_CHOICES = [
         ('qualité_air', 'Qualité Air'),
@@ -34,10 +60,41 @@ class Capteur(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES)
-    quartier = models.CharField(max_length=100, default="Sousse") # New field
+    quartier = models.CharField(max_length=100, default="Sousse") # Derived from district
+    district = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, related_name='capteurs')
     date_installation = models.DateField()
     proprietaire = models.ForeignKey(Proprietaire, on_delete=models.CASCADE, related_name='capteurs')
 
+    objects = CapteurManager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._statut_initial = instance.__dict__.get('statut')
+        instance._position_initiale = instance._position()
+        return instance
+
+    def _position(self):
+        lat, lon = self.__dict__.get('latitude'), self.__dict__.get('longitude')
+        return None if lat is None or lon is None else (float(lat), float(lon))
+
+    def save(self, *args, **kwargs):
+        from .districts import assign_districts
+        initiale = getattr(self, '_position_initiale', None)
+        moved = initiale is not None and self._position() != initiale
+        assign_districts([self], force=moved)
+        update_fields = kwargs.get('update_fields')
+        if moved and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'district', 'quartier'}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Status history, read by the anomaly detector (see anomalies.py)
+            ancien = getattr(self, '_statut_initial', None)
+            if ancien and ancien != self.statut:
+                EvenementStatut.objects.create(capteur=self, date=timezone.now(), ancien_statut=ancien, nouveau_statut=self.statut)
+        self._statut_initial = self.statut
+        self._position_initiale = self._position()
+
     def __str__(self):
         return f"{self.type_capteur} ({self.statut})"
 
@@ -49,6 +106,15 @@ class Technicien(models.Model):
     def __str__(self):
         return self.nom
 
+class InterventionManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import cube
+        created = super().bulk_create(objs, *args, **kwargs)
+        cube.add([obj.pk for obj in created])
+        for obj in created:
+            obj._cube_initial = obj._cube_values()  # Later save()s skip the cube when these are unchanged
+        return created
+
 class Intervention(models.Model):
     TYPE_CHOICES = [
         ('prédictive', 'Prédictive'),
@@ -57,7 +123,7 @@ class Intervention(models.Model):
     ]
     id_intervention = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     capteur = models.ForeignKey(Capteur, on_delete=models.CASCADE, related_name='interventions')
-    date_heure = models.DateTimeField()
+    date_heure = models.DateTimeField(db_index=True)
     type_intervention = models.CharField(max_length=20, choices=TYPE_CHOICES)
     duree = models.IntegerField(help_text="Durée en minutes")
     cout = models.DecimalField(max_digits=10, decimal_places=2)
@@ -66,9 +132,50 @@ class Intervention(models.Model):
     # ManyToMany with Technicians through a custom table to handle roles
     techniciens = models.ManyToManyField(Technicien, through='InterventionTechnicien')
 
+    objects = InterventionManager()
+
+    # Fields the cost cube reads (see cube.py): a save that changes none of them leaves it as is
+    CUBE_FIELDS = ('capteur_id', 'date_heure', 'type_intervention', 'duree', 'cout', 'impact_co2')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._cube_initial = instance._cube_values()
+        return instance
+
+    def _cube_values(self):
+        return tuple(self.__dict__.get(f) for f in self.CUBE_FIELDS)
+
+    def save(self, *args, **kwargs):
+        # Keeps the cost cube in step (see cube.py): merges the change from the old version's cells
+        from . import cube
+        if not self._state.adding and getattr(self, '_cube_initial', None) == self._cube_values():
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            before = {} if self._state.adding else cube.cells([self.pk])
+            super().save(*args, **kwargs)
+            cube.update(before, [self.pk])
+        self._cube_initial = self._cube_values()
+
+    def delete(self, *args, **kwargs):
+        from . import cube
+        with transaction.atomic():
+            cube.remove([self.pk])
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.type_intervention} on {self.date_heure}"
 
+class InterventionTechnicienManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import cube
+        created = super().bulk_create(objs, *args, **kwargs)
+        cube.add_links([obj.pk for obj in created])
+        for obj in created:
+            obj._cube_initial = obj._cube_values()
+        return created
+
 class InterventionTechnicien(models.Model):
     ROLE_CHOICES = [
         ('intervenant', 'Intervenant'),
@@ -78,6 +185,38 @@ class InterventionTechnicien(models.Model):
     technicien = models.ForeignKey(Technicien, on_delete=models.CASCADE)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
 
+    objects = InterventionTechnicienManager()
+
+    CUBE_FIELDS = ('intervention_id', 'technicien_id')  # The role is not a cube dimension
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._cube_initial = instance._cube_values()
+        return instance
+
+    def _cube_values(self):
+        return tuple(self.__dict__.get(f) for f in self.CUBE_FIELDS)
+
+    def save(self, *args, **kwargs):
+        from . import cube
+        if not self._state.adding and getattr(self, '_cube_initial', None) == self._cube_values():
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            before = {} if self._state.adding else cube.cells(link_ids=[self.pk])
+            super().save(*args, **kwargs)
+            cube.update(before, link_ids=[self.pk])
+        self._cube_initial = self._cube_values()
+
+    def delete(self, *args, **kwargs):
+        from . import caching, cube
+        with transaction.atomic():
+            cube.remove_links([self.pk])
+            deleted = super().delete(*args, **kwargs)
+        caching.bump(InterventionTechnicien)  # No post_delete receiver (see caching.BULK_DELETED)
+        return deleted
+
 class Citoyen(models.Model):
     id_citoyen = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     nom = models.CharField(max_length=100)
@@ -86,6 +225,21 @@ class Citoyen(models.Model):
     email = models.EmailField(unique=True)
     score_ecologique = models.IntegerField(default=0)
     preferences_mobilite = models.TextField(help_text="Préférences de mobilité (JSON ou texte)")
+    # Set by writes that may change the score; cleared by scoring.compute_scores()
+    score_perime = models.BooleanField(default=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Leaderboard: best scores first (see leaderboard.py)
+            models.Index(models.F('score_ecologique').desc(), 'id_citoyen', name='citoyen_score_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.score_perime = True
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'score_perime'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nom
@@ -98,6 +252,8 @@ class Consultation(models.Model):
     date_fin = models.DateField()
     statut = models.CharField(max_length=20)
     participants = models.ManyToManyField(Citoyen, through='Participation')
+    # Denormalized count of Participation rows (see participations.py)
+    nb_participants = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.titre
@@ -107,6 +263,30 @@ class Participation(models.Model):
     consultation = models.ForeignKey(Consultation, on_delete=models.CASCADE)
     date_participation = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['citoyen', 'consultation'], name='participation_unique'),
+        ]
+
+    # Keeps Consultation.nb_participants and the citizen's eco-score flag in step
+    # (bulk paths: see participations.py)
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding:
+                Consultation.objects.filter(pk=self.consultation_id).update(nb_participants=models.F('nb_participants') + 1)
+            Citoyen.objects.filter(pk=self.citoyen_id).update(score_perime=True)
+
+    def delete(self, *args, **kwargs):
+        from . import caching
+        with transaction.atomic():
+            Consultation.objects.filter(pk=self.consultation_id).update(nb_participants=models.F('nb_participants') - 1)
+            Citoyen.objects.filter(pk=self.citoyen_id).update(score_perime=True)
+            deleted = super().delete(*args, **kwargs)
+        caching.bump(Participation)  # No post_delete receiver (see caching.BULK_DELETED)
+        return deleted
+
 class VehiculeAutonome(models.Model):
     id_vehicule = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     plaque_immatriculation = models.CharField(max_length=20, unique=True)
@@ -121,8 +301,309 @@ class Trajet(models.Model):
     vehicule = models.ForeignKey(VehiculeAutonome, on_delete=models.CASCADE, related_name='trajets')
     origine = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
-    duree = models.IntegerField(help_text="Durée en minutes")
+    district_origine = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    district_destination = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    date_depart = models.DateTimeField(null=True, blank=True, db_index=True)
+    date_arrivee = models.DateTimeField(null=True, blank=True, db_index=True)
+    duree = models.IntegerField(help_text="Durée en minutes (dérivée de date_depart/date_arrivee)")
     economie_co2 = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Serves the /api/trajets/?vehicule=&from=&to= range scans
+            models.Index(fields=['vehicule', 'date_depart'], name='trajet_vehicule_depart_idx'),
+        ]
+
+    def sync_duree(self):
+        # duree follows the timestamps; a lone date_depart gets its arrival from duree.
+        # Bulk paths (bulk_create) skip save(), so they call sync_* explicitly.
+        if self.date_depart and self.date_arrivee:
+            self.duree = max(int((self.date_arrivee - self.date_depart).total_seconds() // 60), 0)
+        elif self.date_depart and self.duree is not None:
+            self.date_arrivee = self.date_depart + timedelta(minutes=self.duree)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._lieux_resolus = (instance.__dict__.get('origine'), instance.__dict__.get('destination'))
+        return instance
+
+    def sync_districts(self):
+        # Resolve the free-text places at write time (see gazetteer.py), and again once
+        # edited. Returns the district fields it changed.
+        from . import gazetteer
+        resolus = getattr(self, '_lieux_resolus', None)
+        changed = []
+        for i, (lieu, field) in enumerate((('origine', 'district_origine'), ('destination', 'district_destination'))):
+            edited = resolus is not None and getattr(self, lieu) != resolus[i]
+            if edited or getattr(self, f'{field}_id') is None:
+                setattr(self, f'{field}_id', gazetteer.resolve(getattr(self, lieu)))
+                changed.append(field)
+        self._lieux_resolus = (self.origine, self.destination)
+        return changed
+
+    def save(self, *args, **kwargs):
+        self.sync_duree()
+        changed = self.sync_districts()
+        update_fields = kwargs.get('update_fields')
+        if changed and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *changed}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.origine} -> {self.destination}"
+
+class PositionVehicule(models.Model):
+    # One row per vehicle, advanced tick by tick along its current trajet (see fleet.py)
+    vehicule = models.OneToOneField(VehiculeAutonome, on_delete=models.CASCADE, primary_key=True, related_name='position')
+    trajet = models.ForeignKey(Trajet, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    progression = models.FloatField(default=0.0, help_text="Avancement sur le trajet (0 à 1)")
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    tick = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.vehicule_id} @ ({self.latitude:.5f}, {self.longitude:.5f})"
+
+class EvenementStatut(models.Model):
+    # Sensor status history: written by Capteur.save() and in bulk by the accelerated simulation (simulation.run_batch)
+    capteur = models.ForeignKey(Capteur, on_delete=models.CASCADE, related_name='evenements')
+    date = models.DateTimeField(db_index=True)
+    ancien_statut = models.CharField(max_length=20, choices=Capteur.STATUT_CHOICES)
+    nouveau_statut = models.CharField(max_length=20, choices=Capteur.STATUT_CHOICES)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['capteur', 'date'], name='evenement_capteur_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.capteur_id}: {self.ancien_statut} -> {self.nouveau_statut} ({self.date})"
+
+class Mesure(models.Model):
+    # Pollutant reading of an air-quality sensor (PM in µg/m³, gases in ppb), see aqi.py
+    POLLUANT_CHOICES = [
+        ('pm25', 'PM2.5'),
+        ('pm10', 'PM10'),
+        ('o3', 'O3'),
+        ('no2', 'NO2'),
+    ]
+    capteur = models.ForeignKey(Capteur, on_delete=models.CASCADE, related_name='mesures')
+    polluant = models.CharField(max_length=10, choices=POLLUANT_CHOICES)
+    date = models.DateTimeField()
+    valeur = models.FloatField()
+
+    class Meta:
+        indexes = [
+            # Rolling windows: readings of one pollutant in a time range, grouped by sensor
+            models.Index(fields=['polluant', 'date', 'capteur'], name='mesure_polluant_date_idx'),
+            models.Index(fields=['date'], name='mesure_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.polluant}={self.valeur} ({self.date})"
+
+class RegleAlerte(models.Model):
+    # User-defined alert rule, evaluated by the rule engine (see rules.py)
+    TYPE_CHOICES = [
+        ('mesure', 'Seuil de mesure'),
+        ('statut', 'Proportion de capteurs dans un statut'),
+        ('silence', 'Capteur silencieux'),
+        ('intervention', "Coût d'intervention"),
+    ]
+    OPERATEUR_CHOICES = [('>', '>'), ('>=', '≥'), ('<', '<'), ('<=', '≤')]
+    nom = models.CharField(max_length=100)
+    type_regle = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    # Scope: empty type / no district = every type / each district
+    type_capteur = models.CharField(max_length=50, choices=Capteur.TYPE_CHOICES, blank=True, default='')
+    district = models.ForeignKey(District, on_delete=models.CASCADE, null=True, blank=True, related_name='regles')
+    polluant = models.CharField(max_length=10, choices=Mesure.POLLUANT_CHOICES, blank=True, default='')
+    statut = models.CharField(max_length=20, choices=Capteur.STATUT_CHOICES, blank=True, default='')
+    operateur = models.CharField(max_length=2, choices=OPERATEUR_CHOICES, default='>')
+    seuil = models.FloatField(default=0, help_text="Valeur, pourcentage de capteurs (statut) ou coût")
+    fenetre_minutes = models.PositiveIntegerField(
+        default=0, help_text="Moyenne (mesure) ou somme (intervention) glissante; durée de silence (silence)"
+    )
+    delai_minutes = models.PositiveIntegerField(default=10, help_text="Délai minimal entre deux notifications")
+    active = models.BooleanField(default=True)
+    date_maj = models.DateTimeField(auto_now=True)  # The engine recompiles the rules when it changes
+
+    def __str__(self):
+        return self.nom
+
+class Alerte(models.Model):
+    # Raised by the anomaly detector (see anomalies.py) and the rule engine (see rules.py)
+    TYPE_CHOICES = [
+        ('pic', 'Pic de mesure'),
+        ('derive', 'Dérive'),
+        ('instabilite', 'Statut instable'),
+        ('regle', 'Règle'),
+    ]
+    capteur = models.ForeignKey(Capteur, on_delete=models.CASCADE, null=True, blank=True, related_name='alertes')
+    district = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, related_name='alertes')
+    regle = models.ForeignKey(RegleAlerte, on_delete=models.SET_NULL, null=True, blank=True, related_name='alertes')
+    type_alerte = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    polluant = models.CharField(max_length=10, blank=True, default='')
+    date = models.DateTimeField()
+    valeur = models.FloatField(null=True, blank=True)
+    score = models.FloatField(help_text="z-score, statistique CUSUM, taux de bascules ou valeur de la règle selon le type")
+    message = models.CharField(max_length=200)
+    acquittee = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date'], name='alerte_date_idx'),
+            models.Index(fields=['capteur', '-date'], name='alerte_capteur_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type_alerte} {self.capteur_id or self.district_id} ({self.date})"
+
+class CubeIntervention(models.Model):
+    # One cell of the maintenance cost cube: Intervention measures summed per period and dimensions (see cube.py)
+    CUBOIDE_CHOICES = [
+        ('type', 'Type d\'intervention'),
+        ('detail', 'Détail'),
+        ('technicien', 'Détail par technicien'),
+    ]
+    GRANULARITE_CHOICES = [('jour', 'Jour'), ('mois', 'Mois')]
+    cuboide = models.CharField(max_length=10, choices=CUBOIDE_CHOICES)
+    granularite = models.CharField(max_length=4, choices=GRANULARITE_CHOICES)
+    periode = models.DateField(help_text="Jour, ou premier jour du mois")
+    district = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    type_capteur = models.CharField(max_length=50, blank=True, choices=Capteur.TYPE_CHOICES)
+    type_intervention = models.CharField(max_length=20, choices=Intervention.TYPE_CHOICES)
+    proprietaire = models.ForeignKey(Proprietaire, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    technicien = models.ForeignKey(Technicien, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    nombre = models.IntegerField(default=0)
+    cout = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    duree = models.BigIntegerField(default=0)
+    impact_co2 = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cuboide', 'granularite', 'periode'], name='cube_periode_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cuboide} {self.granularite} {self.periode}: {self.nombre} interventions"
+
+class RapportProprietaire(models.Model):
+    # Monthly availability, SLA and maintenance figures of one owner, written by reports.py
+    proprietaire = models.ForeignKey(Proprietaire, on_delete=models.CASCADE, related_name='rapports')
+    mois = models.DateField(help_text="Premier jour du mois")
+    nb_capteurs = models.IntegerField(default=0, help_text="Capteurs installés pendant le mois")
+    disponibilite = models.FloatField(null=True, blank=True, help_text="Part du temps capteur en service (%)")
+    heures_indisponibilite = models.FloatField(default=0.0)
+    violations_sla = models.IntegerField(default=0, help_text="Pannes plus longues que le délai de rétablissement")
+    changements_statut = models.IntegerField(default=0)
+    nb_interventions = models.IntegerField(default=0)
+    cout_interventions = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    duree_interventions = models.BigIntegerField(default=0, help_text="Minutes")
+    impact_co2 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    date_calcul = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['proprietaire', 'mois'], name='rapport_proprietaire_mois'),
+        ]
+
+    def __str__(self):
+        return f"{self.proprietaire_id} {self.mois:%Y-%m}"
+
+class TrajetJournalier(models.Model):
+    # Daily totals per vehicle of the archived trajets (see retention.py), read by the trip rollups
+    jour = models.DateField()
+    vehicule = models.ForeignKey(VehiculeAutonome, on_delete=models.CASCADE, related_name='+')
+    trajets = models.IntegerField(default=0)
+    economie_co2 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    minutes = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['jour', 'vehicule'], name='trajet_journalier_jour_vehicule'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicule_id} {self.jour}: {self.trajets} trajets"
+
+class Archive(models.Model):
+    # One archiving run: the rows of `modele` dated before `limite` moved to files under `dossier` (see retention.py)
+    modele = models.CharField(max_length=50)
+    limite = models.DateTimeField(help_text="Les lignes antérieures sont archivées")
+    lignes = models.BigIntegerField(default=0)
+    dossier = models.CharField(max_length=500)
+    date_debut = models.DateTimeField(auto_now_add=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modele', 'limite'], name='archive_modele_limite_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modele} < {self.limite:%Y-%m-%d}: {self.lignes} lignes"
+
+class RepriseImport(models.Model):
+    # Progress of a file import, saved in the transaction of each batch (see imports.py)
+    fichier = models.CharField(max_length=500, unique=True)
+    type_import = models.CharField(max_length=20)
+    taille = models.BigIntegerField(help_text="Taille du fichier à l'import, en octets")
+    modifie = models.BigIntegerField(help_text="Date de modification du fichier, en ns")
+    lues = models.BigIntegerField(default=0)
+    importees = models.BigIntegerField(default=0)
+    rejetees = models.BigIntegerField(default=0)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.fichier}: {self.lues} lignes"
+
+class HorlogeSimulation(models.Model):
+    # Single row: the simulated "now" that /api/simulate/run/ advances
+    instant = models.DateTimeField()
+
+    @classmethod
+    def courante(cls):
+        return cls.objects.get_or_create(pk=1, defaults={'instant': timezone.now()})[0]
+
+    def __str__(self):
+        return self.instant.isoformat()
+
+class Job(models.Model):
+    # Long-running work (simulation, data generation) run off the request path by run_workers (see jobs.py)
+    TYPE_CHOICES = [
+        ('simulation', 'Simulation'),
+        ('simulation_batch', 'Simulation accélérée'),
+        ('generation', 'Génération de données'),
+        ('rapport', 'Rapports propriétaires'),
+    ]
+    STATUT_CHOICES = [
+        ('en_attente', 'En Attente'),
+        ('en_cours', 'En Cours'),
+        ('termine', 'Terminé'),
+        ('echoue', 'Échoué'),
+        ('annule', 'Annulé'),
+    ]
+    id_job = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    type_job = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    parametres = models.JSONField(default=dict, blank=True)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    progression = models.FloatField(default=0.0, help_text="Avancement (0 à 1)")
+    message = models.CharField(max_length=200, blank=True, default="")
+    resultat = models.JSONField(null=True, blank=True)
+    erreur = models.TextField(blank=True, default="")
+    annulation_demandee = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    date_maj = models.DateTimeField(auto_now=True, help_text="Dernier signe de vie du worker")
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest pending job
+            models.Index(fields=['statut', 'date_creation'], name='job_statut_creation_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type_job} ({self.statut})"
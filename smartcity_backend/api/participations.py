@@ -0,0 +1,126 @@
+"""
+Participation ingest.
+
+ingest() records thousands of (citoyen, consultation) pairs in one transaction with
+upsert semantics: pairs already recorded are left alone, so a client may resend a
+batch after a timeout. The unique (citoyen, consultation) constraint backs this up
+against concurrent writers (the insert ignores conflicts).
+
+Consultation.nb_participants is a denormalized count. Single-row writes adjust it
+with F() in Participation.save()/delete(); bulk paths call recount(), which rewrites
+the counts of the touched consultations from the table in the same transaction.
+Deleting a citizen cascades to their participations without Participation.delete():
+a pre_delete receiver on Citoyen takes them off the counts first.
+"""
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.signals import pre_delete
+from django.db.models.functions import Coalesce
+
+from . import caching
+from .dbutils import chunks
+from .models import Citoyen, Consultation, Participation
+
+MAX_PAIRS = 10000
+
+_state = threading.local()  # .paused: counting_paused() in this thread
+
+
+class IngestError(ValueError):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _existing(model, ids):
+    found = set()
+    for chunk in chunks(ids):
+        found.update(model.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+    return found
+
+
+def parse_pairs(items):
+    """[{'citoyen': id, 'consultation': id}, ...] or {'consultation': id, 'citoyens': [ids]} -> set of UUID pairs."""
+    if isinstance(items, dict):
+        items = [{'citoyen': c, 'consultation': items.get('consultation')} for c in items.get('citoyens') or []]
+    if not isinstance(items, list):
+        raise IngestError({'non_field_errors': "Liste de paires {citoyen, consultation} attendue."})
+    if len(items) > MAX_PAIRS:
+        raise IngestError({'non_field_errors': f"Au plus {MAX_PAIRS} paires par appel."})
+    pairs = set()
+    for i, item in enumerate(items):
+        try:
+            pairs.add((uuid.UUID(str(item['citoyen'])), uuid.UUID(str(item['consultation']))))
+        except (KeyError, TypeError, ValueError):
+            raise IngestError({str(i): "Paire invalide: 'citoyen' et 'consultation' (UUID) attendus."})
+    return pairs
+
+
+def recount(consultation_ids=None):
+    """Rewrites nb_participants from the Participation table (all consultations by default)."""
+    count = Subquery(
+        Participation.objects.filter(consultation=OuterRef('pk')).order_by()
+        .values('consultation').annotate(n=Count('pk')).values('n')
+    )
+    consultations = Consultation.objects.all()
+    if consultation_ids is None:
+        consultations.update(nb_participants=Coalesce(count, 0))
+        return
+    for chunk in chunks(consultation_ids):
+        consultations.filter(pk__in=chunk).update(nb_participants=Coalesce(count, 0))
+
+
+def ingest(pairs):
+    """Records the pairs not recorded yet. Returns {'recues', 'creees', 'existantes'}."""
+    citoyens = {c for c, _ in pairs}
+    consultations = {k for _, k in pairs}
+    errors = {}
+    missing = citoyens - _existing(Citoyen, citoyens)
+    if missing:
+        errors['citoyen'] = [f"Inconnu: {pk}" for pk in sorted(map(str, missing))[:20]]
+    missing = consultations - _existing(Consultation, consultations)
+    if missing:
+        errors['consultation'] = [f"Inconnue: {pk}" for pk in sorted(map(str, missing))[:20]]
+    if errors:
+        raise IngestError(errors)
+
+    with transaction.atomic(), caching.invalidation_paused(Participation, Consultation, Citoyen):
+        known = set()
+        for chunk in chunks(citoyens):
+            known.update(Participation.objects.filter(citoyen__in=chunk, consultation__in=consultations)
+                         .values_list('citoyen', 'consultation'))
+        new = pairs - known
+        Participation.objects.bulk_create(
+            [Participation(citoyen_id=c, consultation_id=k) for c, k in new], batch_size=2000, ignore_conflicts=True
+        )
+        recount({k for _, k in new})
+        # The new participations change these citizens' eco-scores (see scoring.py)
+        for chunk in chunks({c for c, _ in new}):
+            Citoyen.objects.filter(pk__in=chunk).update(score_perime=True)
+    return {'recues': len(pairs), 'creees': len(new), 'existantes': len(pairs) - len(new)}
+
+
+# --- Cascades ---
+
+def _on_citoyen_delete(sender, instance, **kwargs):
+    if not getattr(_state, 'paused', False):
+        Consultation.objects.filter(participation__citoyen=instance).update(nb_participants=F('nb_participants') - 1)
+
+
+def connect_signals():
+    pre_delete.connect(_on_citoyen_delete, sender=Citoyen, dispatch_uid='participations-citoyen-delete')
+
+
+@contextmanager
+def counting_paused():
+    """Skips the cascade receiver in this thread for a bulk wipe (one query per citizen); the caller runs recount()."""
+    previous = getattr(_state, 'paused', False)
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = previous
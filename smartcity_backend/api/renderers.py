@@ -0,0 +1,63 @@
+"""
+Compact response formats, picked by content negotiation (Accept header or ?format=).
+
+- ColumnarJSONRenderer (application/vnd.smartcity.columnar+json, ?format=columnar):
+  a list of objects becomes {"columns": [...], "rows": [[...], ...]}, so keys are
+  sent once instead of once per row. Anything else is rendered as plain JSON.
+- MessagePackRenderer (application/msgpack, ?format=msgpack): the columnar layout in
+  binary form (numbers and booleans packed natively); only available when the
+  optional msgpack package is installed.
+
+With COERCE_DECIMAL_TO_STRING off, decimals reach the renderers as Decimal and are
+written as numbers.
+"""
+import datetime
+import decimal
+import uuid
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency
+    msgpack = None
+
+
+def to_columns(data):
+    """[{'a': 1, 'b': 2}, {'a': 3, 'b': 4}] -> {'columns': ['a', 'b'], 'rows': [[1, 2], [3, 4]]}"""
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        return data
+    columns = list(data[0]) if data else []
+    return {'columns': columns, 'rows': [[row.get(c) for c in columns] for row in data]}
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.smartcity.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_columns(data), accepted_media_type, renderer_context)
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):  # numpy scalars and arrays
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize {type(obj).__name__} to msgpack")
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(to_columns(data), default=_msgpack_default, use_bin_type=True)
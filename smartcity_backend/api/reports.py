@@ -0,0 +1,284 @@
+"""
+Monthly reports per owner (Proprietaire) for billing: sensor availability, SLA
+breaches, status changes and intervention costs.
+
+run() treats each owner as an independent partition and spreads them over a pool of
+processes. A partition streams its sensors' status events, its sensors and its
+interventions in batches (raw_batches(): server-side cursors on PostgreSQL) and folds
+each batch into per-month arrays in one pass. Its memory depends on the number of
+months, of sensors and on the longest history of a single sensor, not on the number
+of rows. The parent writes every row to RapportProprietaire (a single writer), and to
+a CSV file and, when pyarrow is installed, a Parquet file.
+
+Availability is the share of sensor time spent 'actif', from installation (or the
+start of the period) to the end of each month, or now. An outage, meaning any run of
+non-'actif' statuses, breaches the SLA when it lasts longer than SLA_HEURES for the
+owner's type. The breach counts in the month the outage started. An outage still open
+at the end of the period counts with its duration so far.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching, retention
+from .dbutils import raw_batches, timestamps
+from .models import Capteur, EvenementStatut, Intervention, Proprietaire, RapportProprietaire
+
+SLA_HEURES = {'municipalité': 72, 'privé': 24}  # Time to restore a sensor
+READ_BATCH = 100000
+COLONNES = [
+    'nb_capteurs', 'disponibilite', 'heures_indisponibilite', 'violations_sla', 'changements_statut',
+    'nb_interventions', 'cout_interventions', 'duree_interventions', 'impact_co2',
+]
+
+
+def parse_mois(value):
+    """'2025-03' (or a date) -> date(2025, 3, 1); ValueError otherwise."""
+    if isinstance(value, date):
+        return value.replace(day=1)
+    year, month = str(value).split('-')[:2]
+    return date(int(year), int(month), 1)
+
+
+def last_month():
+    """(debut, fin) of the previous calendar month, the default billing period."""
+    fin = timezone.localdate().replace(day=1)
+    return (fin - timedelta(days=1)).replace(day=1), fin
+
+
+def months(debut, fin):
+    """First days of the months from debut (included) to fin (excluded)."""
+    return [d.date() for d in pd.date_range(debut, fin, freq='MS', inclusive='left')]
+
+
+def _bounds(debut, fin):
+    """Epoch seconds of the month boundaries, capped at now."""
+    tz = timezone.get_current_timezone()
+    edges = months(debut, fin) + [fin]
+    seconds = np.array([datetime(d.year, d.month, d.day, tzinfo=tz).timestamp() for d in edges])
+    return np.minimum(seconds, time.time())
+
+
+def _month(t, bounds):
+    """Month index of each timestamp; -1 or len(bounds) - 1 when out of the period."""
+    return np.searchsorted(bounds, t, side='right') - 1
+
+
+def _overlap(starts, ends, bounds):
+    """Seconds of each [start, end) interval within each month: (len(starts), months)."""
+    return np.clip(np.minimum(ends[:, None], bounds[None, 1:]) - np.maximum(starts[:, None], bounds[None, :-1]), 0, None)
+
+
+class _Partition:
+    """Per-month accumulators of one owner."""
+
+    def __init__(self, bounds, sla_seconds):
+        self.bounds = bounds
+        self.sla = sla_seconds
+        n = len(bounds) - 1
+        self.exposition = np.zeros(n)
+        self.indisponible = np.zeros(n)
+        self.capteurs = np.zeros(n, dtype=np.int64)
+        self.violations = np.zeros(n, dtype=np.int64)
+        self.changements = np.zeros(n, dtype=np.int64)
+        self.interventions = np.zeros((4, n))  # count, cost, duration, CO2
+
+    def _count(self, target, t):
+        month = _month(t, self.bounds)
+        inside = (month >= 0) & (month < len(target))
+        np.add.at(target, month[inside], 1)
+
+    def fold_segments(self, capteurs, starts, ends, down):
+        """Status segments ordered by sensor then time: downtime per month, and the outages breaching the SLA."""
+        ends = np.maximum(ends, starts)
+        self.indisponible += _overlap(starts[down], ends[down], self.bounds).sum(axis=0)
+        same = np.r_[False, capteurs[1:] == capteurs[:-1]]
+        new = down & ~(np.r_[False, down[:-1]] & same)
+        if not new.any():
+            return
+        outage = np.cumsum(new) - 1
+        durations = np.bincount(outage[down], weights=(ends - starts)[down], minlength=int(new.sum()))
+        self._count(self.violations, starts[new][durations > self.sla])
+
+    def fold_events(self, frame):
+        """Status events of complete sensors, ordered by sensor then date."""
+        capteurs = frame['capteur'].to_numpy()
+        _, t = timestamps(frame['date'])
+        _, installation = timestamps(frame['installation'])
+        first = np.r_[True, capteurs[1:] != capteurs[:-1]]
+        last = np.r_[first[1:], True]
+        self._count(self.changements, t)
+        # Each event opens a segment in its new status; the first one also closes the
+        # segment in its previous status, from installation (or the start of the period)
+        begin = np.maximum(installation[first], self.bounds[0])
+        starts = np.r_[begin, t]
+        ends = np.r_[t[first], np.where(last, self.bounds[-1], np.r_[t[1:], 0.0])]
+        statuts = np.r_[frame['ancien'].to_numpy()[first], frame['nouveau'].to_numpy()]
+        positions = np.r_[np.flatnonzero(first) - 0.5, np.arange(len(frame))]
+        order = np.argsort(positions, kind='stable')
+        self.fold_segments(np.r_[capteurs[first], capteurs][order], starts[order], ends[order], (statuts != 'actif')[order])
+
+    def fold_capteurs(self, frame, seen):
+        """Sensors: time in service per month, and the constant status of those without events in the period."""
+        _, installation = timestamps(frame['installation'])
+        begin = np.maximum(installation, self.bounds[0])
+        overlap = _overlap(begin, np.full(len(begin), self.bounds[-1]), self.bounds)
+        self.exposition += overlap.sum(axis=0)
+        self.capteurs += (overlap > 0).sum(axis=0)
+        quiet = ~frame['capteur'].isin(seen).to_numpy()
+        if quiet.any():
+            self.fold_segments(frame['capteur'].to_numpy()[quiet], begin[quiet], np.full(quiet.sum(), self.bounds[-1]),
+                               (frame['statut'].to_numpy() != 'actif')[quiet])
+
+    def fold_interventions(self, frame):
+        _, t = timestamps(frame['date'])
+        month = _month(t, self.bounds)
+        inside = (month >= 0) & (month < self.interventions.shape[1])
+        weights = (np.ones(len(frame)), frame['cout'].astype(float), frame['duree'].astype(float), frame['impact_co2'].astype(float))
+        for row, w in zip(self.interventions, weights):
+            row += np.bincount(month[inside], weights=np.asarray(w)[inside], minlength=len(row))
+
+    def rows(self, proprietaire_id, mois):
+        rows = []
+        for k, m in enumerate(mois):
+            exposition = self.exposition[k]
+            rows.append({
+                'proprietaire_id': proprietaire_id,
+                'mois': m,
+                'nb_capteurs': int(self.capteurs[k]),
+                'disponibilite': round(100 * (1 - self.indisponible[k] / exposition), 2) if exposition > 0 else None,
+                'heures_indisponibilite': round(self.indisponible[k] / 3600, 1),
+                'violations_sla': int(self.violations[k]),
+                'changements_statut': int(self.changements[k]),
+                'nb_interventions': int(self.interventions[0, k]),
+                'cout_interventions': round(float(self.interventions[1, k]), 2),
+                'duree_interventions': int(self.interventions[2, k]),
+                'impact_co2': round(float(self.interventions[3, k]), 2),
+            })
+        return rows
+
+
+def _frames(queryset, columns):
+    for rows in raw_batches(queryset, READ_BATCH):
+        yield pd.DataFrame(rows, columns=columns)
+
+
+def owner_report(proprietaire_id, debut, fin):
+    """Report rows of one owner, one per month from debut to fin (excluded)."""
+    proprietaire = Proprietaire.objects.get(pk=proprietaire_id)
+    bounds = _bounds(debut, fin)
+    start = datetime.fromtimestamp(bounds[0], tz=timezone.get_current_timezone())
+    end = datetime.fromtimestamp(bounds[-1], tz=timezone.get_current_timezone())
+    partition = _Partition(bounds, SLA_HEURES.get(proprietaire.type_proprietaire, 24) * 3600)
+
+    # 1. Status events, sensor by sensor. A batch may end in the middle of a sensor's
+    # history: its rows are held back and processed with the next batch.
+    events = (EvenementStatut.objects.filter(capteur__proprietaire=proprietaire, date__gte=start, date__lt=end)
+              .order_by('capteur', 'date', 'pk')
+              .values_list('capteur_id', 'date', 'ancien_statut', 'nouveau_statut', 'capteur__date_installation'))
+    seen = set()
+    pending = None
+    for frame in _frames(events, ['capteur', 'date', 'ancien', 'nouveau', 'installation']):
+        if pending is not None:
+            frame = pd.concat([pending, frame], ignore_index=True)
+        complete = (frame['capteur'] != frame['capteur'].iat[-1]).to_numpy()
+        pending = frame[~complete]
+        if complete.any():
+            partition.fold_events(frame[complete].reset_index(drop=True))
+            seen.update(frame['capteur'][complete].unique())
+    if pending is not None:
+        partition.fold_events(pending.reset_index(drop=True))
+        seen.update(pending['capteur'].unique())
+
+    # 2. Sensors, with their status at the start of the period for those without events in it
+    history = EvenementStatut.objects.filter(capteur=OuterRef('pk'))
+    capteurs = (Capteur.objects.filter(proprietaire=proprietaire).order_by()
+                .annotate(statut_debut=Coalesce(
+                    Subquery(history.filter(date__lt=start).order_by('-date', '-pk').values('nouveau_statut')[:1]),
+                    Subquery(history.filter(date__gte=start).order_by('date', 'pk').values('ancien_statut')[:1]),
+                    F('statut'),
+                ))
+                .values_list('pk', 'date_installation', 'statut_debut'))
+    for frame in _frames(capteurs, ['capteur', 'installation', 'statut']):
+        partition.fold_capteurs(frame, seen)
+
+    # 3. Interventions
+    interventions = (Intervention.objects.filter(capteur__proprietaire=proprietaire, date_heure__gte=start, date_heure__lt=end)
+                     .order_by().values_list('date_heure', 'cout', 'duree', 'impact_co2'))
+    for frame in _frames(interventions, ['date', 'cout', 'duree', 'impact_co2']):
+        partition.fold_interventions(frame)
+
+    return partition.rows(proprietaire.pk, months(debut, fin))
+
+
+def run(debut, fin, proprietaires=None, workers=1, dossier=None, progress=None):
+    """
+    Reports of every owner (or the given ids) from debut to fin (month starts, fin
+    excluded). Replaces the stored rows of those months and writes the files to
+    `dossier` (default: settings.REPORT_DIR). Returns a summary.
+    """
+    archived = retention.horizon(Intervention, EvenementStatut)
+    if archived and debut < timezone.localdate(archived):
+        # Their interventions and status events are gone: the stored rows are the reference
+        raise ValueError(f"Les mois avant {timezone.localdate(archived):%Y-%m} sont archivés, leurs rapports sont conservés.")
+    t0 = time.perf_counter()
+    ids = list(Proprietaire.objects.filter(**({'pk__in': proprietaires} if proprietaires else {}))
+               .order_by('pk').values_list('pk', flat=True))
+    rows = []
+    if workers > 1 and len(ids) > 1:
+        # Children open their own connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(ids)), mp_context=multiprocessing.get_context('fork'))
+        try:
+            futures = [pool.submit(owner_report, pk, debut, fin) for pk in ids]
+            for done, future in enumerate(as_completed(futures), 1):
+                rows += future.result()
+                if progress:
+                    progress(done / len(ids), f"Propriétaire {done}/{len(ids)}")
+        finally:
+            pool.shutdown(cancel_futures=True)
+    else:
+        for done, pk in enumerate(ids, 1):
+            rows += owner_report(pk, debut, fin)
+            if progress:
+                progress(done / len(ids), f"Propriétaire {done}/{len(ids)}")
+
+    with transaction.atomic():
+        RapportProprietaire.objects.filter(proprietaire__in=ids, mois__gte=debut, mois__lt=fin).delete()
+        RapportProprietaire.objects.bulk_create([RapportProprietaire(**r) for r in rows], batch_size=2000)
+    caching.bump(RapportProprietaire)
+
+    fichiers = write_files(rows, debut, fin, Path(dossier or settings.REPORT_DIR))
+    return {
+        'proprietaires': len(ids),
+        'lignes': len(rows),
+        **fichiers,
+        'duree_s': round(time.perf_counter() - t0, 2),
+    }
+
+
+def write_files(rows, debut, fin, dossier):
+    """CSV and Parquet (when pyarrow is installed) copies of the report rows."""
+    noms = dict(Proprietaire.objects.values_list('pk', 'nom'))
+    frame = pd.DataFrame(rows, columns=['proprietaire_id', 'mois'] + COLONNES)
+    frame.insert(1, 'proprietaire', frame['proprietaire_id'].map(noms))
+    frame['proprietaire_id'] = frame['proprietaire_id'].astype(str)
+    dossier.mkdir(parents=True, exist_ok=True)
+    base = dossier / f"rapport_proprietaires_{debut:%Y-%m}_{fin:%Y-%m}"
+    frame.to_csv(base.with_suffix('.csv'), index=False)
+    try:
+        frame.to_parquet(base.with_suffix('.parquet'), index=False)
+        parquet = str(base.with_suffix('.parquet'))
+    except ImportError:
+        parquet = None
+    return {'csv': str(base.with_suffix('.csv')), 'parquet': parquet}
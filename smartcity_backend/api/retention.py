@@ -0,0 +1,240 @@
+"""
+Retention: moves the old rows of the high-churn tables out of the database.
+
+Each policy (POLICIES) names a table, its date column and which of its rows may go;
+settings.RETENTION_DAYS says how long rows stay. archive() takes the rows dated
+before the limit (rounded down to a month start), oldest first, in batches of
+`batch_size`. Each batch is written to a gzipped CSV under settings.ARCHIVE_DIR, then
+deleted in a short transaction of its own, so the API and the simulators never wait
+long for the lock. A file is named after the first row of its batch: a batch redone
+after a crash overwrites its file rather than duplicating rows.
+
+Rollups outlive the rows they summarize:
+- the maintenance cube keeps the cells of archived interventions, and cube.rebuild()
+  only recomputes the periods after the archive horizon (horizon());
+- owner reports of archived months are kept, and reports.run() refuses to redo them;
+- archived trajets are summed per day and vehicle into TrajetJournalier, which the
+  daily trip rollup and the CO2 KPI add to the remaining trajets;
+- the last status event of each sensor before the limit stays, so its status at any
+  later date can still be worked out.
+
+maintain() then refreshes the planner statistics and gives the freed pages back to the
+file system (SQLite: ANALYZE, incremental_vacuum, WAL checkpoint; PostgreSQL: VACUUM
+ANALYZE).
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Exists, F, Max, OuterRef, Q
+from django.utils import timezone
+
+from . import caching
+from .dbutils import chunks
+from .models import (
+    Alerte, Archive, EvenementStatut, Intervention, InterventionTechnicien, Job, Mesure, Trajet, TrajetJournalier
+)
+
+BATCH_SIZE = 10000
+VACUUM_STEP = 2000  # Pages freed per incremental_vacuum statement (each one holds the write lock)
+
+
+class Policy:
+    def __init__(self, model, date_field, related=(), condition=None, rollup=None):
+        self.model = model
+        self.date_field = date_field
+        self.related = related        # (model, foreign key to this one): rows archived alongside
+        self.condition = condition    # limit -> Q or expression the archived rows must also match
+        self.rollup = rollup          # Called with each batch before it is deleted
+
+    @property
+    def name(self):
+        return self.model._meta.model_name
+
+    def queryset(self, limite):
+        queryset = self.model.objects.filter(**{f'{self.date_field}__lt': limite})
+        if self.condition is not None:
+            queryset = queryset.filter(self.condition(limite))
+        return queryset
+
+
+def _superseded(limite):
+    # A later event of the same sensor, still before the limit, replaces this one
+    later = EvenementStatut.objects.filter(capteur=OuterRef('capteur'), date__lt=limite).filter(
+        Q(date__gt=OuterRef('date')) | Q(date=OuterRef('date'), pk__gt=OuterRef('pk'))
+    )
+    return Exists(later)
+
+
+def _rollup_trajets(rows):
+    """Adds a batch of trajets to the daily totals per vehicle."""
+    totals = {}
+    for row in rows:
+        key = (timezone.localdate(row['date_depart']), row['vehicule_id'])
+        total = totals.setdefault(key, [0, 0, 0])
+        total[0] += 1
+        total[1] += row['economie_co2']
+        total[2] += row['duree']
+    existing = {
+        (r.jour, r.vehicule_id): r
+        for r in TrajetJournalier.objects.filter(jour__in={j for j, _ in totals}, vehicule__in={v for _, v in totals})
+    }
+    created, updated = [], []
+    for (jour, vehicule), (trajets, economie_co2, minutes) in totals.items():
+        row = existing.get((jour, vehicule))
+        if row is None:
+            created.append(TrajetJournalier(jour=jour, vehicule_id=vehicule, trajets=trajets,
+                                            economie_co2=economie_co2, minutes=minutes))
+            continue
+        row.trajets += trajets
+        row.economie_co2 += economie_co2
+        row.minutes += minutes
+        updated.append(row)
+    TrajetJournalier.objects.bulk_create(created, batch_size=2000)
+    TrajetJournalier.objects.bulk_update(updated, ['trajets', 'economie_co2', 'minutes'], batch_size=2000)
+
+
+POLICIES = {
+    policy.name: policy for policy in (
+        Policy(Trajet, 'date_depart', rollup=_rollup_trajets),
+        Policy(Intervention, 'date_heure', related=((InterventionTechnicien, 'intervention'),)),
+        Policy(EvenementStatut, 'date', condition=_superseded),
+        Policy(Mesure, 'date'),
+        Policy(Alerte, 'date', condition=lambda limite: Q(acquittee=True)),
+        Policy(Job, 'date_creation', condition=lambda limite: Q(statut__in=('termine', 'echoue', 'annule'))),
+    )
+}
+
+
+def month_start(instant):
+    local = timezone.localtime(instant)
+    return timezone.make_aware(datetime(local.year, local.month, 1))
+
+
+def horizon(*models):
+    """Archive limit of these tables: none of their rows before it are left (None if never archived)."""
+    return Archive.objects.filter(modele__in=[m._meta.model_name for m in models], lignes__gt=0).aggregate(
+        h=Max('limite'))['h']
+
+
+def _write(rows, path):
+    import pandas as pd
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    pd.DataFrame(rows).to_csv(tmp, index=False, compression='gzip')
+    os.replace(tmp, path)
+
+
+def _fields(model):
+    return [f.attname for f in model._meta.concrete_fields]
+
+
+def archive(nom, limite=None, batch_size=BATCH_SIZE, dossier=None, pause=0.0, progress=None):
+    """
+    Archives the rows of POLICIES[nom] dated before `limite` (default: now minus the
+    table's retention), rounded down to a month start. Returns a summary.
+    """
+    policy = POLICIES[nom]
+    if limite is None:
+        jours = settings.RETENTION_DAYS.get(nom)
+        if not jours:
+            return {'modele': nom, 'limite': None, 'lignes': 0, 'fichiers': 0, 'duree_s': 0.0}
+        limite = timezone.now() - timedelta(days=jours)
+    limite = month_start(limite)
+    dossier = Path(dossier or settings.ARCHIVE_DIR)
+    t0 = time.perf_counter()
+    lot, fichiers = None, 0
+    related_models = [model for model, _ in policy.related]
+    with caching.invalidation_paused(policy.model, *related_models):
+        while True:
+            rows = list(policy.queryset(limite).order_by(policy.date_field, 'pk')
+                        .values(*_fields(policy.model))[:batch_size])
+            if not rows:
+                break
+            if lot is None:
+                # Recorded before the first delete: horizon() must hold even if the run stops midway
+                lot = Archive.objects.create(modele=nom, limite=limite, dossier=str(dossier))
+            ids = [row[policy.model._meta.pk.attname] for row in rows]
+            first = timezone.localtime(rows[0][policy.date_field])
+            month, stem = f"{first:%Y-%m}", f"{first:%Y%m%dT%H%M%S}-{ids[0]}"
+            for model, fk in policy.related:
+                linked = [r for chunk in chunks(ids)
+                          for r in model.objects.filter(**{f'{fk}__in': chunk}).order_by('pk').values(*_fields(model))]
+                if linked:
+                    _write(linked, dossier / model._meta.model_name / month / f"{stem}.csv.gz")
+                    fichiers += 1
+            _write(rows, dossier / nom / month / f"{stem}.csv.gz")
+            fichiers += 1
+
+            with transaction.atomic():
+                if policy.rollup:
+                    policy.rollup(rows)
+                for chunk in chunks(ids):
+                    policy.model.objects.filter(pk__in=chunk).only('pk').delete()
+                Archive.objects.filter(pk=lot.pk).update(lignes=F('lignes') + len(rows))
+            if progress:
+                progress(nom, Archive.objects.get(pk=lot.pk).lignes)
+            if pause:
+                time.sleep(pause)  # Lets the other writers in between batches
+
+    lignes = 0
+    if lot is not None:
+        lot.refresh_from_db()
+        lot.date_fin = timezone.now()
+        lot.save(update_fields=['date_fin'])
+        lignes = lot.lignes
+        if policy.rollup:
+            caching.bump(TrajetJournalier)  # bulk_create/bulk_update send no post_save
+    return {'modele': nom, 'limite': limite.isoformat(), 'lignes': lignes, 'fichiers': fichiers,
+            'duree_s': round(time.perf_counter() - t0, 2)}
+
+
+def maintain(tables=(), vacuum=False):
+    """
+    Refreshes the statistics of `tables` (db table names) and gives free pages back.
+
+    On SQLite, freed pages are returned step by step with incremental_vacuum when the
+    file uses incremental auto-vacuum (new files do, see settings). vacuum=True switches
+    an existing file to it with a full VACUUM, which locks the database while it copies it.
+    """
+    connection = connections['default']
+    quote = connection.ops.quote_name
+    summary = {'tables': list(tables), 'pages_liberees': 0}
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            if vacuum:
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                cursor.execute("VACUUM")
+            for table in tables:
+                cursor.execute(f"ANALYZE {quote(table)}")
+            cursor.execute("PRAGMA optimize")
+            summary['auto_vacuum'] = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if summary['auto_vacuum'] == 2:  # INCREMENTAL
+                while True:
+                    free = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                    if not free:
+                        break
+                    cursor.execute(f"PRAGMA incremental_vacuum({min(free, VACUUM_STEP)})").fetchall()
+                    summary['pages_liberees'] += min(free, VACUUM_STEP)
+            if not connection.in_atomic_block:  # A checkpoint waits for the open transactions
+                cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        elif connection.vendor == 'postgresql':
+            for table in tables:
+                cursor.execute(f"VACUUM (ANALYZE) {quote(table)}")
+        else:
+            for table in tables:
+                cursor.execute(f"ANALYZE TABLE {quote(table)}")
+    return summary
+
+
+def run(noms=None, batch_size=BATCH_SIZE, dossier=None, pause=0.0, vacuum=False, progress=None):
+    """Archives every policy (or `noms`) past its retention, then maintain(). Returns the summaries."""
+    archives = [archive(nom, batch_size=batch_size, dossier=dossier, pause=pause, progress=progress)
+                for nom in (noms or POLICIES)]
+    tables = [POLICIES[a['modele']].model._meta.db_table for a in archives if a['lignes']]
+    tables += [model._meta.db_table for a in archives if a['lignes'] for model, _ in POLICIES[a['modele']].related]
+    return {'archives': archives, 'maintenance': maintain(tables, vacuum=vacuum)}
@@ -0,0 +1,314 @@
+"""
+Alert rule engine: the RegleAlerte rows, evaluated on the streams that
+anomalies.Stream reads (readings, status changes, interventions).
+
+The rules are compiled once into an index keyed by (type_capteur, district), where ''
+and None are wildcards. An event is tested only against the rules of its four possible
+keys. Reading rules are further indexed by pollutant, window and operator, as sorted
+threshold arrays. A batch of readings is grouped by key and matched with
+np.searchsorted, so only the rows that cross a threshold reach Python.
+
+Windowed aggregates are maintained incrementally, one update per event:
+- 'mesure' with fenetre_minutes: rolling mean per (sensor, pollutant, window), shared
+  by every rule with that window;
+- 'intervention' with fenetre_minutes: rolling cost sum per (rule, district);
+- 'statut': sensor counts per (district, type_capteur, statut);
+- 'silence': last activity of each sensor, swept after every batch.
+
+Time is event time: the latest date seen in the streams (simulations write past or
+future dates). Notifications are throttled per (rule, sensor or district) by
+delai_minutes. 'statut' and 'silence' alerts are also raised once per episode; the
+rule re-arms when the condition clears.
+"""
+import operator
+import time
+from collections import Counter, deque
+
+import numpy as np
+import pandas as pd
+from django.db.models import Count, Max
+
+from .dbutils import raw_rows, timestamps
+from .models import Alerte, Capteur, Mesure, RegleAlerte
+
+OPERATEURS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+POLLUANTS = [p for p, _ in Mesure.POLLUANT_CHOICES]
+TYPES = [t for t, _ in Capteur.TYPE_CHOICES]
+CAPTEURS_REFRESH = 300  # Seconds between two reloads of the sensors' type, district and status
+PRUNE_INTERVAL = 3600   # Event-time seconds between two purges of the throttling state
+
+
+def _scopes(type_capteur, district):
+    """Index keys of the rules that apply to a sensor of this type and district."""
+    return dict.fromkeys(((type_capteur, district), (type_capteur, None), ('', district), ('', None)))
+
+
+class SlidingWindow:
+    """Sum and count of the values of the last `seconds`, updated in O(1) amortized per value."""
+    __slots__ = ('seconds', 'items', 'total')
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.items = deque()
+        self.total = 0.0
+
+    def add(self, t, value):
+        self.items.append((t, value))
+        self.total += value
+        while self.items[0][0] <= t - self.seconds:
+            self.total -= self.items.popleft()[1]
+
+    @property
+    def mean(self):
+        return self.total / len(self.items)
+
+
+class RuleIndex:
+    """The active rules, compiled."""
+
+    def __init__(self, regles):
+        self.scoped = {}      # (type_regle, type_capteur, district) -> [regles]
+        self.thresholds = {}  # (polluant, type_capteur, district) -> {(fenetre_minutes, operateur): (sorted seuils, regles)}
+        self.silence = {}     # (type_capteur, district) -> [regles]
+        self.delai_max = 0
+        for regle in regles:
+            scope = (regle.type_capteur, regle.district_id)
+            self.delai_max = max(self.delai_max, regle.delai_minutes * 60)
+            if regle.type_regle == 'silence':
+                self.silence.setdefault(scope, []).append(regle)
+            elif regle.type_regle == 'mesure':
+                by_op = self.thresholds.setdefault((regle.polluant,) + scope, {})
+                by_op.setdefault((regle.fenetre_minutes, regle.operateur), []).append(regle)
+            else:
+                self.scoped.setdefault((regle.type_regle,) + scope, []).append(regle)
+        for by_op in self.thresholds.values():
+            for key, group in by_op.items():
+                group.sort(key=lambda r: r.seuil)
+                by_op[key] = (np.array([r.seuil for r in group]), group)
+
+    def rules(self, kind, type_capteur, district):
+        return [r for scope in _scopes(type_capteur, district) for r in self.scoped.get((kind,) + scope, ())]
+
+
+def _matches(op, seuils, values):
+    """(first, last) indices into the sorted seuils of the rules each value satisfies."""
+    if op == '>':
+        return np.zeros(len(values), dtype=np.int64), np.searchsorted(seuils, values, side='left')
+    if op == '>=':
+        return np.zeros(len(values), dtype=np.int64), np.searchsorted(seuils, values, side='right')
+    first = np.searchsorted(seuils, values, side='right' if op == '<' else 'left')
+    return first, np.full(len(values), len(seuils))
+
+
+class Engine:
+    """Evaluates the rules on batches of events; each process_*() / sweep() returns unsaved Alerte rows."""
+
+    def __init__(self):
+        self.signature = None
+        self.index = RuleIndex([])
+        self.capteurs_loaded = None
+        self.now = -np.inf
+        self.debut = None
+        self.last_sweep = -np.inf
+        self.last_prune = -np.inf
+        self.seen = np.full(1, np.nan)
+        self.windows = {}
+        self.notifications = {}
+        self.episodes = set()
+        self.pending = []
+        self.refresh()
+
+    # --- State loading ---
+
+    def refresh(self):
+        """Recompiles the rules when one was added, changed or deleted; reloads the sensors periodically."""
+        signature = tuple(RegleAlerte.objects.aggregate(n=Count('pk'), maj=Max('date_maj')).values())
+        if signature != self.signature:
+            self.signature = signature
+            self.index = RuleIndex(RegleAlerte.objects.filter(active=True))
+        if self.capteurs_loaded is None or time.monotonic() - self.capteurs_loaded > CAPTEURS_REFRESH:
+            self.load_capteurs()
+
+    def load_capteurs(self):
+        rows = raw_rows(Capteur.objects.values_list('pk', 'type_capteur', 'district_id', 'statut'))
+        previous = dict(zip(getattr(self, 'ids', ()), self.seen))
+        self.ids = [r[0] for r in rows]
+        self.slots = {pk: i for i, pk in enumerate(self.ids)}
+        # One extra slot at the end (index -1) for sensors created since the last load
+        self.types = np.array([TYPES.index(r[1]) if r[1] in TYPES else -1 for r in rows] + [-1])
+        self.districts = np.array([-1 if r[2] is None else r[2] for r in rows] + [-1])
+        self.seen = np.array([previous.get(pk, np.nan) for pk in self.ids] + [np.nan])
+        self.statuts = {r[0]: r[3] for r in rows}
+        self.counts = {}
+        for _, type_capteur, district, statut in rows:
+            for key in ((district, type_capteur), (district, '')):
+                self.counts.setdefault(key, Counter())[statut] += 1
+        self.capteurs_loaded = time.monotonic()
+
+    def _slots(self, capteur_ids):
+        slots = np.fromiter((self.slots.get(c, -1) for c in capteur_ids), dtype=np.int64, count=len(capteur_ids))
+        if (slots < 0).any():
+            self.capteurs_loaded = None  # Reload at the next refresh()
+        return slots
+
+    def _scope_of(self, slot):
+        code, district = self.types[slot], self.districts[slot]
+        return (TYPES[code] if code >= 0 else ''), (None if district < 0 else int(district))
+
+    def _advance(self, t):
+        if len(t):
+            self.now = max(self.now, float(t.max()))
+            if self.debut is None:
+                self.debut = float(t.min())
+
+    # --- Notifications ---
+
+    def _due(self, regle, cible, t):
+        """Whether `regle` may notify about `cible` at t (throttling); records the notification."""
+        key = (regle.pk, cible)
+        if t - self.notifications.get(key, -np.inf) < regle.delai_minutes * 60:
+            return False
+        self.notifications[key] = t
+        return True
+
+    def _notify(self, regle, date, valeur, message, capteur=None, district=None):
+        self.pending.append(Alerte(
+            type_alerte='regle', regle_id=regle.pk, capteur_id=capteur, district_id=district,
+            date=date.to_pydatetime(), valeur=round(float(valeur), 3), score=round(float(valeur), 3),
+            message=f"{regle.nom}: {message}"[:200],
+        ))
+
+    def _flush(self):
+        alerts, self.pending = self.pending, []
+        return alerts
+
+    # --- Events ---
+
+    def process_readings(self, capteur_ids, polluants, dates, valeurs):
+        slots = self._slots(capteur_ids)
+        dates, t = timestamps(dates)
+        self._advance(t)
+        np.fmax.at(self.seen, slots, t)
+        if not self.index.thresholds:
+            return []
+        x = np.asarray(valeurs, dtype=float)
+        codes = np.array([POLLUANTS.index(p) for p in polluants], dtype=np.int64)
+        # Group the rows by (pollutant, sensor type, district): one index lookup per group
+        keys = (codes * (len(TYPES) + 1) + self.types[slots] + 1) * (self.districts.max() + 2) + self.districts[slots] + 1
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.r_[0, np.cumsum(np.bincount(inverse))]
+        for g, start in enumerate(first):
+            rows = order[bounds[g]:bounds[g + 1]]
+            polluant = POLLUANTS[codes[start]]
+            type_capteur, district = self._scope_of(slots[start])
+            indexes = [self.index.thresholds[(polluant,) + scope] for scope in _scopes(type_capteur, district)
+                       if (polluant,) + scope in self.index.thresholds]
+            # The group's values for each window length (0: the readings themselves)
+            values = {0: x[rows]}
+            for fenetre in {fenetre for by_op in indexes for fenetre, _ in by_op} - {0}:
+                means = np.empty(len(rows))
+                for j, row in enumerate(rows):
+                    window = self._window((capteur_ids[row], polluant, fenetre), fenetre)
+                    window.add(t[row], x[row])
+                    means[j] = window.mean
+                values[fenetre] = means
+            for by_op in indexes:
+                for (fenetre, op), (seuils, regles) in by_op.items():
+                    lo, hi = _matches(op, seuils, values[fenetre])
+                    for i in np.flatnonzero(hi > lo):
+                        row, valeur = rows[i], values[fenetre][i]
+                        for regle in regles[lo[i]:hi[i]]:
+                            if self._due(regle, capteur_ids[row], t[row]):
+                                label = f"moyenne {polluant} sur {fenetre} min" if fenetre else polluant
+                                self._notify(regle, dates[row], valeur, f"{label} = {valeur:.1f} {op} {regle.seuil:g}",
+                                             capteur=capteur_ids[row], district=district)
+        return self._flush()
+
+    def process_events(self, capteur_ids, dates, nouveaux_statuts):
+        slots = self._slots(capteur_ids)
+        dates, t = timestamps(dates)
+        self._advance(t)
+        np.fmax.at(self.seen, slots, t)
+        for i, (capteur, nouveau) in enumerate(zip(capteur_ids, nouveaux_statuts)):
+            ancien = self.statuts.get(capteur)
+            if ancien is None or ancien == nouveau:
+                continue  # Unknown sensor, or already counted
+            self.statuts[capteur] = nouveau
+            type_capteur, district = self._scope_of(slots[i])
+            for key in ((district, type_capteur), (district, '')):
+                counts = self.counts.setdefault(key, Counter())
+                counts[ancien] -= 1
+                counts[nouveau] += 1
+            for regle in self.index.rules('statut', type_capteur, district):
+                counts = self.counts.get((district, regle.type_capteur), {})
+                total = sum(counts.values())
+                share = 100 * counts.get(regle.statut, 0) / total if total else 0.0
+                episode = (regle.pk, district)
+                if not OPERATEURS[regle.operateur](share, regle.seuil):
+                    self.episodes.discard(episode)
+                elif episode not in self.episodes:
+                    self.episodes.add(episode)
+                    if self._due(regle, ('district', district), t[i]):
+                        self._notify(regle, dates[i], share, f"{share:.0f}% des capteurs {regle.statut}", district=district)
+        return self._flush()
+
+    def process_interventions(self, capteur_ids, dates, couts):
+        slots = self._slots(capteur_ids)
+        dates, t = timestamps(dates)
+        self._advance(t)
+        for i, capteur in enumerate(capteur_ids):
+            type_capteur, district = self._scope_of(slots[i])
+            cout = float(couts[i])
+            for regle in self.index.rules('intervention', type_capteur, district):
+                if regle.fenetre_minutes:
+                    window = self._window((regle.pk, district), regle.fenetre_minutes)
+                    window.add(t[i], cout)
+                    valeur, cible, message = window.total, ('district', district), f"{window.total:.2f} sur {regle.fenetre_minutes} min"
+                else:
+                    valeur, cible, message = cout, capteur, f"intervention de {cout:.2f}"
+                if OPERATEURS[regle.operateur](valeur, regle.seuil) and self._due(regle, cible, t[i]):
+                    self._notify(regle, dates[i], valeur, message, capteur=capteur, district=district)
+        return self._flush()
+
+    def _window(self, key, fenetre_minutes):
+        window = self.windows.get(key)
+        if window is None or window.seconds != fenetre_minutes * 60:
+            window = self.windows[key] = SlidingWindow(fenetre_minutes * 60)
+        return window
+
+    # --- Time-driven rules ---
+
+    def sweep(self):
+        """
+        Raises the 'silence' alerts of the sensors whose deadline passed since the last
+        sweep (sensors never heard from count from the first event seen).
+        """
+        if self.debut is None or self.now <= self.last_sweep:
+            return []
+        seen = np.where(np.isnan(self.seen[:-1]), self.debut, self.seen[:-1])
+        date = pd.Timestamp(int(self.now * 1e6), unit='us', tz='UTC')
+        for (type_capteur, district), regles in self.index.silence.items():
+            mask = np.ones(len(seen), dtype=bool)
+            if type_capteur:
+                mask &= self.types[:-1] == TYPES.index(type_capteur)
+            if district is not None:
+                mask &= self.districts[:-1] == district
+            for regle in regles:
+                window = regle.fenetre_minutes * 60
+                for i in np.flatnonzero(mask & (seen < self.now - window) & (seen >= self.last_sweep - window)):
+                    if self._due(regle, self.ids[i], self.now):
+                        minutes = (self.now - seen[i]) / 60
+                        self._notify(regle, date, minutes, f"silencieux depuis {minutes:.0f} min",
+                                     capteur=self.ids[i], district=self._scope_of(i)[1])
+        self.last_sweep = self.now
+        if self.now - self.last_prune > PRUNE_INTERVAL:
+            self._prune()
+        return self._flush()
+
+    def _prune(self):
+        """Drops the throttling entries and windows that can no longer matter."""
+        horizon = self.now - self.index.delai_max
+        self.notifications = {k: t for k, t in self.notifications.items() if t >= horizon}
+        self.windows = {k: w for k, w in self.windows.items() if w.items and w.items[-1][0] > self.now - w.seconds}
+        self.last_prune = self.now
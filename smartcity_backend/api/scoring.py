@@ -0,0 +1,82 @@
+"""
+Citizen eco-score pipeline.
+
+score_ecologique = mobility points (from preferences_mobilite) + PARTICIPATION_BONUS per
+consultation the citizen took part in. Writes that can change a score (Citoyen.save(),
+Participation.save()/delete()) set Citoyen.score_perime; compute_scores() recomputes
+the flagged citizens (or everyone with full=True) in one vectorized pass and writes
+back only the scores that changed, one UPDATE per (score, chunk of ids).
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Count
+
+from . import caching
+from .dbutils import chunks
+from .models import Citoyen, Participation
+
+MOBILITY_SCORES = {
+    'Marche': 15,
+    'Vélo': 10,
+    'Transports en commun': 5,
+    'Véhicule électrique': 5,
+    'Voiture Thermique': 0,
+}
+PARTICIPATION_BONUS = 20
+
+# Keywords looked for in the (free text or JSON) preferences, accents and case ignored.
+# A citizen listing several modes gets the best one.
+MOBILITY_KEYWORDS = {
+    'marche': 15, 'pied': 15,
+    'velo': 10, 'trottinette': 10,
+    'transports en commun': 5, 'bus': 5, 'metro': 5, 'tram': 5, 'train': 5, 'louage': 5,
+    'electrique': 5, 'covoiturage': 5,
+}
+
+
+def _normalize(text):
+    return text.fillna('').str.lower().str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+
+
+def mobility_points(preferences):
+    """Points per citizen for a Series of preferences_mobilite texts."""
+    text = _normalize(preferences)
+    points = np.zeros(len(text), dtype=np.int64)
+    for keyword, value in MOBILITY_KEYWORDS.items():
+        points = np.where(text.str.contains(keyword, regex=False).to_numpy(), np.maximum(points, value), points)
+    return points
+
+
+def compute_scores(full=False):
+    """Recomputes the flagged citizens (everyone with full=True). Returns a summary."""
+    t0 = time.perf_counter()
+    citoyens = Citoyen.objects.all() if full else Citoyen.objects.filter(score_perime=True)
+    participations = Participation.objects.all() if full else Participation.objects.filter(citoyen__score_perime=True)
+
+    with transaction.atomic():
+        frame = pd.DataFrame.from_records(
+            citoyens.values_list('pk', 'preferences_mobilite', 'score_ecologique').iterator(chunk_size=10000),
+            columns=['pk', 'preferences', 'score'],
+        )
+        if frame.empty:
+            return {'citoyens': 0, 'modifies': 0, 'duree_s': round(time.perf_counter() - t0, 2)}
+
+        counts = pd.Series(dict(
+            participations.values('citoyen').annotate(n=Count('consultation', distinct=True)).values_list('citoyen', 'n')
+        ), dtype='int64')
+        frame['participations'] = frame['pk'].map(counts).fillna(0).astype('int64')
+        frame['nouveau'] = mobility_points(frame['preferences']) + frame['participations'] * PARTICIPATION_BONUS
+
+        changed = frame[frame['nouveau'] != frame['score']]
+        for score, group in changed.groupby('nouveau'):
+            for ids in chunks(group['pk'].tolist()):
+                Citoyen.objects.filter(pk__in=ids).update(score_ecologique=int(score), score_perime=False)
+        for ids in chunks(frame.loc[frame['nouveau'] == frame['score'], 'pk'].tolist()):
+            Citoyen.objects.filter(pk__in=ids, score_perime=True).update(score_perime=False)
+
+    # queryset.update() sends no signal: invalidate the cached reads and the leaderboard
+    caching.bump(Citoyen)
+    return {'citoyens': len(frame), 'modifies': len(changed), 'duree_s': round(time.perf_counter() - t0, 2)}
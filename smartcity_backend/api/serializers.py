@@ -2,9 +2,14 @@ from rest_framework import serializers
 from .models import (
     Proprietaire, Capteur, Technicien, Intervention, 
     Citoyen, Consultation, VehiculeAutonome, Trajet,
-    InterventionTechnicien, Participation
+    InterventionTechnicien, Participation, District, Job, Alerte, RegleAlerte, RapportProprietaire
 )
 
+class DistrictSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = District
+        fields = '__all__'
+
 class ProprietaireSerializer(serializers.ModelSerializer):
     class Meta:
         model = Proprietaire
@@ -31,11 +36,18 @@ class CitoyenSerializer(serializers.ModelSerializer):
     class Meta:
         model = Citoyen
         fields = '__all__'
+        read_only_fields = ['score_perime']
 
 class ConsultationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Consultation
         fields = '__all__'
+        read_only_fields = ['nb_participants']
+
+class ParticipationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Participation
+        fields = '__all__'
 
 class VehiculeAutonomeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -46,3 +58,67 @@ class TrajetSerializer(serializers.ModelSerializer):
     class Meta:
         model = Trajet
         fields = '__all__'
+        extra_kwargs = {'duree': {'required': False}}
+
+    def validate(self, attrs):
+        # duree is derived by Trajet.sync_duree() when both timestamps are given
+        depart = attrs.get('date_depart', getattr(self.instance, 'date_depart', None))
+        arrivee = attrs.get('date_arrivee', getattr(self.instance, 'date_arrivee', None))
+        if depart and arrivee and arrivee < depart:
+            raise serializers.ValidationError({'date_arrivee': "Doit être postérieure à date_depart."})
+        if self.instance is None and attrs.get('duree') is None and not (depart and arrivee):
+            raise serializers.ValidationError({'duree': "Requis sans date_depart et date_arrivee."})
+        return attrs
+
+class AlerteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Alerte
+        fields = '__all__'
+        read_only_fields = ['capteur', 'district', 'regle', 'type_alerte', 'polluant', 'date', 'valeur', 'score', 'message']
+
+class RegleAlerteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RegleAlerte
+        fields = '__all__'
+
+    def validate(self, attrs):
+        # Each rule type needs its own fields (see rules.py)
+        def value(name):
+            return attrs.get(name, getattr(self.instance, name, None))
+        type_regle = value('type_regle')
+        if type_regle == 'mesure' and not value('polluant'):
+            raise serializers.ValidationError({'polluant': "Requis pour une règle de mesure."})
+        if type_regle == 'statut':
+            if not value('statut'):
+                raise serializers.ValidationError({'statut': "Requis pour une règle de statut."})
+            if not 0 <= (value('seuil') or 0) <= 100:
+                raise serializers.ValidationError({'seuil': "Pourcentage entre 0 et 100 attendu."})
+        if type_regle == 'silence' and not value('fenetre_minutes'):
+            raise serializers.ValidationError({'fenetre_minutes': "Durée de silence requise."})
+        return attrs
+
+class RapportProprietaireSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RapportProprietaire
+        fields = '__all__'
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = '__all__'
+        read_only_fields = [
+            'statut', 'progression', 'message', 'resultat', 'erreur', 'annulation_demandee',
+            'worker', 'date_debut', 'date_fin', 'date_maj',
+        ]
+
+    def validate(self, attrs):
+        from .jobs import COMMAND_ONLY, PARAMETRES
+        if attrs['type_job'] in COMMAND_ONLY:
+            raise serializers.ValidationError({'type_job': "Ce type de job ne peut être lancé que par sa commande de gestion."})
+        parametres = attrs.get('parametres') or {}
+        if not isinstance(parametres, dict):
+            raise serializers.ValidationError({'parametres': "Objet JSON attendu."})
+        unknown = set(parametres) - PARAMETRES.get(attrs['type_job'], frozenset())
+        if unknown:
+            raise serializers.ValidationError({'parametres': f"Paramètres inconnus: {', '.join(sorted(unknown))}."})
+        return attrs
@@ -0,0 +1,306 @@
+"""
+City simulation.
+
+- run_step(): the real-time 'time step' behind POST /api/simulate/ (one step, wall
+  clock). Its writes are batched per table: one step changes ~20% of the sensors.
+- run_batch(): the accelerated simulation behind POST /api/simulate/run/. It advances
+  the simulated clock (HorlogeSimulation) by `steps` steps of `dt` minutes in one
+  pass: sensor statuses follow a Markov chain evaluated with NumPy for every sensor
+  at once, and the resulting status events, interventions and trajets (plus the
+  pollutant readings of the last 24 h) are written with bulk_create, timestamped on
+  the simulated clock.
+"""
+import math
+import random
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from . import aqi, caching, fleet
+from .dbutils import chunks
+from .districts import registry
+from .models import (
+    Capteur, EvenementStatut, HorlogeSimulation, Intervention, Mesure, Trajet, VehiculeAutonome
+)
+
+# Transition rates of the sensor status chain, per simulated hour
+TAUX_PANNE = 1 / 720            # actif -> hors_service: about once a month
+TAUX_PREDICTIF = 1 / 2160       # actif -> en_maintenance (predictive intervention): every ~3 months
+TAUX_INTERVENTION = 1 / 6       # hors_service -> en_maintenance (corrective intervention): ~6 h to dispatch
+TAUX_REPARATION = 1 / 3         # en_maintenance -> actif: ~3 h of work
+VOLATILITE_CENTRE = 1.5         # Sousse Ville breaks down more often
+TRAJETS_PAR_VEHICULE_HEURE = 0.25
+HISTORIQUE_MESURES = timedelta(hours=24)  # Pollutant readings are only written for the end of a batch run
+BATCH_SIZE = 5000
+
+STATUTS = ('actif', 'en_maintenance', 'hors_service')
+ACTIF, MAINTENANCE, HORS_SERVICE = range(3)
+
+
+def run_step():
+    """
+    One 'Time Step' with HIGH INTENSITY.
+    1. Updates ~10-15% of all sensors (Chaos & Repairs).
+    2. Generates Heavy Traffic (10-25 Trips).
+    3. Dispatches Repairs aggressively.
+    4. Records pollutant readings for the air-quality sensors.
+    5. Advances every vehicle one tick along its current trip.
+    """
+    summary = {'capteurs': 0, 'trajets': 0, 'interventions': 0}
+
+    # 1. Update Sensors (Global Flux)
+    sensors = Capteur.objects.values_list('pk', 'statut', 'quartier')
+    changes = []
+    for pk, old, quartier in sensors:
+        # 20% chance to change status per sensor (Higher Chaos)
+        if random.random() < 0.20:
+            # Smart Weighting: Make it truly random/dynamic
+            if quartier == 'Sousse Ville':
+                # Volatile Center
+                new_s = random.choices(['actif', 'en_maintenance', 'hors_service'], weights=[0.5, 0.25, 0.25])[0]
+            else:
+                new_s = random.choices(['actif', 'en_maintenance', 'hors_service'], weights=[0.6, 0.2, 0.2])[0]
+
+            if old != new_s:
+                changes.append((pk, old, new_s))
+    _write_statuts(changes)
+    summary['capteurs'] = len(changes)
+
+    # 2. Generate Heavy Traffic
+    vehicles = list(VehiculeAutonome.objects.all())
+    if vehicles:
+        for _ in range(random.randint(10, 25)): # 10 to 25 trips
+            v = random.choice(vehicles)
+            q_start = random.choice(registry().names)
+            q_end = random.choice(registry().names)
+
+            Trajet.objects.create(
+                vehicule=v, origine=f"Simulated ({q_start})", destination=f"Simulated ({q_end})",
+                date_depart=timezone.now(), duree=random.randint(10, 60),
+                economie_co2=round(random.uniform(0.5, 5.0), 2)
+            )
+            summary['trajets'] += 1
+
+    # 3. Auto-Intervention (Aggressive), written in one batch: the cost cube merges them once
+    broken_sensors = Capteur.objects.filter(statut='hors_service').values_list('pk', flat=True)
+    dispatched, changes = [], []
+    for pk in broken_sensors:
+        if random.random() < 0.4: # 40% chance to dispatch fix
+            dispatched.append(Intervention(
+                capteur_id=pk, date_heure=timezone.now(), type_intervention='corrective',
+                duree=random.randint(60, 180), cout=random.uniform(200, 500), impact_co2=5.5
+            ))
+            changes.append((pk, 'hors_service', 'en_maintenance'))
+    _write_statuts(changes)
+    Intervention.objects.bulk_create(dispatched)
+    caching.bump(Intervention)  # bulk_create sends no post_save
+    summary['interventions'] = len(dispatched)
+
+    # 4. One pollutant reading per active air-quality sensor
+    readings = aqi.simulated_readings(aqi.air_sensors(), timezone.now())
+    Mesure.objects.bulk_create(readings, batch_size=BATCH_SIZE)
+    caching.bump(Mesure)
+    summary['mesures'] = len(readings)
+
+    # 5. Move the fleet along its trajets
+    fleet.advance_fleet()
+    return summary
+
+
+def _write_statuts(changes):
+    """
+    Writes (capteur id, old status, new status) changes, one UPDATE per new status, with
+    their status history (see anomalies.py).
+    """
+    if not changes:
+        return
+    now = timezone.now()
+    by_statut = {}
+    for pk, _, nouveau in changes:
+        by_statut.setdefault(nouveau, []).append(pk)
+    with transaction.atomic():
+        for statut, ids in by_statut.items():
+            for chunk in chunks(ids):
+                Capteur.objects.filter(pk__in=chunk).update(statut=statut)
+        EvenementStatut.objects.bulk_create([
+            EvenementStatut(capteur_id=pk, date=now, ancien_statut=ancien, nouveau_statut=nouveau)
+            for pk, ancien, nouveau in changes
+        ], batch_size=BATCH_SIZE)
+    caching.bump(Capteur, EvenementStatut)  # bulk writes send no post_save
+
+
+DT_UNITS = {'m': 1, 'h': 60, 'd': 1440}
+
+
+def parse_dt(value):
+    """Step length in minutes from '15m', '1h', '1d' or a plain number of minutes."""
+    text = str(value).strip().lower()
+    factor = DT_UNITS.get(text[-1:], None)
+    number = text[:-1] if factor else text
+    try:
+        minutes = float(number) * (factor or 1)
+    except ValueError:
+        raise ValueError(f"Pas de temps invalide : {value!r} (ex. 15m, 1h, 1d)")
+    if not 1 <= minutes <= 7 * 1440:
+        raise ValueError("Le pas de temps doit être compris entre 1 minute et 7 jours.")
+    return int(minutes)
+
+
+def _probability(rate_per_hour, dt_hours):
+    # Chance that a transition with this rate fires during one step
+    return 1.0 - math.exp(-rate_per_hour * dt_hours)
+
+
+class _BulkWriter:
+    """Buffers unsaved rows per model and flushes them with bulk_create."""
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, model, rows):
+        buffer = self.buffers.setdefault(model, [])
+        buffer.extend(rows)
+        if len(buffer) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for m in ([model] if model else list(self.buffers)):
+            rows = self.buffers.get(m)
+            if rows:
+                m.objects.bulk_create(rows, batch_size=self.batch_size)
+                self.counts[m] = self.counts.get(m, 0) + len(rows)
+                rows.clear()
+
+
+def run_batch(steps, dt_minutes=60, start=None, seed=None, progress=None):
+    """
+    Advances the simulated clock by steps x dt_minutes. Returns a summary of what was written.
+
+    `start` moves the clock first (e.g. a year back, to produce history up to now).
+    `progress(fraction, message)` is called every few percent (see jobs.py).
+    """
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    dt = timedelta(minutes=dt_minutes)
+    dt_hours = dt_minutes / 60.0
+    horloge = HorlogeSimulation.courante()
+    if start is not None:
+        horloge.instant = start
+    debut = horloge.instant
+
+    # Sensors as arrays: one row per sensor, statuses as codes
+    rows = list(Capteur.objects.order_by('pk').values_list('pk', 'statut', 'district_id', 'type_capteur'))
+    ids = [r[0] for r in rows]
+    codes = {s: i for i, s in enumerate(STATUTS)}
+    state = np.array([codes.get(r[1], ACTIF) for r in rows], dtype=np.int8)
+    initial = state.copy()
+    centre = registry().by_name.get('Sousse Ville')
+    volatility = np.array([VOLATILITE_CENTRE if centre and r[2] == centre.id else 1.0 for r in rows])
+
+    p_panne = 1.0 - np.exp(-TAUX_PANNE * volatility * dt_hours)
+    p_predictif = _probability(TAUX_PREDICTIF, dt_hours)
+    p_intervention = _probability(TAUX_INTERVENTION, dt_hours)
+    p_reparation = _probability(TAUX_REPARATION, dt_hours)
+
+    vehicles = list(VehiculeAutonome.objects.values_list('pk', flat=True))
+    districts = registry().districts
+    trips_per_step = len(vehicles) * TRAJETS_PAR_VEHICULE_HEURE * dt_hours
+    is_air = np.array([r[3] == 'qualité_air' for r in rows], dtype=bool)
+    mesures_from = debut + dt * steps - HISTORIQUE_MESURES
+
+    writer = _BulkWriter()
+    report_every = max(steps // 50, 1)
+    with transaction.atomic(), caching.invalidation_paused(Capteur, EvenementStatut, Intervention, Mesure, Trajet):
+        for step in range(steps):
+            now = debut + dt * step
+            if progress and step % report_every == 0:
+                progress(step / steps, f"Pas {step}/{steps} ({now:%Y-%m-%d %H:%M})")
+
+            # 1. Sensor status chain, all sensors at once
+            u = rng.random(len(state))
+            panne = (state == ACTIF) & (u < p_panne)
+            predictif = (state == ACTIF) & ~panne & (u < p_panne + p_predictif)
+            corrective = (state == HORS_SERVICE) & (u < p_intervention)
+            reparation = (state == MAINTENANCE) & (u < p_reparation)
+            changed = np.flatnonzero(panne | predictif | corrective | reparation)
+            if changed.size:
+                new_state = state.copy()
+                new_state[panne] = HORS_SERVICE
+                new_state[predictif | corrective] = MAINTENANCE
+                new_state[reparation] = ACTIF
+                offsets = rng.random(changed.size) * dt_minutes
+                dates = [now + timedelta(minutes=float(o)) for o in offsets]
+                writer.add(EvenementStatut, [
+                    EvenementStatut(capteur_id=ids[i], date=d, ancien_statut=STATUTS[state[i]], nouveau_statut=STATUTS[new_state[i]])
+                    for i, d in zip(changed.tolist(), dates)
+                ])
+
+                # 2. Interventions for the sensors entering maintenance
+                entering = np.flatnonzero((predictif | corrective)[changed])
+                if entering.size:
+                    kinds = np.where(predictif[changed[entering]], 'prédictive', 'corrective')
+                    durees = rng.integers(60, 181, entering.size)
+                    couts = np.where(kinds == 'prédictive', rng.uniform(100, 300, entering.size), rng.uniform(200, 500, entering.size))
+                    writer.add(Intervention, [
+                        Intervention(capteur_id=ids[changed[k]], date_heure=dates[k], type_intervention=kind,
+                                     duree=int(duree), cout=round(float(cout), 2), impact_co2=5.5)
+                        for k, kind, duree, cout in zip(entering.tolist(), kinds.tolist(), durees, couts)
+                    ])
+                state = new_state
+
+            # 3. Trajets departing during this step
+            n_trips = int(rng.poisson(trips_per_step)) if vehicles and districts else 0
+            if n_trips:
+                vehicule = rng.integers(0, len(vehicles), n_trips)
+                origine = rng.integers(0, len(districts), n_trips)
+                destination = rng.integers(0, len(districts), n_trips)
+                depart = rng.random(n_trips) * dt_minutes
+                duree = rng.integers(10, 61, n_trips)
+                co2 = np.round(rng.uniform(0.5, 5.0, n_trips), 2)
+                trips = []
+                for v, o, d, dep, du, c in zip(vehicule.tolist(), origine.tolist(), destination.tolist(), depart, duree.tolist(), co2):
+                    date_depart = now + timedelta(minutes=float(dep))
+                    trips.append(Trajet(
+                        vehicule_id=vehicles[v], origine=f"Simulated ({districts[o].nom})",
+                        destination=f"Simulated ({districts[d].nom})",
+                        district_origine_id=districts[o].id, district_destination_id=districts[d].id,
+                        date_depart=date_depart, date_arrivee=date_depart + timedelta(minutes=du),
+                        duree=du, economie_co2=float(c),
+                    ))
+                writer.add(Trajet, trips)
+
+            # 4. Pollutant readings of the active air-quality sensors, for the end of the run
+            if now >= mesures_from:
+                sensors = [(ids[i], rows[i][2]) for i in np.flatnonzero(is_air & (state == ACTIF)).tolist()]
+                writer.add(Mesure, aqi.simulated_readings(sensors, now + dt, rng))
+        writer.flush()
+
+        # 5. Final sensor statuses, one bulk update for the sensors that changed
+        moved = np.flatnonzero(state != initial)
+        if moved.size:
+            capteurs = [Capteur(pk=ids[i], statut=STATUTS[state[i]]) for i in moved.tolist()]
+            Capteur.objects.bulk_update(capteurs, ['statut'], batch_size=BATCH_SIZE)
+
+        horloge.instant = debut + dt * steps
+        horloge.save()
+
+    # 6. Bring the fleet up to the new clock
+    fleet.advance_fleet(ticks=max(int(steps * dt_minutes // fleet.TICK_MINUTES), 1))
+
+    return {
+        'debut': debut.isoformat(),
+        'fin': horloge.instant.isoformat(),
+        'steps': steps,
+        'dt_minutes': dt_minutes,
+        'evenements': writer.counts.get(EvenementStatut, 0),
+        'interventions': writer.counts.get(Intervention, 0),
+        'trajets': writer.counts.get(Trajet, 0),
+        'mesures': writer.counts.get(Mesure, 0),
+        'capteurs_modifies': int(moved.size),
+        'duree_s': round(time.perf_counter() - t0, 2),
+    }
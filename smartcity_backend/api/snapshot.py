@@ -0,0 +1,180 @@
+"""
+Dashboard snapshot: everything one dashboard refresh needs, in a single response.
+
+build_snapshot() runs the aggregations in the database and returns only the
+projected datasets each fragment renders (KPIs, district status matrix, top
+citizens, top trips, map points...). It is cached under a key versioned on every
+model it reads (see caching.py), so any write to one of them invalidates it;
+SNAPSHOT_TTL bounds the staleness left by writers in other processes when the cache
+is not shared.
+"""
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import aqi, caching, cube, fleet
+from .leaderboard import LEADERBOARD
+from .districts import registry
+from .models import (
+    Capteur, Citoyen, CubeIntervention, District, Intervention, Mesure, PositionVehicule, Trajet, TrajetJournalier,
+    VehiculeAutonome,
+)
+
+SNAPSHOT_TTL = 30  # Seconds
+STATUTS = [s for s, _ in Capteur.STATUT_CHOICES]
+TOP_CITOYENS = 10
+TOP_TRAJETS = 5
+
+WATCHED_MODELS = (Capteur, Intervention, CubeIntervention, Citoyen, Trajet, TrajetJournalier, VehiculeAutonome, PositionVehicule,
+                  District, Mesure)
+
+
+def get_snapshot():
+    """Snapshot for the current data versions, recomputed by a single caller on a miss."""
+    key = caching.versioned_key('dashboard:snapshot', WATCHED_MODELS)
+    return caching.get_or_compute(key, lambda: dict(build_snapshot(), version=key.rsplit(':', 1)[-1]), SNAPSHOT_TTL)
+
+
+def _district_name(district_id):
+    info = registry().by_id.get(district_id)
+    return info.nom if info else 'Inconnu'
+
+
+def kpis():
+    capteurs = Capteur.objects.aggregate(total=Count('pk'), actifs=Count('pk', filter=Q(statut='actif')))
+    return {
+        'capteurs_actifs': capteurs['actifs'],
+        'capteurs_total': capteurs['total'],
+        'cout_maintenance': cube.query()['total']['cout'],
+        'score_ecologique_moyen': round(Citoyen.objects.aggregate(a=Avg('score_ecologique'))['a'] or 0, 2),
+        'economie_co2': float((Trajet.objects.aggregate(s=Sum('economie_co2'))['s'] or 0)
+                              + (TrajetJournalier.objects.aggregate(s=Sum('economie_co2'))['s'] or 0)),
+    }
+
+
+def zones():
+    """Sensor count per district and status, worst failure rate first."""
+    rows = Capteur.objects.values('district').annotate(
+        total=Count('pk'), **{s: Count('pk', filter=Q(statut=s)) for s in STATUTS}
+    )
+    matrix = []
+    for r in rows:
+        row = {'quartier': _district_name(r['district']), 'total': r['total']}
+        row.update({s: r[s] for s in STATUTS})
+        row['taux_panne'] = round((r['total'] - r['actif']) / r['total'], 4) if r['total'] else 0.0
+        matrix.append(row)
+    return sorted(matrix, key=lambda r: (-r['taux_panne'], r['quartier']))
+
+
+def qualite_air():
+    """AQI per district from the latest pollutant readings (see aqi.py), worst first."""
+    return [{'quartier': r['quartier'], 'aqi': r['aqi'], 'dominant': r['dominant']} for r in aqi.indices_quartiers()['quartiers']]
+
+
+def interventions():
+    # Daily cells of the maintenance cube rather than a scan of the Intervention table
+    daily = cube.query(group_by=('jour',), filters={'type_intervention': ['prédictive']})
+    return {
+        'predictives': daily['total']['nombre'],
+        'cout_predictif': daily['total']['cout'],
+        'cout_journalier': [{'date': r['jour'], 'cout': r['cout']} for r in daily['lignes']],
+    }
+
+
+def top_citoyens(limit=TOP_CITOYENS):
+    """Best eco scores with their leaderboard rank, one row per name (homonyms keep their best score)."""
+    rows = Citoyen.objects.order_by('-score_ecologique', 'pk').values(
+        'nom', 'email', 'preferences_mobilite', 'score_ecologique'
+    )
+    top, seen = [], set()
+    for row in rows.iterator(chunk_size=200):
+        if row['nom'] in seen:
+            continue
+        seen.add(row['nom'])
+        row['rang'] = LEADERBOARD.rank_of_score(row['score_ecologique'])
+        top.append(row)
+        if len(top) == limit:
+            break
+    return top
+
+
+def top_trajets(limit=TOP_TRAJETS):
+    """Biggest CO2 savings, with their endpoints already resolved to coordinates."""
+    rows = Trajet.objects.order_by('-economie_co2', 'pk').values(
+        'origine', 'destination', 'duree', 'economie_co2', 'district_origine', 'district_destination'
+    )[:limit]
+    trajets = []
+    for r in rows:
+        trajets.append({
+            'origine': r['origine'],
+            'destination': r['destination'],
+            'duree': r['duree'],
+            'economie_co2': float(r['economie_co2']),
+            'depart': fleet.resolve_place(r['origine'], r['district_origine']),
+            'arrivee': fleet.resolve_place(r['destination'], r['district_destination']),
+        })
+    return trajets
+
+
+def trajets_journaliers(queryset, archives=None):
+    """
+    Daily CO2 savings and fleet utilization of the given trajets, plus the daily totals
+    of the archived ones (a TrajetJournalier queryset, see retention.py).
+    """
+    rows = list(
+        queryset.filter(date_depart__isnull=False)
+        .annotate(jour=TruncDate('date_depart')).values('jour')
+        .annotate(trajets=Count('pk'), economie_co2=Sum('economie_co2'),
+                  minutes=Sum('duree'), vehicules=Count('vehicule', distinct=True))
+        .order_by('jour')
+    )
+    if archives is not None:
+        # A day is archived whole, but trips written late may still be in the table
+        rows += archives.values('jour').annotate(trajets=Sum('trajets'), economie_co2=Sum('economie_co2'),
+                                                 minutes=Sum('minutes'), vehicules=Count('vehicule')).order_by()
+    days = {}
+    for r in rows:
+        day = days.setdefault(r['jour'], {'trajets': 0, 'economie_co2': 0, 'minutes': 0, 'vehicules': 0})
+        for field in day:
+            day[field] += r[field] or 0
+    fleet_minutes = max(VehiculeAutonome.objects.count(), 1) * 24 * 60
+    return [
+        {
+            "jour": jour.isoformat(),
+            "trajets": r['trajets'],
+            "economie_co2": float(r['economie_co2']),
+            "vehicules_actifs": r['vehicules'],
+            "utilisation": round(r['minutes'] / fleet_minutes, 4),
+        }
+        for jour, r in sorted(days.items())
+    ]
+
+
+def capteur_points():
+    """Column-oriented sensor markers for the map."""
+    rows = Capteur.objects.order_by('pk').values_list('id_capteur', 'latitude', 'longitude', 'type_capteur', 'statut')
+    ids, lat, lon, types, statuts = [], [], [], [], []
+    for id_capteur, la, lo, type_capteur, statut in rows.iterator(chunk_size=2000):
+        ids.append(str(id_capteur))
+        lat.append(float(la))
+        lon.append(float(lo))
+        types.append(type_capteur)
+        statuts.append(statut)
+    return {'id': ids, 'lat': lat, 'lon': lon, 'type': types, 'statut': statuts}
+
+
+def build_snapshot():
+    return {
+        'genere_le': timezone.now().isoformat(),
+        'kpis': kpis(),
+        'zones': zones(),
+        'qualite_air': qualite_air(),
+        'interventions': interventions(),
+        'top_citoyens': top_citoyens(),
+        'top_trajets': top_trajets(),
+        'journalier': trajets_journaliers(Trajet.objects.all(), TrajetJournalier.objects.all()),
+        'carte': {
+            'capteurs': capteur_points(),
+            'vehicules': fleet.positions_payload(),
+        },
+    }
@@ -1,3 +1,1276 @@
+import glob
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+import contextvars
+import gzip
+import io
+import json
+import unittest
+import uuid
+from unittest import mock
+from unittest.mock import ANY
+
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Max, Min
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+import dashboard_client
+import dashboard_metrics
+from smartcity_backend.instrumentation import METRICS
+
+from . import (
+    anomalies, aqi, bench, caching, cube, fleet, gazetteer, heatmap, imports, jobs, participations, renderers, reports, retention,
+    rules, scoring, simulation, snapshot,
+)
+from .districts import points_in_polygon, registry, reload_registry
+from .leaderboard import LEADERBOARD, FenwickTree
+from .models import (
+    Alerte, Capteur, Citoyen, Consultation, CubeIntervention, District, EvenementStatut, HorlogeSimulation, Intervention,
+    InterventionTechnicien, Job, Mesure, Participation, PositionVehicule, Proprietaire, RapportProprietaire, RegleAlerte,
+    RepriseImport, Technicien, Trajet, VehiculeAutonome,
+)
+
+
+class FleetTests(TestCase):
+    def setUp(self):
+        self.vehicule = VehiculeAutonome.objects.create(
+            plaque_immatriculation="245 TU 1234", type_vehicule="Navette", energie_utilisee="Électrique"
+        )
+
+    def test_resolve_place_is_deterministic(self):
+        self.assertEqual(fleet.resolve_place("Simulated (Msaken)"), (35.730, 10.580))
+        self.assertEqual(fleet.resolve_place("12 Rue X, Hammam Sousse"), (35.860, 10.590))
+        self.assertEqual(fleet.resolve_place("Nowhere"), fleet.resolve_place("Nowhere"))
+
+    def test_vehicle_without_trip_stays_parked(self):
+        fleet.advance_fleet()
+        pos = PositionVehicule.objects.get(vehicule=self.vehicule)
+        self.assertIsNone(pos.trajet)
+        self.assertEqual((pos.latitude, pos.longitude), fleet.parking_position("245 TU 1234"))
+
+    def test_vehicle_advances_along_trip(self):
+        trajet = Trajet.objects.create(
+            vehicule=self.vehicule, origine="Simulated (Msaken)", destination="Simulated (Sousse Ville)",
+            duree=20, economie_co2=1.5,
+        )
+        fleet.advance_fleet()  # picks up the trip at its origin
+        fleet.advance_fleet()  # 5 of 20 minutes
+        pos = PositionVehicule.objects.get(vehicule=self.vehicule)
+        self.assertEqual(pos.trajet_id, trajet.pk)
+        self.assertAlmostEqual(pos.progression, 0.25)
+        self.assertAlmostEqual(pos.latitude, 35.730 + (35.825 - 35.730) * 0.25)
+        self.assertEqual(pos.tick, 2)
+
+    def test_finished_vehicle_takes_its_next_trip_in_turn(self):
+        depart = timezone.make_aware(datetime(2026, 3, 1, 8, 0))
+        tard = Trajet.objects.create(vehicule=self.vehicule, origine="A", destination="B", duree=5, economie_co2=1,
+                                     date_depart=depart + timedelta(hours=2))
+        tot = Trajet.objects.create(vehicule=self.vehicule, origine="A", destination="B", duree=5, economie_co2=1,
+                                    date_depart=depart)
+        sans_date = Trajet.objects.create(vehicule=self.vehicule, origine="A", destination="B", duree=5, economie_co2=1)
+        seen = []
+        for _ in range(4):
+            fleet.advance_fleet()  # Each 5-minute trip ends on the next tick
+            seen.append(PositionVehicule.objects.get(vehicule=self.vehicule).trajet_id)
+        self.assertEqual(seen, [sans_date.pk, tot.pk, tard.pk, sans_date.pk])
+
+    def test_positions_endpoint_is_columnar(self):
+        response = self.client.get(reverse('vehiculeautonome-positions'))
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(payload["plaques"], ["245 TU 1234"])
+        self.assertEqual(len(payload["lat"]), 1)
+        self.assertEqual(len(payload["lon"]), 1)
+
+
+class TrajetTimeRangeTests(TestCase):
+    def setUp(self):
+        self.v1 = VehiculeAutonome.objects.create(plaque_immatriculation="240 TU 1", type_vehicule="Bus", energie_utilisee="Électrique")
+        self.v2 = VehiculeAutonome.objects.create(plaque_immatriculation="240 TU 2", type_vehicule="Bus", energie_utilisee="Électrique")
+        base = timezone.make_aware(datetime(2026, 3, 1, 8, 0))
+        for day in range(3):
+            for v in (self.v1, self.v2):
+                Trajet.objects.create(
+                    vehicule=v, origine="A", destination="B", economie_co2=2,
+                    date_depart=base + timedelta(days=day), date_arrivee=base + timedelta(days=day, minutes=30),
+                )
+
+    def test_duree_is_derived_from_timestamps(self):
+        self.assertEqual(set(Trajet.objects.values_list('duree', flat=True)), {30})
+        t = Trajet.objects.create(vehicule=self.v1, origine="A", destination="B", economie_co2=1,
+                                  date_depart=timezone.now(), duree=12)
+        self.assertEqual(t.date_arrivee - t.date_depart, timedelta(minutes=12))
+
+    def test_range_and_vehicle_filters(self):
+        url = reverse('trajet-list')
+        self.assertEqual(len(self.client.get(url, {'from': '2026-03-02', 'to': '2026-03-02'}).json()), 2)
+        response = self.client.get(url, {'from': '2026-03-01', 'vehicule': str(self.v1.pk)})
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(self.client.get(url, {'from': 'hier'}).status_code, 400)
+
+    def test_daily_rollup(self):
+        rows = self.client.get(reverse('trajet-journalier'), {'to': '2026-03-02'}).json()
+        self.assertEqual([r['jour'] for r in rows], ['2026-03-01', '2026-03-02'])
+        self.assertEqual(rows[0]['trajets'], 2)
+        self.assertEqual(rows[0]['economie_co2'], 4.0)
+        self.assertEqual(rows[0]['vehicules_actifs'], 2)
+
+
+class GazetteerTests(TestCase):
+    def setUp(self):
+        gazetteer.clear_cache()
+        self.ids = dict(District.objects.values_list('nom', 'pk'))
+
+    def test_aho_corasick_finds_all_matches(self):
+        automaton = gazetteer.AhoCorasick({"he": 1, "she": 2, "hers": 3})
+        found = sorted((end, value) for end, _, value in automaton.iter_matches("ushers"))
+        self.assertEqual(found, [(3, 1), (3, 2), (5, 3)])
+
+    def test_match_prefers_suffix_then_longest_alias(self):
+        self.assertEqual(gazetteer.match("Simulated (Msaken)"), self.ids["Msaken"])
+        self.assertEqual(gazetteer.match("12, Av. X, Hammam Sousse (Akouda)"), self.ids["Akouda"])
+        self.assertEqual(gazetteer.match("3 Rue Y, Cité Riadh, 4000 Sousse"), self.ids["Sousse Riadh"])
+        self.assertEqual(gazetteer.match("8 Rue Z, Hammam Sousse"), self.ids["Hammam Sousse"])
+        self.assertIsNone(gazetteer.match("Unknown place"))
+        self.assertEqual(gazetteer.resolve("Unknown place"), self.ids["Sousse Ville"])
+
+    def test_trajet_resolves_districts_on_write(self):
+        v = VehiculeAutonome.objects.create(plaque_immatriculation="241 TU 9", type_vehicule="Bus", energie_utilisee="Électrique")
+        t = Trajet.objects.create(vehicule=v, origine="Simulated (Kondar)", destination="5 Rue, Sahloul", duree=10, economie_co2=1)
+        self.assertEqual(t.district_origine_id, self.ids["Kondar"])
+        self.assertEqual(t.district_destination_id, self.ids["Sousse Jawhara"])
+
+    def test_edited_place_is_resolved_again(self):
+        v = VehiculeAutonome.objects.create(plaque_immatriculation="241 TU 9", type_vehicule="Bus", energie_utilisee="Électrique")
+        t = Trajet.objects.create(vehicule=v, origine="Simulated (Kondar)", destination="5 Rue, Sahloul", duree=10, economie_co2=1)
+        response = self.client.patch(reverse('trajet-detail', args=[t.pk]), {'destination': "Simulated (Msaken)"},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        t = Trajet.objects.get()
+        self.assertEqual((t.district_origine_id, t.district_destination_id), (self.ids["Kondar"], self.ids["Msaken"]))
+
+        t.origine = "Simulated (Akouda)"
+        t.save(update_fields=['origine'])
+        self.assertEqual(Trajet.objects.get().district_origine_id, self.ids["Akouda"])
+
+
+class DistrictRegistryTests(TestCase):
+    def setUp(self):
+        reload_registry()
+
+    def test_points_in_polygon(self):
+        square = [(0, 0), (0, 1), (1, 1), (1, 0)]
+        mask = points_in_polygon(np.array([0.5, 1.5, 0.2]), np.array([0.5, 0.5, 0.9]), square)
+        self.assertEqual(mask.tolist(), [True, False, True])
+
+    def test_locate_agrees_with_nearest_centroid(self):
+        reg = registry()
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(35.6, 36.2, 500)
+        lons = rng.uniform(10.25, 10.7, 500)
+        centroids = np.array([(d.latitude, d.longitude) for d in reg.districts])
+        nearest = ((lats[:, None] - centroids[:, 0]) ** 2 + (lons[:, None] - centroids[:, 1]) ** 2).argmin(axis=1)
+        expected = np.array([d.id for d in reg.districts])[nearest]
+        # Seeded contours are Voronoi cells, so both must agree (up to float noise on edges)
+        self.assertGreaterEqual((reg.locate(lats, lons) == expected).mean(), 0.99)
+
+    def test_bulk_create_derives_quartier(self):
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        Capteur.objects.bulk_create([
+            Capteur(type_capteur="trafic", latitude=35.7301, longitude=10.5802, statut="actif",
+                    date_installation=date(2025, 1, 1), proprietaire=owner),
+        ])
+        capteur = Capteur.objects.get()
+        self.assertEqual(capteur.quartier, "Msaken")
+        self.assertEqual(capteur.district.nom, "Msaken")
+
+    def test_sensors_without_districts_loaded(self):
+        District.objects.all().delete()
+        reload_registry()
+        self.addCleanup(reload_registry)
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        Capteur.objects.create(type_capteur="trafic", latitude=35.825, longitude=10.635, statut="actif",
+                               date_installation=date(2025, 1, 1), proprietaire=owner)
+        Capteur.objects.bulk_create([
+            Capteur(type_capteur="trafic", latitude=35.7301, longitude=10.5802, statut="actif",
+                    date_installation=date(2025, 1, 1), proprietaire=owner),
+        ])
+        self.assertEqual(list(Capteur.objects.values_list('district', flat=True)), [None, None])
+
+    def test_moved_sensor_changes_district(self):
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        capteur = Capteur.objects.create(type_capteur="trafic", latitude=35.825, longitude=10.635, statut="actif",
+                                         date_installation=date(2025, 1, 1), proprietaire=owner)
+        self.assertEqual(capteur.quartier, "Sousse Ville")
+        response = self.client.patch(reverse('capteur-detail', args=[capteur.pk]),
+                                     {'latitude': '35.7301', 'longitude': '10.5802'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        capteur = Capteur.objects.get()
+        self.assertEqual((capteur.quartier, capteur.district.nom), ("Msaken", "Msaken"))
+
+        capteur.latitude, capteur.longitude = 35.825, 10.635
+        capteur.save(update_fields=['latitude', 'longitude'])
+        self.assertEqual(Capteur.objects.get().quartier, "Sousse Ville")
+        capteur.statut = "hors_service"
+        capteur.save()  # Same place: the district stays
+        self.assertEqual(Capteur.objects.get().quartier, "Sousse Ville")
+
+
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        reload_registry()
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        for statut in ("actif", "actif", "hors_service"):
+            Capteur.objects.create(type_capteur="trafic", latitude=35.7301, longitude=10.5802, statut=statut,
+                                   date_installation=date(2025, 1, 1), proprietaire=owner)
+
+    def test_snapshot_aggregates(self):
+        payload = self.client.get(reverse('dashboard-snapshot')).json()
+        self.assertEqual(payload['kpis']['capteurs_actifs'], 2)
+        self.assertEqual(payload['kpis']['capteurs_total'], 3)
+        self.assertEqual(payload['zones'], [
+            {'quartier': 'Msaken', 'total': 3, 'actif': 2, 'en_maintenance': 0, 'hors_service': 1, 'taux_panne': 0.3333},
+        ])
+        self.assertEqual(len(payload['carte']['capteurs']['id']), 3)
+
+    def test_snapshot_is_cached_until_data_changes(self):
+        url = reverse('dashboard-snapshot')
+        first = self.client.get(url).json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), first)
+
+        capteur = Capteur.objects.filter(statut="hors_service").get()
+        capteur.statut = "actif"
+        capteur.save()
+        self.assertEqual(self.client.get(url).json()['kpis']['capteurs_actifs'], 3)
+
+        self.client.delete(reverse('capteur-detail', args=[capteur.pk]))
+        self.assertEqual(self.client.get(url).json()['kpis']['capteurs_total'], 2)
+
+
+class CachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+
+    def test_list_is_cached_until_a_write(self):
+        url = reverse('proprietaire-list')
+        self.assertEqual(len(self.client.get(url).json()), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get(url).json()), 1)
+
+        Proprietaire.objects.create(nom="Privé", type_proprietaire="privé", adresse="-", telephone="-", email="p@x.tn")
+        self.assertEqual(len(self.client.get(url).json()), 2)
+        self.owner.delete()
+        self.assertEqual(len(self.client.get(url).json()), 1)
+
+    def test_bulk_paths_bump_versions(self):
+        before = caching.versions([Capteur])
+        Capteur.objects.bulk_create([
+            Capteur(type_capteur="trafic", latitude=35.73, longitude=10.58, statut="actif",
+                    date_installation=date(2025, 1, 1), proprietaire=self.owner),
+        ])
+        self.assertNotEqual(caching.versions([Capteur]), before)
+
+        with caching.invalidation_paused(Proprietaire):
+            before = caching.versions([Proprietaire])
+            Proprietaire.objects.create(nom="X", type_proprietaire="privé", adresse="-", telephone="-", email="x@x.tn")
+            self.assertEqual(caching.versions([Proprietaire]), before)
+            # The pause is per thread: a concurrent request's write still invalidates
+            thread = threading.Thread(target=lambda: caching._on_write(Proprietaire))
+            thread.start()
+            thread.join()
+            self.assertNotEqual(caching.versions([Proprietaire]), before)
+            before = caching.versions([Proprietaire])
+        self.assertNotEqual(caching.versions([Proprietaire]), before)
+
+    def test_bulk_deleted_tables_keep_fast_deletes(self):
+        capteur = Capteur.objects.create(type_capteur="qualité_air", latitude=35.73, longitude=10.58, statut="actif",
+                                         date_installation=date(2025, 1, 1), proprietaire=self.owner)
+        mesure = lambda: Mesure.objects.create(capteur=capteur, polluant='pm25', date=timezone.now(), valeur=10.0)
+        mesure(), mesure()
+        with self.assertNumQueries(1):
+            Mesure.objects.filter(capteur=capteur).delete()
+
+        mesure()
+        before = caching.versions([Mesure])
+        self.owner.delete()  # Cascades to the sensor's readings, bumped by the owner's receiver
+        self.assertNotEqual(caching.versions([Mesure]), before)
+
+    def test_single_flight(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 42
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(caching.get_or_compute('sf-test', compute)))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [42] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_nested_computes_do_not_deadlock(self):
+        # The outer result reads 100 other keys while its own lock is held (like the snapshot reading the cube)
+        def outer():
+            return sum(caching.get_or_compute(f'nested-{i}', lambda i=i: i) for i in range(100))
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(caching.get_or_compute('nested-outer', outer)), daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results, [4950])
+        self.assertEqual(caching._key_locks, {})
+
+
+class ContentNegotiationTests(TestCase):
+    def setUp(self):
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        for i in range(5):
+            Capteur.objects.create(type_capteur="trafic", latitude=35.7301 + i / 1000, longitude=10.5802, statut="actif",
+                                   date_installation=date(2025, 1, 1), proprietaire=owner)
+
+    def test_decimals_are_numbers(self):
+        row = self.client.get(reverse('capteur-list')).json()[0]
+        self.assertIsInstance(row['latitude'], float)
+
+    def test_columnar_json(self):
+        plain = self.client.get(reverse('capteur-list')).json()
+        response = self.client.get(reverse('capteur-list'), HTTP_ACCEPT='application/vnd.smartcity.columnar+json')
+        payload = response.json()
+        self.assertEqual(payload['columns'], list(plain[0]))
+        self.assertEqual(payload['rows'], [list(row.values()) for row in plain])
+        # Non-list payloads are left as they are
+        self.assertEqual(renderers.to_columns({'a': 1}), {'a': 1})
+
+    @unittest.skipIf(renderers.msgpack is None, "msgpack not installed")
+    def test_msgpack(self):
+        response = self.client.get(reverse('capteur-list'), {'format': 'msgpack'})
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        payload = renderers.msgpack.unpackb(response.content)
+        self.assertEqual(len(payload['rows']), 5)
+
+    def test_gzip_when_accepted(self):
+        response = self.client.get(reverse('capteur-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 5)
+        self.assertFalse(self.client.get(reverse('capteur-list')).has_header('Content-Encoding'))
+
+
+class JobQueueTests(TestCase):
+    def test_simulate_async_queues_a_job(self):
+        response = self.client.post(reverse('simulate-step') + '?async=1&steps=3')
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(pk=response.json()['job'])
+        self.assertEqual((job.type_job, job.statut, job.parametres), ('simulation', 'en_attente', {'steps': 3}))
+
+        jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.statut, 'termine')
+        self.assertEqual(job.progression, 1.0)
+        self.assertEqual(job.resultat['steps'], 3)
+
+    def test_submit_validates_parameters(self):
+        url = reverse('job-list')
+        response = self.client.post(url, {'type_job': 'rapport', 'parametres': {'workers': 1, 'x': 1}}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {'type_job': 'rapport', 'parametres': {'workers': 1}}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['statut'], 'en_attente')
+
+    def test_api_refuses_generation(self):
+        response = self.client.post(reverse('job-list'), {'type_job': 'generation', 'parametres': {'rows': 10}}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('type_job', response.json())
+        self.assertFalse(Job.objects.exists())
+
+        call_command('generate_test_data', '--async', '--rows', '10', stdout=io.StringIO())
+        job = Job.objects.get()
+        self.assertEqual((job.type_job, job.statut, job.parametres['rows']), ('generation', 'en_attente', 10))
+
+    def test_cancellation(self):
+        pending = jobs.submit('simulation')
+        self.client.post(reverse('job-annuler', args=[pending.pk]))
+        pending.refresh_from_db()
+        self.assertEqual(pending.statut, 'annule')
+
+        running = jobs.submit('simulation', {'steps': 2})
+        self.assertEqual(jobs.claim('test').pk, running.pk)
+        jobs.cancel(running)
+        self.assertEqual(jobs.run(running), 'annule')
+        self.assertIsNone(jobs.claim('test'))
+
+    def test_generation_runs_alone(self):
+        simulation = jobs.submit('simulation')
+        generation = jobs.submit('generation', {'rows': 10})
+        later = jobs.submit('simulation')
+        self.assertEqual(jobs.claim('w1').pk, simulation.pk)
+        self.assertIsNone(jobs.claim('w2'))  # generation waits, and holds back the later job
+        jobs.run(simulation)
+        self.assertEqual(jobs.claim('w2').pk, generation.pk)
+        self.assertIsNone(jobs.claim('w3'))
+        Job.objects.filter(pk=generation.pk).update(statut='termine')
+        self.assertEqual(jobs.claim('w3').pk, later.pk)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        LEADERBOARD.invalidate()
+        self.citoyens = [
+            Citoyen.objects.create(nom=f"C{i}", adresse="-", telephone="-", email=f"c{i}@x.tn",
+                                   score_ecologique=score, preferences_mobilite="Vélo")
+            for i, score in enumerate([50, 80, 80, 20, 95])
+        ]
+
+    def test_fenwick_prefix_sums(self):
+        counts = np.random.default_rng(0).integers(0, 5, 200)
+        tree = FenwickTree(counts)
+        tree.add(17, 3)
+        counts[17] += 3
+        for slot in (0, 17, 99, 199):
+            self.assertEqual(tree.prefix(slot), counts[:slot + 1].sum())
+
+    def test_rank_and_leaderboard(self):
+        payload = self.client.get(reverse('citoyen-leaderboard') + '?top=3').json()
+        self.assertEqual(payload['total'], 5)
+        self.assertEqual([(r['score_ecologique'], r['rang']) for r in payload['classement']], [(95, 1), (80, 2), (80, 2)])
+        rank = self.client.get(reverse('citoyen-rank', args=[self.citoyens[0].pk])).json()
+        self.assertEqual(rank['rang'], 4)
+
+    def test_ranks_follow_score_changes(self):
+        self.assertEqual(LEADERBOARD.rank(self.citoyens[3]), 5)
+        with self.assertNumQueries(1):  # The save only: the tree is updated in place
+            self.citoyens[3].score_ecologique = 90
+            self.citoyens[3].save()
+        self.assertEqual(LEADERBOARD.rank(self.citoyens[3]), 2)
+        self.assertEqual(LEADERBOARD.rank(self.citoyens[1]), 3)
+
+        # Writes without signals are picked up through the cache version
+        Citoyen.objects.filter(pk=self.citoyens[0].pk).update(score_ecologique=100)
+        caching.bump(Citoyen)
+        self.assertEqual(LEADERBOARD.rank_of_score(100), 1)
+        self.citoyens[4].delete()
+        self.assertEqual(LEADERBOARD.total(), 4)
+
+
+class ScoringTests(TestCase):
+    def setUp(self):
+        self.velo = Citoyen.objects.create(nom="A", adresse="-", telephone="-", email="a@x.tn",
+                                           score_ecologique=0, preferences_mobilite='["VELO", "Bus"]')
+        self.voiture = Citoyen.objects.create(nom="B", adresse="-", telephone="-", email="b@x.tn",
+                                              score_ecologique=7, preferences_mobilite="Voiture Thermique")
+        self.consultation = Consultation.objects.create(titre="Pistes cyclables", date_debut=date(2025, 1, 1),
+                                                        date_fin=date(2025, 2, 1), statut="ouverte")
+
+    def test_mobility_points(self):
+        points = scoring.mobility_points(pd.Series(["Marche à pied", "vélo", "Véhicule électrique", "voiture", None]))
+        self.assertEqual(points.tolist(), [15, 10, 5, 0, 0])
+
+    def test_only_flagged_citizens_are_recomputed(self):
+        self.assertEqual(scoring.compute_scores(), {'citoyens': 2, 'modifies': 2, 'duree_s': ANY})
+        self.assertEqual(Citoyen.objects.get(pk=self.velo.pk).score_ecologique, 10)
+        self.assertEqual(Citoyen.objects.get(pk=self.voiture.pk).score_ecologique, 0)
+        self.assertEqual(scoring.compute_scores()['citoyens'], 0)
+
+        participation = Participation.objects.create(citoyen=self.voiture, consultation=self.consultation)
+        self.assertEqual(scoring.compute_scores()['citoyens'], 1)
+        self.assertEqual(Citoyen.objects.get(pk=self.voiture.pk).score_ecologique, scoring.PARTICIPATION_BONUS)
+        self.assertEqual(LEADERBOARD.rank_of_score(scoring.PARTICIPATION_BONUS), 1)
+
+        participation.delete()
+        scoring.compute_scores()
+        self.assertEqual(Citoyen.objects.get(pk=self.voiture.pk).score_ecologique, 0)
+
+
+class ParticipationIngestTests(TestCase):
+    def setUp(self):
+        self.consultation = Consultation.objects.create(titre="Budget participatif", date_debut=date(2025, 1, 1),
+                                                        date_fin=date(2025, 2, 1), statut="ouverte")
+        self.citoyens = Citoyen.objects.bulk_create([
+            Citoyen(nom=f"C{i}", adresse="-", telephone="-", email=f"c{i}@x.tn", preferences_mobilite="Vélo", score_perime=False)
+            for i in range(30)
+        ])
+
+    def bulk(self, payload):
+        return self.client.post(reverse('participation-bulk'), payload, content_type='application/json')
+
+    def test_bulk_is_idempotent_and_keeps_counters(self):
+        pairs = [{'citoyen': str(c.pk), 'consultation': str(self.consultation.pk)} for c in self.citoyens[:20]]
+        response = self.bulk(pairs + pairs[:5])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'recues': 20, 'creees': 20, 'existantes': 0})
+
+        response = self.bulk({'consultation': str(self.consultation.pk), 'citoyens': [str(c.pk) for c in self.citoyens[10:]]})
+        self.assertEqual(response.json(), {'recues': 20, 'creees': 10, 'existantes': 10})
+        self.assertEqual(Participation.objects.count(), 30)
+        self.assertEqual(Citoyen.objects.filter(score_perime=True).count(), 30)
+
+        url = reverse('consultation-detail', args=[self.consultation.pk])
+        self.assertEqual(self.client.get(url).json()['nb_participants'], 30)
+        Participation.objects.first().delete()
+        self.assertEqual(self.client.get(url).json()['nb_participants'], 29)
+
+    def test_bulk_rejects_unknown_ids(self):
+        response = self.bulk([{'citoyen': str(uuid.uuid4()), 'consultation': str(self.consultation.pk)}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('citoyen', response.json())
+        self.assertEqual(self.bulk([{'citoyen': 'x'}]).status_code, 400)
+        self.assertEqual(Participation.objects.count(), 0)
+
+    def test_single_create_updates_counter(self):
+        response = self.client.post(reverse('participation-list'), {
+            'citoyen': str(self.citoyens[0].pk), 'consultation': str(self.consultation.pk),
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.consultation.refresh_from_db()
+        self.assertEqual(self.consultation.nb_participants, 1)
+        response = self.client.post(reverse('participation-list'), {
+            'citoyen': str(self.citoyens[0].pk), 'consultation': str(self.consultation.pk),
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleting_a_citizen_updates_counter(self):
+        other = Consultation.objects.create(titre="Plan vélo", date_debut=date(2025, 1, 1), date_fin=date(2025, 2, 1), statut="ouverte")
+        participations.ingest({(c.pk, k.pk) for c in self.citoyens[:3] for k in (self.consultation, other)})
+        self.citoyens[0].delete()
+        Citoyen.objects.filter(pk=self.citoyens[1].pk).delete()
+        for consultation in (self.consultation, other):
+            consultation.refresh_from_db()
+            self.assertEqual(consultation.nb_participants, 1)
+
+
+class AirQualityTests(TestCase):
+    def setUp(self):
+        reload_registry()
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        self.msaken, self.centre = Capteur.objects.bulk_create([
+            Capteur(type_capteur="qualité_air", latitude=lat, longitude=lon, statut="actif",
+                    date_installation=date(2025, 1, 1), proprietaire=owner)
+            for lat, lon in ((35.7301, 10.5802), (35.825, 10.635))
+        ])
+        self.now = timezone.make_aware(datetime(2025, 6, 1, 12, 0))
+
+    def test_sub_index_breakpoints(self):
+        self.assertEqual(aqi.sub_index('pm25', [0, 9.0, 12.0, 35.4, 35.5, 500, np.nan])[:-1].tolist(), [0, 50, 56, 100, 101, 500])
+        self.assertTrue(np.isnan(aqi.sub_index('pm25', [np.nan])[0]))
+        self.assertEqual(aqi.sub_index('no2', [53, 54, 100.9]).tolist(), [50, 51, 100])
+        index, dominant = aqi.combine({'pm25': np.array([12.0, np.nan]), 'pm10': np.array([200.0, np.nan]),
+                                       'o3': np.array([np.nan, np.nan]), 'no2': np.array([10.0, np.nan])})
+        self.assertEqual((index[0], dominant[0]), (123, 'pm10'))
+        self.assertTrue(np.isnan(index[1]))
+
+    def test_rolling_windows_per_sensor_and_district(self):
+        Mesure.objects.bulk_create([
+            Mesure(capteur=self.msaken, polluant='pm25', date=self.now - timedelta(hours=h), valeur=v)
+            for h, v in ((0, 20.0), (10, 40.0), (30, 500.0))  # The 30 h old reading is outside the 24 h window
+        ] + [
+            Mesure(capteur=self.msaken, polluant='no2', date=self.now - timedelta(hours=2), valeur=900.0),  # Outside 1 h
+            Mesure(capteur=self.centre, polluant='o3', date=self.now, valeur=60.0),
+        ])
+        capteurs = self.client.get(reverse('qualite-air') + '?par=capteur').json()
+        self.assertEqual(capteurs['date'], self.now.isoformat())
+        by_id = dict(zip(capteurs['id'], zip(capteurs['pm25'], capteurs['no2'], capteurs['aqi'], capteurs['dominant'])))
+        self.assertEqual(by_id[str(self.msaken.pk)], (30.0, None, 90, 'pm25'))
+        self.assertEqual(by_id[str(self.centre.pk)], (None, None, 67, 'o3'))
+
+        quartiers = self.client.get(reverse('qualite-air')).json()['quartiers']
+        self.assertEqual([(q['quartier'], q['aqi']) for q in quartiers], [('Msaken', 90), ('Sousse Ville', 67)])
+        self.assertEqual(self.client.get(reverse('dashboard-snapshot')).json()['qualite_air'][0]['quartier'], 'Msaken')
+
+    def test_simulation_step_records_readings(self):
+        Capteur.objects.filter(pk=self.centre.pk).update(statut='hors_service')
+        with mock.patch('random.random', return_value=0.99):  # No status change during the step
+            summary = simulation.run_step()
+        self.assertEqual(summary['mesures'], len(aqi.POLLUANTS))  # Active sensors only
+        self.assertEqual([q['quartier'] for q in aqi.indices_quartiers()['quartiers']], ['Msaken'])
+
+
+class HeatmapTests(TestCase):
+    def setUp(self):
+        reload_registry()
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        self.capteurs = Capteur.objects.bulk_create([
+            Capteur(type_capteur="qualité_air", latitude=lat, longitude=lon, statut="actif",
+                    date_installation=date(2025, 1, 1), proprietaire=owner)
+            for lat, lon in ((35.825, 10.635), (35.825, 10.655))
+        ])
+        now = timezone.now()
+        Mesure.objects.bulk_create([
+            Mesure(capteur=c, polluant='pm25', date=now, valeur=v) for c, v in zip(self.capteurs, (5.0, 100.0))
+        ])
+
+    def test_idw_interpolation(self):
+        interp = heatmap.Interpolator(np.array([[35.0, 10.0], [35.0, 10.01]]), np.array([0.0, 100.0]))
+        values = interp.evaluate(np.array([35.0, 35.0, 35.0, 36.0]), np.array([10.0, 10.005, 10.01, 10.0]))
+        np.testing.assert_allclose(values[:3], [0.0, 50.0, 100.0], atol=1e-3)
+        self.assertTrue(np.isnan(values[3]))  # Beyond MAX_DISTANCE_KM of every sensor
+
+        # The NumPy fallback finds the same neighbours as the KD-tree
+        interp.tree = None
+        np.testing.assert_allclose(interp.evaluate(np.array([35.0]), np.array([10.005])), [50.0], atol=1e-3)
+
+    def test_png_tile(self):
+        url = reverse('heatmap-tile', args=['qualite_air', 12, 2169, 1610])  # Covers Sousse Ville
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        with self.assertNumQueries(0):  # Cached until the data changes
+            self.assertEqual(self.client.get(url).content, response.content)
+        Mesure.objects.create(capteur=self.capteurs[0], polluant='pm25', date=timezone.now(), valeur=200.0)
+        self.assertNotEqual(self.client.get(url).content, response.content)
+
+        self.assertEqual(self.client.get(reverse('heatmap-tile', args=['bruit', 12, 0, 0])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('heatmap-tile', args=['qualite_air', 3, 0, 0])).status_code, 404)
+
+    def test_value_grid(self):
+        grid = self.client.get(reverse('heatmap-grid', args=['qualite_air']) + '?taille=32').json()
+        values = [v for row in grid['valeurs'] for v in row if v is not None]
+        self.assertEqual(len(grid['valeurs']), 32)
+        low, high = aqi.sub_index('pm25', [5.0, 100.0])
+        self.assertTrue(values and low <= min(values) < max(values) <= high)  # Between the two sensors' AQI
+
+
+class AnomalyDetectionTests(TestCase):
+    def setUp(self):
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        self.capteur = Capteur.objects.create(type_capteur="qualité_air", latitude=35.825, longitude=10.635, statut="actif",
+                                              date_installation=date(2025, 1, 1), proprietaire=owner)
+        self.start = timezone.make_aware(datetime(2025, 6, 1))
+
+    def _readings(self, valeurs, minutes=1):
+        Mesure.objects.bulk_create([
+            Mesure(capteur=self.capteur, polluant='pm25', date=self.start + timedelta(minutes=minutes * i), valeur=v)
+            for i, v in enumerate(valeurs)
+        ])
+
+    def test_spike_and_drift(self):
+        rng = np.random.default_rng(0)
+        stream = anomalies.Stream(from_start=True)
+        self._readings((20 + rng.normal(0, 1, 100)).tolist() + [60.0])
+        stream.poll()
+        alerte = Alerte.objects.get()
+        self.assertEqual((alerte.type_alerte, alerte.polluant, alerte.valeur), ('pic', 'pm25', 60.0))
+        self.assertGreater(alerte.score, anomalies.Z_SEUIL)
+
+        # A slow ramp: no single reading is a spike, the CUSUM catches it
+        Alerte.objects.all().delete()
+        self.start += timedelta(hours=2)
+        self._readings((20 + np.linspace(0, 4, 40) + rng.normal(0, 1, 40)).tolist(), minutes=30)
+        stream.poll()
+        self.assertIn('derive', set(Alerte.objects.values_list('type_alerte', flat=True)))
+
+    def test_flapping_sensor_and_cooldown(self):
+        stream = anomalies.Stream()
+        for statut in ['hors_service', 'actif'] * 5:
+            self.capteur.statut = statut
+            self.capteur.save()
+        self.assertEqual(EvenementStatut.objects.filter(capteur=self.capteur).count(), 10)
+        self.assertEqual(stream.poll(), (10, 1))  # One alert for the burst, then the cooldown
+        response = self.client.get(reverse('alerte-list') + '?type_alerte=instabilite&acquittee=0').json()
+        alerte = response['results'][0] if isinstance(response, dict) else response[0]
+        self.assertEqual(alerte['capteur'], str(self.capteur.pk))
+        self.client.post(reverse('alerte-acquitter', args=[alerte['id']]))
+        self.assertTrue(Alerte.objects.get().acquittee)
+
+    def test_batches_with_repeated_sensors_match_row_by_row(self):
+        values = np.random.default_rng(1).normal(50, 5, 60)
+        batch, single = anomalies.Detector(), anomalies.Detector()
+        dates = [self.start + timedelta(minutes=i) for i in range(60)]
+        batch.process_readings([self.capteur.pk] * 60, ['no2'] * 60, dates, values)
+        for d, v in zip(dates, values):
+            single.process_readings([self.capteur.pk], ['no2'], [d], [v])
+        np.testing.assert_allclose(batch.mean, single.mean)
+        np.testing.assert_allclose(batch.var, single.var)
+
+
+class RuleEngineTests(TestCase):
+    def setUp(self):
+        reload_registry()
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        self.air = Capteur.objects.create(type_capteur="qualité_air", latitude=35.825, longitude=10.635, statut="actif",
+                                          date_installation=date(2025, 1, 1), proprietaire=owner)
+        self.trafic = Capteur.objects.bulk_create([
+            Capteur(type_capteur="trafic", latitude=35.825, longitude=10.635, statut="actif",
+                    date_installation=date(2025, 1, 1), proprietaire=owner)
+            for _ in range(4)
+        ])
+        self.ville = self.air.district_id
+        self.now = timezone.now()
+
+    def _poll(self, stream):
+        stream.poll()
+        alerts = list(Alerte.objects.filter(type_alerte='regle').values_list('regle__nom', flat=True))
+        Alerte.objects.all().delete()
+        return sorted(alerts)
+
+    def test_reading_thresholds_and_windows(self):
+        for nom, operateur, seuil, district in (('pm25>50', '>', 50, None), ('pm25>=80 ville', '>=', 80, self.ville),
+                                                ('pm25>100', '>', 100, None), ('pm25<5', '<', 5, None)):
+            RegleAlerte.objects.create(nom=nom, type_regle='mesure', polluant='pm25', operateur=operateur, seuil=seuil,
+                                       district_id=district, delai_minutes=0)
+        RegleAlerte.objects.create(nom='moyenne no2', type_regle='mesure', polluant='no2', seuil=100, fenetre_minutes=30)
+        RegleAlerte.objects.create(nom='msaken', type_regle='mesure', polluant='pm25', seuil=0,
+                                   district=District.objects.get(nom='Msaken'))
+        stream = anomalies.Stream(engine=rules.Engine())
+        Mesure.objects.bulk_create([
+            Mesure(capteur=self.air, polluant='pm25', date=self.now, valeur=80.0),
+            Mesure(capteur=self.air, polluant='o3', date=self.now, valeur=500.0),
+        ] + [
+            Mesure(capteur=self.air, polluant='no2', date=self.now + timedelta(minutes=m), valeur=v)
+            for m, v in ((0, 90.0), (10, 130.0), (50, 60.0))  # Means: 90, 110, then 95 (the first reading left the window)
+        ])
+        self.assertEqual(self._poll(stream), ['moyenne no2', 'pm25>50', 'pm25>=80 ville'])
+
+    def test_status_share_is_raised_once_per_episode(self):
+        RegleAlerte.objects.create(nom='trafic hs', type_regle='statut', type_capteur='trafic', statut='hors_service',
+                                   operateur='>=', seuil=30, delai_minutes=0)
+        stream = anomalies.Stream(engine=rules.Engine())
+        found = []
+        for capteur, statut in ((0, 'hors_service'), (1, 'hors_service'), (2, 'hors_service'),
+                                (0, 'actif'), (1, 'actif'), (1, 'hors_service')):
+            self.trafic[capteur].statut = statut
+            self.trafic[capteur].save()
+            found.append(len(self._poll(stream)))
+        # 25% -> 50% (alert) -> 75% -> 50% -> 25% (cleared) -> 50% (alert again)
+        self.assertEqual(found, [0, 1, 0, 0, 0, 1])
+
+    def test_silence_and_intervention_costs(self):
+        RegleAlerte.objects.create(nom='trafic muet', type_regle='silence', type_capteur='trafic', fenetre_minutes=10)
+        RegleAlerte.objects.create(nom='cher', type_regle='intervention', seuil=400)
+        RegleAlerte.objects.create(nom='budget', type_regle='intervention', seuil=1000, fenetre_minutes=60)
+        stream = anomalies.Stream(engine=rules.Engine())
+        EvenementStatut.objects.create(capteur=self.trafic[0], date=self.now, ancien_statut='actif', nouveau_statut='actif')
+        self.assertEqual(self._poll(stream), [])
+        Mesure.objects.create(capteur=self.air, polluant='pm25', date=self.now + timedelta(minutes=15), valeur=10.0)
+        self.assertEqual(self._poll(stream), ['trafic muet'] * 4)
+        self.assertEqual(self._poll(stream), [])  # Once per silence
+
+        Intervention.objects.bulk_create([
+            Intervention(capteur=self.trafic[0], date_heure=self.now + timedelta(minutes=m), type_intervention='corrective',
+                         duree=60, cout=cout, impact_co2=1)
+            for m, cout in ((16, 300), (17, 450), (18, 300))
+        ])
+        self.assertEqual(self._poll(stream), ['budget', 'cher'])
+
+    def test_rules_are_validated_and_recompiled(self):
+        url = reverse('reglealerte-list')
+        self.assertEqual(self.client.post(url, {'nom': 'x', 'type_regle': 'statut', 'seuil': 30}, 'application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'nom': 'x', 'type_regle': 'mesure', 'seuil': 30}, 'application/json').status_code, 400)
+        engine = rules.Engine()
+        response = self.client.post(url, {'nom': 'pm', 'type_regle': 'mesure', 'polluant': 'pm25', 'seuil': 30}, 'application/json')
+        self.assertEqual(response.status_code, 201)
+        engine.refresh()
+        self.assertEqual(list(engine.index.thresholds), [('pm25', '', None)])
+
+
+class MaintenanceCubeTests(TestCase):
+    def setUp(self):
+        reload_registry()
+        self.owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        self.air = Capteur.objects.create(type_capteur="qualité_air", latitude=35.825, longitude=10.635, statut="actif",
+                                          date_installation=date(2025, 1, 1), proprietaire=self.owner)
+        self.trafic = Capteur.objects.create(type_capteur="trafic", latitude=35.70, longitude=10.65, statut="actif",
+                                             date_installation=date(2025, 1, 1), proprietaire=self.owner)
+        self.tech = Technicien.objects.create(nom="Ali")
+
+    def _intervention(self, capteur, jour, type_intervention='prédictive', cout=100):
+        return Intervention(capteur=capteur, date_heure=datetime(2025, 1, jour, 10, tzinfo=dt_timezone.utc),
+                            type_intervention=type_intervention, duree=30, cout=cout, impact_co2=2)
+
+    def _cells(self):
+        return sorted(CubeIntervention.objects.values_list(*cube.KEY_FIELDS, *cube.MESURES))
+
+    def test_incremental_maintenance_matches_a_rebuild(self):
+        first, second = Intervention.objects.bulk_create([self._intervention(self.air, 3), self._intervention(self.trafic, 3, 'curative', 50)])
+        third = self._intervention(self.air, 20, cout=70)
+        third.save()
+        InterventionTechnicien.objects.bulk_create([InterventionTechnicien(intervention=first, technicien=self.tech, role='intervenant')])
+        link = InterventionTechnicien.objects.create(intervention=third, technicien=self.tech, role='validateur')
+        third.cout = 90
+        third.date_heure += timedelta(days=20)  # Moves to February
+        third.save()
+        second.delete()
+        link.delete()
+        incremental = self._cells()
+        cube.rebuild()
+        self.assertEqual(incremental, self._cells())
+        self.assertEqual(CubeIntervention.objects.filter(cuboide='detail', granularite='mois').count(), 2)  # January and February
+
+    def test_single_row_path_matches_pandas(self):
+        first, second = Intervention.objects.bulk_create([self._intervention(self.air, 31), self._intervention(self.trafic, 3, 'curative', 50)])
+        InterventionTechnicien.objects.bulk_create([InterventionTechnicien(intervention=first, technicien=self.tech, role='intervenant')])
+        ids = [first.pk, second.pk]
+        rows = cube.cells(ids)
+        with mock.patch.object(cube, 'ROW_PATH_MAX', 0):
+            self.assertEqual(rows, cube.cells(ids))
+
+        first.cout = 120
+        # Cells before and after (intervention, links), the save, one lookup and one update of the cells, 4 savepoint queries
+        with self.assertNumQueries(11):
+            first.save()
+        self.assertEqual(cube.query(filters={'type_intervention': ['prédictive']})['total']['cout'], 120.0)
+
+    def test_saves_without_cube_changes_skip_it(self):
+        intervention = Intervention.objects.bulk_create([self._intervention(self.air, 3)])[0]
+        link = InterventionTechnicien.objects.bulk_create([
+            InterventionTechnicien(intervention=intervention, technicien=self.tech, role='intervenant')
+        ])[0]
+        with self.assertNumQueries(1):
+            intervention.save()
+        link.role = 'validateur'
+        with self.assertNumQueries(1):
+            link.save()
+        loaded = Intervention.objects.get(pk=intervention.pk)
+        loaded.cout = 80
+        loaded.save()
+        with self.assertNumQueries(1):
+            loaded.save()  # Already merged
+        self.assertEqual(cube.query()['total']['cout'], 80.0)
+        self.assertEqual(cube.query(group_by=('technicien',))['total']['cout'], 80.0)
+
+    def test_cascaded_deletes_leave_the_cube_exact(self):
+        first, _, third = Intervention.objects.bulk_create([
+            self._intervention(self.air, 3), self._intervention(self.air, 4, cout=50),
+            self._intervention(self.trafic, 5, 'curative', 30),
+        ])
+        other = Technicien.objects.create(nom="Sami")
+        InterventionTechnicien.objects.bulk_create([
+            InterventionTechnicien(intervention=first, technicien=self.tech, role='intervenant'),
+            InterventionTechnicien(intervention=third, technicien=other, role='intervenant'),
+        ])
+        url = reverse('analytics-interventions')
+        self.assertEqual(self.client.delete(reverse('capteur-detail', args=[self.air.pk])).status_code, 204)
+        self.assertEqual(cube.query()['total'], {'nombre': 1, 'cout': 30.0, 'duree': 30, 'impact_co2': 2.0})
+        other.delete()
+        self.assertEqual(self.client.get(url, {'group_by': 'technicien'}).json()['lignes'], [])
+        incremental = self._cells()
+        cube.rebuild()
+        self.assertEqual(incremental, self._cells())
+
+        self.owner.delete()  # Cascades to the remaining sensor
+        self.assertEqual(cube.query()['total']['nombre'], 0)
+        self.assertFalse(CubeIntervention.objects.exists())
+
+    def test_group_by_and_filters(self):
+        Intervention.objects.bulk_create([
+            self._intervention(self.air, 3), self._intervention(self.air, 4, cout=50),
+            self._intervention(self.trafic, 4, 'curative', 30),
+        ])
+        url = reverse('analytics-interventions')
+        by_type = self.client.get(url, {'group_by': 'mois,type_intervention'}).json()
+        self.assertEqual(by_type['granularite'], 'mois')
+        self.assertEqual([(l['mois'], l['type_intervention'], l['nombre'], l['cout']) for l in by_type['lignes']],
+                         [('2025-01-01', 'curative', 1, 30.0), ('2025-01-01', 'prédictive', 2, 150.0)])
+        quartier = registry().by_id[self.air.district_id].nom
+        daily = self.client.get(url, {'group_by': 'jour', 'filter': [f'quartier:{quartier}', 'type_intervention:prédictive']}).json()
+        self.assertEqual([(l['jour'], l['cout']) for l in daily['lignes']], [('2025-01-03', 100.0), ('2025-01-04', 50.0)])
+        window = self.client.get(url, {'debut': '2025-01-04', 'fin': '2025-01-05'}).json()
+        self.assertEqual((window['granularite'], window['total']['nombre']), ('jour', 2))
+        self.assertEqual(self.client.get(url, {'group_by': 'heure'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'filter': 'quartier:Atlantide'}).status_code, 400)
+
+
+class OwnerReportTests(TestCase):
+    def test_monthly_availability_sla_and_costs(self):
+        owner = Proprietaire.objects.create(nom="Privé SA", type_proprietaire="privé", adresse="-", telephone="-", email="p@x.tn")
+        a = Capteur.objects.create(type_capteur="trafic", latitude=35.825, longitude=10.635, statut="actif",
+                                   date_installation=date(2024, 12, 1), proprietaire=owner)
+        Capteur.objects.create(type_capteur="trafic", latitude=35.825, longitude=10.635, statut="hors_service",
+                               date_installation=date(2025, 2, 1), proprietaire=owner)
+        utc = dt_timezone.utc
+        # Three days out of service in January (SLA: 24 h for private owners)
+        for jour, ancien, nouveau in ((10, 'actif', 'hors_service'), (12, 'hors_service', 'en_maintenance'), (13, 'en_maintenance', 'actif')):
+            EvenementStatut.objects.create(capteur=a, date=datetime(2025, 1, jour, tzinfo=utc), ancien_statut=ancien, nouveau_statut=nouveau)
+        Intervention.objects.create(capteur=a, date_heure=datetime(2025, 1, 11, tzinfo=utc), type_intervention='curative',
+                                    duree=90, cout=200, impact_co2=4)
+
+        with tempfile.TemporaryDirectory() as dossier, mock.patch.object(reports, 'READ_BATCH', 2):
+            summary = reports.run(date(2025, 1, 1), date(2025, 4, 1), dossier=dossier)
+            self.assertTrue(os.path.exists(summary['csv']))
+            self.assertEqual(len(pd.read_csv(summary['csv'])), 3)
+        rows = list(RapportProprietaire.objects.filter(proprietaire=owner).order_by('mois').values_list(
+            'nb_capteurs', 'disponibilite', 'heures_indisponibilite', 'violations_sla', 'changements_statut', 'nb_interventions'))
+        self.assertEqual(rows, [(1, 90.32, 72.0, 1, 3, 1), (2, 50.0, 672.0, 1, 0, 0), (2, 50.0, 744.0, 0, 0, 0)])
+
+        response = self.client.get(reverse('rapportproprietaire-list'), {'proprietaire': str(owner.pk), 'mois': '2025-01'})
+        self.assertEqual([r['cout_interventions'] for r in response.json()], [200.0])
+
+
+class ImportDataTests(TestCase):
+    def setUp(self):
+        reload_registry()
+        self.owner = Proprietaire.objects.create(nom="Mairie de Sousse", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+
+    def write(self, name, rows):
+        path = os.path.join(self.dossier.name, name)
+        pd.DataFrame(rows).to_csv(path, index=False)
+        return path
+
+    def test_sensor_inventory_with_rejects(self):
+        path = self.write('capteurs.csv', [
+            {'type_capteur': 'trafic', 'latitude': 35.7301, 'longitude': 10.5802, 'statut': 'actif',
+             'date_installation': '2025-01-01', 'proprietaire': 'mairie de sousse'},
+            {'type_capteur': 'énergie', 'latitude': 35.73, 'longitude': 10.58, 'statut': 'hors_service',
+             'date_installation': '2025-02-01', 'proprietaire': str(self.owner.pk)},
+            {'type_capteur': 'radar', 'latitude': 35.73, 'longitude': 10.58, 'statut': 'actif',
+             'date_installation': '2025-01-01', 'proprietaire': str(self.owner.pk)},
+            {'type_capteur': 'trafic', 'latitude': 'nord', 'longitude': 10.58, 'statut': 'actif',
+             'date_installation': '2025-01-01', 'proprietaire': str(self.owner.pk)},
+            {'type_capteur': 'trafic', 'latitude': 35.73, 'longitude': 10.58, 'statut': 'actif',
+             'date_installation': '2025-01-01', 'proprietaire': 'Inconnu'},
+        ])
+        summary = imports.load(path, 'capteurs', batch_size=2)
+        self.assertEqual((summary['lues'], summary['importees'], summary['rejetees']), (5, 2, 3))
+        self.assertEqual(set(Capteur.objects.values_list('proprietaire', 'district')), {(self.owner.pk, registry().locate([35.73], [10.58])[0])})
+        rejets = pd.read_csv(summary['rejets'])
+        self.assertEqual(list(zip(rejets['ligne'], rejets['erreur'])), [
+            (3, 'type_capteur invalide'), (4, 'latitude invalide'), (5, 'proprietaire inconnu ou ambigu'),
+        ])
+
+    def test_interrupted_history_import_resumes(self):
+        capteur = Capteur.objects.create(type_capteur="trafic", latitude=35.73, longitude=10.58, statut="actif",
+                                         date_installation=date(2025, 1, 1), proprietaire=self.owner)
+        path = self.write('interventions.csv', [
+            {'capteur': str(capteur.pk), 'date_heure': f'2025-03-0{i + 1}T08:00:00+01:00',
+             'type_intervention': 'curative', 'duree': 60, 'cout': 100.5, 'impact_co2': 2}
+            for i in range(5)
+        ] + [{'capteur': uuid.uuid4().hex, 'date_heure': '2025-03-01T08:00:00', 'type_intervention': 'curative',
+              'duree': 60, 'cout': 1, 'impact_co2': 1}])
+
+        def crash(lues, *args):
+            if lues == 4:
+                raise KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            imports.load(path, 'interventions', batch_size=2, progress=crash)
+        self.assertEqual(Intervention.objects.count(), 4)
+        self.assertEqual(imports.checkpoint(path).lues, 4)
+
+        summary = imports.load(path, 'interventions', batch_size=2, resume=True)
+        self.assertEqual((summary['lues'], summary['importees'], summary['rejetees']), (6, 5, 1))
+        self.assertIsNone(imports.checkpoint(path))
+        self.assertEqual(Intervention.objects.count(), 5)
+        self.assertEqual(Intervention.objects.aggregate(Min('date_heure'))['date_heure__min'],
+                         datetime(2025, 3, 1, 7, tzinfo=dt_timezone.utc))
+        self.assertEqual(cube.query()['total']['cout'], 502.5)
+
+    def test_batch_and_checkpoint_commit_together(self):
+        capteur = Capteur.objects.create(type_capteur="trafic", latitude=35.73, longitude=10.58, statut="actif",
+                                         date_installation=date(2025, 1, 1), proprietaire=self.owner)
+        path = self.write('interventions.csv', [
+            {'capteur': str(capteur.pk), 'date_heure': f'2025-03-0{i + 1}T08:00:00', 'type_intervention': 'curative',
+             'duree': 60, 'cout': 10, 'impact_co2': 1}
+            for i in range(4)
+        ])
+        save = RepriseImport.save
+        calls = []
+
+        def crash_on_second_batch(state, *args, **kwargs):
+            calls.append(state.lues)
+            if len(calls) == 2:
+                raise KeyboardInterrupt  # After the batch's rows went in, before its commit
+            return save(state, *args, **kwargs)
+        with mock.patch.object(RepriseImport, 'save', crash_on_second_batch), self.assertRaises(KeyboardInterrupt):
+            imports.load(path, 'interventions', batch_size=2)
+        self.assertEqual(Intervention.objects.count(), 2)
+        self.assertEqual(imports.checkpoint(path).lues, 2)
+
+        summary = imports.load(path, 'interventions', batch_size=2, resume=True)
+        self.assertEqual((summary['lues'], summary['importees']), (4, 4))
+        self.assertEqual(Intervention.objects.count(), 4)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        self.capteur = Capteur.objects.create(type_capteur="trafic", latitude=35.825, longitude=10.635, statut="actif",
+                                              date_installation=date(2024, 1, 1), proprietaire=owner)
+        self.vehicule = VehiculeAutonome.objects.create(plaque_immatriculation="245 TU 1", type_vehicule="Bus", energie_utilisee="Électrique")
+        tech = Technicien.objects.create(nom="Ali")
+        utc = dt_timezone.utc
+        for jour in (3, 3, 20):
+            Trajet.objects.create(vehicule=self.vehicule, origine="A", destination="B", economie_co2=2,
+                                  date_depart=datetime(2024, 6, jour, 8, tzinfo=utc), duree=30)
+        Trajet.objects.create(vehicule=self.vehicule, origine="A", destination="B", economie_co2=5,
+                              date_depart=datetime(2025, 2, 1, 8, tzinfo=utc), duree=10)
+        for mois in (3, 5, 9):
+            intervention = Intervention.objects.create(capteur=self.capteur, date_heure=datetime(2024, mois, 2, tzinfo=utc),
+                                                       type_intervention='curative', duree=60, cout=100, impact_co2=1)
+            InterventionTechnicien.objects.create(intervention=intervention, technicien=tech, role='intervenant')
+        for jour, ancien, nouveau in ((1, 'actif', 'hors_service'), (5, 'hors_service', 'actif')):
+            EvenementStatut.objects.create(capteur=self.capteur, date=datetime(2024, 4, jour, tzinfo=utc),
+                                           ancien_statut=ancien, nouveau_statut=nouveau)
+
+    def archive(self, nom):
+        # Mid-month limits are rounded down: everything before 2024-09-01 goes
+        return retention.archive(nom, limite=datetime(2024, 9, 17, tzinfo=dt_timezone.utc), batch_size=2,
+                                 dossier=self.dossier.name)
+
+    def test_archived_trips_still_count_in_rollups(self):
+        before = self.client.get(reverse('trajet-journalier')).json()
+        co2 = snapshot.kpis()['economie_co2']
+        summary = self.archive('trajet')
+        self.assertEqual((summary['lignes'], summary['fichiers']), (3, 2))
+        self.assertEqual(Trajet.objects.count(), 1)
+        files = sorted(glob.glob(os.path.join(self.dossier.name, 'trajet', '2024-06', '*.csv.gz')))
+        self.assertEqual(sum(len(pd.read_csv(f)) for f in files), 3)
+
+        self.assertEqual(self.client.get(reverse('trajet-journalier')).json(), before)
+        self.assertEqual(snapshot.kpis()['economie_co2'], co2)
+        rows = self.client.get(reverse('trajet-journalier'), {'from': '2024-06-03', 'to': '2024-06-03',
+                                                              'vehicule': str(self.vehicule.pk)}).json()
+        self.assertEqual([(r['jour'], r['trajets'], r['economie_co2']) for r in rows], [('2024-06-03', 2, 4.0)])
+
+    def test_cube_and_reports_keep_archived_interventions(self):
+        self.assertEqual(self.archive('intervention')['lignes'], 2)
+        self.assertEqual(InterventionTechnicien.objects.count(), 1)
+        self.assertEqual(len(glob.glob(os.path.join(self.dossier.name, 'interventiontechnicien', '*', '*.csv.gz'))), 1)
+        cube.rebuild()
+        self.assertEqual(cube.query()['total']['nombre'], 3)
+        self.assertEqual(retention.horizon(Intervention), datetime(2024, 9, 1, tzinfo=dt_timezone.utc))
+        with self.assertRaises(ValueError):
+            reports.run(date(2024, 5, 1), date(2024, 10, 1), dossier=self.dossier.name)
+
+    def test_latest_status_event_before_the_limit_is_kept(self):
+        self.assertEqual(self.archive('evenementstatut')['lignes'], 1)
+        self.assertEqual(list(EvenementStatut.objects.values_list('nouveau_statut', flat=True)), ['actif'])
+        self.assertEqual(self.archive('evenementstatut')['lignes'], 0)
+        self.assertIn('pages_liberees', retention.maintain([EvenementStatut._meta.db_table]))
+
+
+class BatchSimulationTests(TestCase):
+    def setUp(self):
+        reload_registry()
+        owner = Proprietaire.objects.create(nom="Mairie", type_proprietaire="municipalité", adresse="-", telephone="-", email="m@x.tn")
+        Capteur.objects.bulk_create([
+            Capteur(type_capteur="trafic", latitude=35.7301, longitude=10.5802, statut="actif",
+                    date_installation=date(2025, 1, 1), proprietaire=owner)
+            for _ in range(50)
+        ])
+        VehiculeAutonome.objects.create(plaque_immatriculation="245 TU 1234", type_vehicule="Navette", energie_utilisee="Électrique")
+
+    def test_run_writes_history_on_the_simulated_clock(self):
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        response = self.client.post(reverse('simulate-run') + '?steps=720&dt=1h&seed=1&start=2025-01-01T00:00:00')
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertGreater(summary['evenements'], 0)
+        self.assertGreater(summary['trajets'], 0)
+        end = start + timedelta(hours=720)
+        self.assertEqual(HorlogeSimulation.courante().instant, end)
+
+        self.assertEqual(EvenementStatut.objects.count(), summary['evenements'])
+        dates = EvenementStatut.objects.aggregate(a=Min('date'), b=Max('date'))
+        self.assertTrue(start <= dates['a'] and dates['b'] < end)
+        trajet = Trajet.objects.order_by('-date_depart').first()
+        self.assertTrue(start <= trajet.date_depart < end)
+        self.assertEqual(trajet.date_arrivee, trajet.date_depart + timedelta(minutes=trajet.duree))
+
+        # The final statuses are the last event of each sensor
+        for capteur in Capteur.objects.filter(evenements__isnull=False).distinct()[:10]:
+            self.assertEqual(capteur.statut, capteur.evenements.order_by('-date').first().nouveau_statut)
+
+    def test_parameters_are_validated(self):
+        url = reverse('simulate-run')
+        self.assertEqual(self.client.post(url + '?dt=soon').status_code, 400)
+        self.assertEqual(self.client.post(url + '?steps=0').status_code, 400)
+        self.assertEqual(simulation.parse_dt('15m'), 15)
+        self.assertEqual(simulation.parse_dt('1d'), 1440)
+
+    def test_async_run_is_an_exclusive_job(self):
+        response = self.client.post(reverse('simulate-run') + '?async=1&steps=24&dt=1h&seed=3')
+        self.assertEqual(response.status_code, 202)
+        jobs.work(once=True)
+        job = Job.objects.get(pk=response.json()['job'])
+        self.assertEqual(job.statut, 'termine')
+        self.assertEqual(job.resultat['steps'], 24)
+
+
+class BenchmarkCompareTests(TestCase):
+    def test_flags_only_regressions_beyond_threshold(self):
+        baseline = {'meta': {}, 'sizes': {'1000': {
+            'list': {'capteurs': {'p50_ms': 40.0, 'rps': 25.0, 'bytes': 5}, 'districts': {'p50_ms': 1.0, 'max_ms': 1.0}},
+            'seed_s': 2.0,
+        }}, 'load': {'total': {'n': 500, 'p95_ms': 80.0, 'rps': 50.0}}}
+        current = {'meta': {}, 'sizes': {'1000': {
+            'list': {'capteurs': {'p50_ms': 52.0, 'rps': 18.0, 'bytes': 50}, 'districts': {'p50_ms': 2.0, 'max_ms': 9.0}},
+            'seed_s': 2.1,
+        }}, 'load': {'total': {'n': 400, 'p95_ms': 120.0, 'rps': 35.0}}}
+        regressions = {r['metric'] for r in bench.compare(current, baseline, threshold=0.2)}
+        self.assertEqual(regressions, {
+            'sizes.1000.list.capteurs.p50_ms', 'load.total.p95_ms', 'load.total.rps',
+        })
+        self.assertEqual(bench.compare(current, baseline, threshold=0.5), [])
+
+    def test_startup_defers_heavy_libraries(self):
+        audit = bench.startup(top=None)
+        api_packages = {name for name, _ in audit['manage']['top']}
+        self.assertIn('rest_framework', api_packages)
+        self.assertNotIn('pandas', api_packages)
+        dashboard_packages = {name for name, _ in audit['dashboard']['top']}
+        self.assertIn('streamlit', dashboard_packages)
+        self.assertFalse(dashboard_packages & {'pandas', 'folium', 'streamlit_folium'})
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        METRICS.reset()
+        cache.clear()  # Cached responses would run no query
+
+    def test_server_timing_header_splits_phases(self):
+        response = self.client.get(reverse('district-list'))
+        timing = response['Server-Timing']
+        for phase in ('db;dur=', 'app;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(phase, timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn(f'desc="{len(response.content)} bytes"', timing)
+
+    def test_metrics_endpoint_exposes_route_histograms(self):
+        self.client.get(reverse('district-list'))
+        self.client.get(reverse('district-list'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('smartcity_http_request_duration_seconds_count{route="district-list",method="GET",status="200"} 2', text)
+        self.assertIn('smartcity_http_request_duration_seconds_bucket{route="district-list",method="GET",status="200",le="+Inf"} 2', text)
+        self.assertIn('smartcity_db_queries_total{route="district-list"', text)
+
+    def test_profile_header_dumps_cprofile(self):
+        with tempfile.TemporaryDirectory() as tmp, self.settings(PROFILING_ENABLED=True, PROFILE_DIR=tmp):
+            response = self.client.get(reverse('district-list'), HTTP_X_PROFILE='cprofile')
+            self.assertTrue(os.path.exists(os.path.join(tmp, response['X-Profile-File'])))
+        self.assertNotIn('X-Profile-File', self.client.get(reverse('district-list')))
+
+
+class DashboardMetricsTests(TestCase):
+    RECORDS = [
+        {'fragment': 'map', 'total_s': 1.0, 'fetch_s': 0.5, 'transform_s': 0.1, 'render_s': 0.4, 'payload_bytes': 2048},
+        {'fragment': 'map', 'total_s': 3.0, 'fetch_s': 1.5, 'transform_s': 0.3, 'render_s': 1.2, 'payload_bytes': 0},
+        {'fragment': 'metrics', 'total_s': 0.2, 'fetch_s': 0.2},
+    ]
+
+    def test_summarize_per_fragment_slowest_first(self):
+        rows = dashboard_metrics.summarize(self.RECORDS)
+        self.assertEqual(rows, [
+            {'fragment': 'map', 'runs': 2, 'p50_s': 2.0, 'p95_s': 3.0,
+             'fetch_s': 1.0, 'transform_s': 0.2, 'render_s': 0.8, 'payload_kb': 1.0},
+            {'fragment': 'metrics', 'runs': 1, 'p50_s': 0.2, 'p95_s': 0.2,
+             'fetch_s': 0.2, 'transform_s': 0.0, 'render_s': 0.0, 'payload_kb': 0.0},
+        ])
+        self.assertEqual(dashboard_metrics.summarize([]), [])
+
+    def test_instrument_splits_phases_and_logs(self):
+        def fragment():
+            with dashboard_metrics.fetching():  # 1.0 -> 3.0
+                dashboard_metrics.record_payload(100)
+            dashboard_metrics.phase("render")  # 3.5
+            return "ok"
+
+        records = []
+        with tempfile.TemporaryDirectory() as tmp:
+            log = os.path.join(tmp, 'metrics.jsonl')
+            clock = iter([0.0, 1.0, 3.0, 3.5, 4.0, 4.0])
+            with mock.patch.object(dashboard_metrics, 'LOG_PATH', log), \
+                    mock.patch.object(dashboard_metrics.time, 'perf_counter', lambda: next(clock)):
+                self.assertEqual(dashboard_metrics.instrument("map", records.append)(fragment)(), "ok")
+            with open(log, 'a', encoding='utf-8') as f:
+                f.write("not json\n")
+            logged = dashboard_metrics.load_log(log)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(logged, records)
+        record = records[0]
+        self.assertEqual((record['fetch_s'], record['transform_s'], record['render_s'], record['total_s']), (2.0, 1.5, 0.5, 4.0))
+        self.assertEqual((record['requests'], record['payload_bytes']), (1, 100))
+        dashboard_metrics.phase("render")  # Outside a fragment: no-op
+
+
+class DashboardClientTests(TestCase):
+    class Session:
+        """Stands in for requests.Session: each GET blocks until released."""
+        def __init__(self, error=None):
+            self.calls = []
+            self.release = threading.Event()
+            self.error = error
+
+        def get(self, url, params=None, timeout=None):
+            self.calls.append((url, params))
+            self.release.wait(5)
+            if self.error:
+                raise self.error
+            return mock.Mock(content=b'{}', url=url)
+
+    def concurrent_gets(self, fake, n=5, params=None):
+        results = [None] * n
+
+        def call(i):
+            try:
+                results[i] = dashboard_client.get("dashboard/snapshot/", params=params)
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+        with mock.patch.object(dashboard_client, 'session', return_value=fake):
+            for t in threads:
+                t.start()
+            deadline = time.monotonic() + 5
+            while not fake.calls and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)  # The other callers find the call in flight and wait on it
+            fake.release.set()
+            for t in threads:
+                t.join(5)
+        return results
+
+    def test_concurrent_identical_gets_share_one_call(self):
+        fake = self.Session()
+        results = self.concurrent_gets(fake)
+        self.assertEqual(fake.calls, [(dashboard_client.API_URL + "dashboard/snapshot/", None)])
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(dashboard_client._inflight, {})
+
+        fake.calls.clear()
+        with mock.patch.object(dashboard_client, 'session', return_value=fake):
+            dashboard_client.get("dashboard/snapshot/")  # Finished calls are not reused
+            dashboard_client.get("dashboard/snapshot/", params={'a': 1})
+        self.assertEqual(len(fake.calls), 2)
+
+    def test_error_reaches_every_waiter(self):
+        fake = self.Session(error=requests.ConnectionError("refused"))
+        results = self.concurrent_gets(fake, n=3)
+        self.assertEqual(len(fake.calls), 1)
+        self.assertTrue(all(isinstance(r, requests.ConnectionError) for r in results))
+        self.assertEqual(dashboard_client._inflight, {})
+
+    def test_fetch_many_runs_calls_in_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)  # Broken unless both calls run at once
+        fragment = contextvars.ContextVar('fragment', default=None)
+        fragment.set('analytics')
+
+        def call(n):
+            barrier.wait()
+            return n, fragment.get()
+        self.assertEqual(dashboard_client.fetch_many([lambda: call(1), lambda: call(2)]),
+                         [(1, 'analytics'), (2, 'analytics')])
 
-# Create your tests here.
+        fake = self.Session(error=requests.ConnectionError("refused"))
+        fake.release.set()
+        with mock.patch.object(dashboard_client, 'session', return_value=fake):
+            with self.assertRaises(requests.ConnectionError):
+                dashboard_client.fetch_many(["dashboard/snapshot/", lambda: 1])
@@ -1,9 +1,10 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from .views import (
     ProprietaireViewSet, CapteurViewSet, TechnicienViewSet, 
-    InterventionViewSet, CitoyenViewSet, ConsultationViewSet, 
-    VehiculeAutonomeViewSet, TrajetViewSet, simulate_step
+    InterventionViewSet, CitoyenViewSet, ConsultationViewSet, ParticipationViewSet,
+    VehiculeAutonomeViewSet, TrajetViewSet, DistrictViewSet, JobViewSet, AlerteViewSet, RegleAlerteViewSet, RapportProprietaireViewSet, simulate_step, simulate_run, qualite_air, heatmap_png, heatmap_values,
+    analytics_interventions, dashboard_snapshot, metrics
 )
 
 router = DefaultRouter()
@@ -13,10 +14,24 @@ router.register(r'techniciens', TechnicienViewSet)
 router.register(r'interventions', InterventionViewSet)
 router.register(r'citoyens', CitoyenViewSet)
 router.register(r'consultations', ConsultationViewSet)
+router.register(r'participations', ParticipationViewSet)
 router.register(r'vehicules', VehiculeAutonomeViewSet)
 router.register(r'trajets', TrajetViewSet)
+router.register(r'districts', DistrictViewSet)
+router.register(r'jobs', JobViewSet)
+router.register(r'alertes', AlerteViewSet)
+router.register(r'regles', RegleAlerteViewSet)
+router.register(r'rapports', RapportProprietaireViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('simulate/', simulate_step, name='simulate-step'),
+    re_path(r'^simulate/run/?$', simulate_run, name='simulate-run'),
+    path('qualite-air/', qualite_air, name='qualite-air'),
+    path('heatmap/<str:layer>/', heatmap_values, name='heatmap-grid'),
+    path('heatmap/<str:layer>/<int:z>/<int:x>/<int:y>.png', heatmap_png, name='heatmap-tile'),
+    path('heatmap/<str:layer>/<int:z>/<int:x>/<int:y>.json', heatmap_values, name='heatmap-values'),
+    path('analytics/interventions/', analytics_interventions, name='analytics-interventions'),
+    path('dashboard/snapshot/', dashboard_snapshot, name='dashboard-snapshot'),
+    path('_metrics', metrics, name='metrics'),
 ]
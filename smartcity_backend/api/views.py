@@ -1,115 +1,390 @@
-from rest_framework import viewsets
+import uuid
+from datetime import datetime, time, timedelta
+
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import mixins, status, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action, api_view
+from rest_framework.response import Response
 from .models import (
     Proprietaire, Capteur, Technicien, Intervention, 
-    Citoyen, Consultation, VehiculeAutonome, Trajet
+    Citoyen, Consultation, VehiculeAutonome, Trajet, District,
+    InterventionTechnicien, Participation, PositionVehicule, Job, Alerte, RegleAlerte, RapportProprietaire,
+    TrajetJournalier,
 )
 from .serializers import (
     ProprietaireSerializer, CapteurSerializer, TechnicienSerializer, 
     InterventionSerializer, CitoyenSerializer, ConsultationSerializer, 
-    VehiculeAutonomeSerializer, TrajetSerializer
+    VehiculeAutonomeSerializer, TrajetSerializer, DistrictSerializer, JobSerializer,
+    ParticipationSerializer, AlerteSerializer, RegleAlerteSerializer, RapportProprietaireSerializer
 )
+from . import aqi, cube, fleet, heatmap, jobs, participations, simulation, snapshot
+from .caching import CachedViewSetMixin
+from .leaderboard import LEADERBOARD, TOP_DEFAULT, TOP_MAX
+from smartcity_backend.instrumentation import METRICS
+
+class DistrictViewSet(CachedViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = District.objects.order_by('pk')
+    serializer_class = DistrictSerializer
 
-class ProprietaireViewSet(viewsets.ModelViewSet):
+class ProprietaireViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
     queryset = Proprietaire.objects.all()
     serializer_class = ProprietaireSerializer
 
-class CapteurViewSet(viewsets.ModelViewSet):
+class CapteurViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
     queryset = Capteur.objects.all()
     serializer_class = CapteurSerializer
 
-class TechnicienViewSet(viewsets.ModelViewSet):
+class TechnicienViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
     queryset = Technicien.objects.all()
     serializer_class = TechnicienSerializer
 
-class InterventionViewSet(viewsets.ModelViewSet):
+class InterventionViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
     queryset = Intervention.objects.all()
     serializer_class = InterventionSerializer
+    cache_models = (Technicien, InterventionTechnicien)  # Nested techniciens
 
-class CitoyenViewSet(viewsets.ModelViewSet):
+class CitoyenViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
     queryset = Citoyen.objects.all()
     serializer_class = CitoyenSerializer
+    cache_models = (Participation,)  # score_perime
 
-class ConsultationViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def leaderboard(self, request):
+        """?top=N best eco scores with their rank (ties share a rank)."""
+        try:
+            top = int(request.query_params.get('top', TOP_DEFAULT))
+        except ValueError:
+            raise ValidationError({'top': "Entier attendu."})
+        top = min(max(top, 1), TOP_MAX)
+        return Response({'total': LEADERBOARD.total(), 'classement': LEADERBOARD.top(top)})
+
+    @action(detail=True, methods=['get'])
+    def rank(self, request, pk=None):
+        citoyen = self.get_object()
+        return Response({
+            'id_citoyen': citoyen.pk,
+            'score_ecologique': citoyen.score_ecologique,
+            'rang': LEADERBOARD.rank(citoyen),
+            'total': LEADERBOARD.total(),
+        })
+
+class ConsultationViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
     queryset = Consultation.objects.all()
     serializer_class = ConsultationSerializer
+    cache_models = (Participation,)  # nb_participants
+
+class ParticipationViewSet(CachedViewSetMixin, mixins.CreateModelMixin, mixins.ListModelMixin,
+                           mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Participations. ?consultation=<id> / ?citoyen=<id> filter the list; POST /bulk/ ingests many at once."""
+    queryset = Participation.objects.order_by('pk')
+    serializer_class = ParticipationSerializer
 
-class VehiculeAutonomeViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for name in ('consultation', 'citoyen'):
+            value = self.request.query_params.get(name)
+            if value:
+                queryset = queryset.filter(**{name: value})
+        return queryset
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Idempotent upsert of up to MAX_PAIRS pairs: [{"citoyen": id, "consultation": id}, ...]
+        or {"consultation": id, "citoyens": [ids]}. Pairs already recorded are skipped.
+        """
+        try:
+            result = participations.ingest(participations.parse_pairs(request.data))
+        except participations.IngestError as e:
+            raise ValidationError(e.errors)
+        return Response(result, status=status.HTTP_201_CREATED if result['creees'] else status.HTTP_200_OK)
+
+class VehiculeAutonomeViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
     queryset = VehiculeAutonome.objects.all()
     serializer_class = VehiculeAutonomeSerializer
 
-class TrajetViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def positions(self, request):
+        # Column-oriented payload: one array per field instead of one object per vehicle
+        return self.cached_response(fleet.positions_payload, models=(VehiculeAutonome, PositionVehicule))
+
+def parse_time_bound(value, name, end=False):
+    """Parses a ?from=/?to= bound: ISO datetime, or a plain date (a 'to' date includes the whole day)."""
+    try:
+        d = parse_date(value)
+        dt = datetime.combine(d + timedelta(days=1) if end else d, time.min) if d else parse_datetime(value)
+    except ValueError:
+        dt = None
+    if dt is None:
+        raise ValidationError({name: f"Date invalide: {value!r} (ISO 8601 attendu)."})
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+class TrajetViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
+    """
+    Trips. The list (and /journalier/) accept a departure-time window:
+    ?from=<iso>&to=<iso>&vehicule=<uuid>, where 'to' is exclusive.
+    """
     queryset = Trajet.objects.all()
     serializer_class = TrajetSerializer
 
+    def window(self):
+        """(vehicule, start, end) of the request, None when not given."""
+        params = self.request.query_params
+        start = parse_time_bound(params['from'], 'from') if params.get('from') else None
+        end = parse_time_bound(params['to'], 'to', end=True) if params.get('to') else None
+        if start and end and end <= start:
+            raise ValidationError({'to': "Doit être postérieur à from."})
+        vehicule = None
+        if params.get('vehicule'):
+            try:
+                vehicule = uuid.UUID(params['vehicule'])
+            except ValueError:
+                raise ValidationError({'vehicule': "UUID de véhicule invalide."})
+        return vehicule, start, end
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'journalier'):
+            return queryset
+        vehicule, start, end = self.window()
+        if vehicule:
+            queryset = queryset.filter(vehicule_id=vehicule)
+        if start:
+            queryset = queryset.filter(date_depart__gte=start)
+        if end:
+            queryset = queryset.filter(date_depart__lt=end)
+        if start or end:
+            queryset = queryset.order_by('date_depart')
+        return queryset
+
+    def archived_days(self):
+        # Archived trajets only survive as daily totals: a day overlapping the window counts whole
+        vehicule, start, end = self.window()
+        archives = TrajetJournalier.objects.all()
+        if vehicule:
+            archives = archives.filter(vehicule_id=vehicule)
+        if start:
+            archives = archives.filter(jour__gte=timezone.localdate(start))
+        if end:
+            archives = archives.filter(jour__lte=timezone.localdate(end - timedelta(microseconds=1)))
+        return archives
+
+    @action(detail=False, methods=['get'])
+    def journalier(self, request):
+        """Daily CO2 savings and fleet utilization over the requested window."""
+        return self.cached_response(
+            lambda: snapshot.trajets_journaliers(self.get_queryset(), self.archived_days()),
+            models=(Trajet, TrajetJournalier, VehiculeAutonome),
+        )
+
+class AlerteViewSet(CachedViewSetMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Alerts raised by `manage.py detect_anomalies`, latest first. ?capteur=<id>, ?regle=<id>,
+    ?type_alerte=pic|derive|instabilite|regle and ?acquittee=0|1 filter the list.
+    """
+    queryset = Alerte.objects.order_by('-date', '-pk')
+    serializer_class = AlerteSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        if params.get('capteur'):
+            try:
+                queryset = queryset.filter(capteur_id=uuid.UUID(params['capteur']))
+            except ValueError:
+                raise ValidationError({'capteur': "UUID de capteur invalide."})
+        if params.get('type_alerte'):
+            queryset = queryset.filter(type_alerte=params['type_alerte'])
+        if params.get('regle'):
+            if not params['regle'].isdigit():
+                raise ValidationError({'regle': "Identifiant de règle invalide."})
+            queryset = queryset.filter(regle_id=int(params['regle']))
+        if params.get('acquittee'):
+            queryset = queryset.filter(acquittee=params['acquittee'].lower() in ('1', 'true', 'yes'))
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def acquitter(self, request, pk=None):
+        alerte = self.get_object()
+        alerte.acquittee = True
+        alerte.save(update_fields=['acquittee'])
+        return Response(self.get_serializer(alerte).data)
+
+class RegleAlerteViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
+    """Alert rules; the running detector picks up changes at its next poll."""
+    queryset = RegleAlerte.objects.order_by('pk')
+    serializer_class = RegleAlerteSerializer
+
+class RapportProprietaireViewSet(CachedViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Monthly owner reports computed by `manage.py report_owners` (or a 'rapport' job).
+    ?proprietaire=<id> and ?mois=YYYY-MM filter the list.
+    """
+    queryset = RapportProprietaire.objects.order_by('-mois', 'proprietaire_id')
+    serializer_class = RapportProprietaireSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        if params.get('proprietaire'):
+            try:
+                queryset = queryset.filter(proprietaire_id=uuid.UUID(params['proprietaire']))
+            except ValueError:
+                raise ValidationError({'proprietaire': "UUID de propriétaire invalide."})
+        if params.get('mois'):
+            from .reports import parse_mois  # reports loads pandas
+            try:
+                queryset = queryset.filter(mois=parse_mois(params['mois']))
+            except ValueError:
+                raise ValidationError({'mois': "Mois attendu au format AAAA-MM."})
+        return queryset
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Background jobs run by `manage.py run_workers`. POST {"type_job": ..., "parametres": {...}}
+    answers 202 with the job id at once; poll the job for its progression.
+    """
+    queryset = Job.objects.order_by('-date_creation')
+    serializer_class = JobSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = jobs.submit(serializer.validated_data['type_job'], serializer.validated_data.get('parametres'))
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['post'])
+    def annuler(self, request, pk=None):
+        job = self.get_object()
+        jobs.cancel(job)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
 # --- Smart Simulation Logic (Added for On-Demand Button) ---
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from django.utils import timezone
-import random
-import math
-
-DISTRICT_CENTERS = {
-    "Ennfidha": (36.130, 10.380), "Hergla": (36.030, 10.500), "Sidi Bou Ali": (35.950, 10.470),
-    "Kondar": (35.920, 10.300), "Akouda": (35.870, 10.560), "Kalaa Kebira": (35.870, 10.530),
-    "Hammam Sousse": (35.860, 10.590), "Sousse Ville": (35.825, 10.635), "Sousse Jawhara": (35.810, 10.620),
-    "Sousse Riadh": (35.800, 10.600), "Sidi Abdelhamid": (35.800, 10.640), "Kalaa Sghira": (35.820, 10.550),
-    "Zaouia Ksiba Thrayet": (35.780, 10.630), "Msaken": (35.730, 10.580), "Sidi El Heni": (35.670, 10.320),
-}
-
-def get_gaussian_coords(district):
-    if district not in DISTRICT_CENTERS: district = "Sousse Ville"
-    lat, lon = DISTRICT_CENTERS[district]
-    return random.gauss(lat, 0.01), random.gauss(lon, 0.01)
+def request_param(request, name, default=None):
+    """Query string first, then the body."""
+    value = request.query_params.get(name)
+    if value is None and hasattr(request.data, 'get'):
+        value = request.data.get(name)
+    return default if value is None else value
 
 @api_view(['POST'])
 def simulate_step(request):
     """
-    Triggers a 'Time Step' with HIGH INTENSITY.
-    1. Updates ~10-15% of all sensors (Chaos & Repairs).
-    2. Generates Heavy Traffic (10-25 Trips).
-    3. Dispatches Repairs aggressively.
-    """
-    log = []
-    
-    # 1. Update Sensors (Global Flux)
-    sensors = list(Capteur.objects.all())
-    for s in sensors:
-        # 20% chance to change status per sensor (Higher Chaos)
-        if random.random() < 0.20:
-            old = s.statut
-            # Smart Weighting: Make it truly random/dynamic
-            if s.quartier == 'Sousse Ville':
-                # Volatile Center
-                new_s = random.choices(['actif', 'en_maintenance', 'hors_service'], weights=[0.5, 0.25, 0.25])[0]
-            else:
-                new_s = random.choices(['actif', 'en_maintenance', 'hors_service'], weights=[0.6, 0.2, 0.2])[0]
-            
-            if old != new_s:
-                s.statut = new_s
-                s.save()
-
-    # 2. Generate Heavy Traffic
-    vehicles = list(VehiculeAutonome.objects.all())
-    if vehicles:
-        for _ in range(random.randint(10, 25)): # 10 to 25 trips
-            v = random.choice(vehicles)
-            q_start = random.choice(list(DISTRICT_CENTERS.keys()))
-            q_end = random.choice(list(DISTRICT_CENTERS.keys()))
-            
-            Trajet.objects.create(
-                vehicule=v, origine=f"Simulated ({q_start})", destination=f"Simulated ({q_end})",
-                duree=random.randint(10, 60), economie_co2=round(random.uniform(0.5, 5.0), 2)
-            )
-
-    # 3. Auto-Intervention (Aggressive)
-    broken_sensors = Capteur.objects.filter(statut='hors_service')
-    for s in broken_sensors:
-        if random.random() < 0.4: # 40% chance to dispatch fix
-            Intervention.objects.create(
-                capteur=s, date_heure=timezone.now(), type_intervention='corrective',
-                duree=random.randint(60, 180), cout=random.uniform(200, 500), impact_co2=5.5
-            )
-            s.statut = 'en_maintenance'
-            s.save()
+    Triggers a 'Time Step' (see simulation.run_step).
+    With ?async=1 (or "async": true in the body) the step(s) are queued as a job instead
+    and the response is 202 with the job id; ?steps=N queues N steps.
+    """
+    if str(request_param(request, 'async', '')).lower() in ('1', 'true', 'yes'):
+        try:
+            steps = int(request_param(request, 'steps', 1))
+        except (TypeError, ValueError):
+            raise ValidationError({'steps': "Entier attendu."})
+        job = jobs.submit('simulation', {'steps': steps})
+        return Response({"status": "Simulation Queued", "job": str(job.pk)}, status=status.HTTP_202_ACCEPTED)
 
+    simulation.run_step()
     return Response({"status": "Simulation Step Complete", "log": "Intensity High"})
+
+MAX_BATCH_STEPS = 100000
+
+@api_view(['POST'])
+def simulate_run(request):
+    """
+    Accelerated simulation (see simulation.run_batch): advances the simulated clock by
+    ?steps=N steps of ?dt= (15m, 1h, 1d...) in one pass. ?start= moves the clock first,
+    ?seed= makes the run reproducible. With ?async=1 the run is queued as a job (202).
+    """
+    try:
+        steps = int(request_param(request, 'steps', 1))
+    except (TypeError, ValueError):
+        raise ValidationError({'steps': "Entier attendu."})
+    if not 1 <= steps <= MAX_BATCH_STEPS:
+        raise ValidationError({'steps': f"Entre 1 et {MAX_BATCH_STEPS}."})
+    dt = request_param(request, 'dt', '1h')
+    try:
+        dt_minutes = simulation.parse_dt(dt)
+    except ValueError as e:
+        raise ValidationError({'dt': str(e)})
+    start = request_param(request, 'start')
+    start_dt = parse_datetime(start) if start else None
+    if start and start_dt is None:
+        raise ValidationError({'start': "Date ISO 8601 attendue."})
+    if start_dt is not None and timezone.is_naive(start_dt):
+        start_dt = timezone.make_aware(start_dt)
+    seed = request_param(request, 'seed')
+    try:
+        seed = int(seed) if seed is not None else None
+    except (TypeError, ValueError):
+        raise ValidationError({'seed': "Entier attendu."})
+
+    if str(request_param(request, 'async', '')).lower() in ('1', 'true', 'yes'):
+        job = jobs.submit('simulation_batch', {
+            'steps': steps, 'dt': dt_minutes, 'start': start_dt.isoformat() if start_dt else None, 'seed': seed,
+        })
+        return Response({"status": "Simulation Queued", "job": str(job.pk)}, status=status.HTTP_202_ACCEPTED)
+
+    return Response(simulation.run_batch(steps, dt_minutes, start=start_dt, seed=seed))
+
+@api_view(['GET'])
+def qualite_air(request):
+    """
+    AQI per district (?par=capteur: per sensor, column-oriented) from the pollutant
+    readings up to ?date=<iso> (default: the latest reading).
+    """
+    at = parse_time_bound(request.query_params['date'], 'date') if request.query_params.get('date') else None
+    if request.query_params.get('par') == 'capteur':
+        return Response(aqi.indices_capteurs(at))
+    return Response(aqi.indices_quartiers(at))
+
+def _heatmap_layer(layer, z=None):
+    if layer not in heatmap.LAYERS:
+        raise Http404(f"Couche inconnue: {layer} ({', '.join(heatmap.LAYERS)})")
+    if z is not None and not heatmap.MIN_ZOOM <= z <= heatmap.MAX_ZOOM:
+        raise Http404(f"Zoom hors limites ({heatmap.MIN_ZOOM}-{heatmap.MAX_ZOOM})")
+
+def heatmap_png(request, layer, z, x, y):
+    """XYZ tile of an interpolated layer, for a map tile overlay."""
+    _heatmap_layer(layer, z)
+    response = HttpResponse(heatmap.png_tile(layer, z, x, y), content_type='image/png')
+    response['Cache-Control'] = f'public, max-age={heatmap.BROWSER_TTL}'
+    return response
+
+@api_view(['GET'])
+def heatmap_values(request, layer, z=None, x=None, y=None):
+    """Interpolated values: one tile's grid, or the whole governorate (?taille=N cells per side)."""
+    _heatmap_layer(layer, z)
+    if z is not None:
+        return Response(heatmap.value_tile(layer, z, x, y))
+    try:
+        size = min(max(int(request.query_params.get('taille', heatmap.GRID_SIZE)), 8), 512)
+    except ValueError:
+        raise ValidationError({'taille': "Entier attendu."})
+    return Response(heatmap.overview(layer, size))
+
+@api_view(['GET'])
+def analytics_interventions(request):
+    """
+    Maintenance measures (nombre, cout, duree, impact_co2) from the pre-aggregated cube:
+    ?group_by=mois,quartier&filter=type_intervention:prédictive|curative&debut=2025-01-01&fin=2025-07-01
+    """
+    params = request.query_params
+    try:
+        query = cube.parse_query(params.get('group_by', ''), params.getlist('filter'), params.get('debut'), params.get('fin'))
+    except cube.QueryError as e:
+        raise ValidationError(e.errors)
+    return Response(cube.query(**query))
+
+@api_view(['GET'])
+def dashboard_snapshot(request):
+    """KPIs, district matrix, top lists and map points for one dashboard refresh, cached per data version."""
+    return Response(snapshot.get_snapshot())
+
+def metrics(request):
+    """Per-route latency histograms and DB/render counters, in Prometheus text format."""
+    return HttpResponse(METRICS.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
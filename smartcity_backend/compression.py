@@ -0,0 +1,46 @@
+"""
+Response compression.
+
+CompressionMiddleware extends Django's GZipMiddleware: clients whose Accept-Encoding
+lists "br" get brotli when the optional brotli package is installed, everyone else
+gets gzip. Brotli is only used for non-streaming responses; streams fall back to gzip.
+"""
+import re
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+MIN_LENGTH = 200  # Same threshold as GZipMiddleware
+BROTLI_QUALITY = 5  # Good ratio at a per-request CPU cost close to gzip's
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if (
+            brotli is None
+            or response.streaming
+            or not re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        ):
+            return super().process_response(request, response)
+
+        if len(response.content) < MIN_LENGTH or response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # The representation changed: a strong ETag no longer matches it byte for byte
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
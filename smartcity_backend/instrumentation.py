@@ -0,0 +1,204 @@
+"""
+Request-level instrumentation.
+
+RequestProfilingMiddleware times every request and splits it into phases:
+- db: time spent executing SQL (and the number of queries),
+- render: DRF/template rendering of the response body,
+- app: everything else in the view (ORM object building, serialization, logic),
+and reports them in a Server-Timing header. The same numbers are aggregated per
+route into METRICS, exposed in Prometheus text format at /api/_metrics.
+
+Setting an `X-Profile: cprofile` (or `pyinstrument` if installed) request header
+captures a profile of that one request into PROFILE_DIR; PROFILE_SAMPLE_RATE
+profiles a random fraction of requests. Both are honoured only when DEBUG or
+PROFILING_ENABLED is set.
+"""
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteStats:
+    __slots__ = ('buckets', 'count', 'total', 'db_time', 'db_queries', 'render_time', 'bytes')
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.render_time = 0.0
+        self.bytes = 0
+
+
+class MetricsRegistry:
+    """Thread-safe per-(route, method, status) aggregates."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(RouteStats)
+
+    def observe(self, route, method, status, total, db_time, db_queries, render_time, nbytes):
+        with self._lock:
+            stats = self._routes[(route, method, str(status))]
+            stats.count += 1
+            stats.total += total
+            stats.db_time += db_time
+            stats.db_queries += db_queries
+            stats.render_time += render_time
+            stats.bytes += nbytes
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if total <= bound:
+                    stats.buckets[i] += 1
+                    break
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def prometheus_text(self):
+        with self._lock:
+            snapshot = sorted(self._routes.items())
+            lines = [
+                '# HELP smartcity_http_request_duration_seconds Request wall time per route.',
+                '# TYPE smartcity_http_request_duration_seconds histogram',
+            ]
+            for (route, method, status), stats in snapshot:
+                labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += n
+                    lines.append(f'smartcity_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'smartcity_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f'smartcity_http_request_duration_seconds_sum{{{labels}}} {stats.total:.6f}')
+                lines.append(f'smartcity_http_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+            counters = [
+                ('smartcity_db_queries_total', 'SQL queries executed.', 'db_queries', '{}'),
+                ('smartcity_db_time_seconds_total', 'Time spent in SQL.', 'db_time', '{:.6f}'),
+                ('smartcity_render_time_seconds_total', 'Time spent rendering response bodies.', 'render_time', '{:.6f}'),
+                ('smartcity_response_bytes_total', 'Serialized response bytes.', 'bytes', '{}'),
+            ]
+            for name, help_text, attr, fmt in counters:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (route, method, status), stats in snapshot:
+                    labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+                    lines.append(f'{name}{{{labels}}} {fmt.format(getattr(stats, attr))}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class QueryTimer:
+    """connection.execute_wrapper hook accumulating SQL count and time."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+
+
+def _profiling_allowed():
+    return settings.DEBUG or getattr(settings, 'PROFILING_ENABLED', False)
+
+
+def _start_profiler(request):
+    if not _profiling_allowed():
+        return None
+    kind = request.headers.get('X-Profile', '').strip().lower()
+    if not kind and random.random() < getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0):
+        kind = 'cprofile'
+    if kind in ('1', 'true', 'cprofile'):
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return 'cprofile', profiler
+    if kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            return None
+        profiler = Profiler()
+        profiler.start()
+        return 'pyinstrument', profiler
+    return None
+
+
+def _stop_profiler(active, route):
+    kind, profiler = active
+    directory = getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', route)}-{os.getpid()}-{threading.get_ident()}"
+    if kind == 'cprofile':
+        profiler.disable()
+        path = os.path.join(directory, stem + '.prof')
+        profiler.dump_stats(path)  # open with: python -m pstats <file>
+    else:
+        profiler.stop()
+        path = os.path.join(directory, stem + '.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    return path
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._render_time = 0.0
+        timer = QueryTimer()
+        active = _start_profiler(request)
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match.route) if match else 'unresolved'
+        render = request._render_time
+        nbytes = 0 if response.streaming else len(response.content)
+        app = max(total - timer.time - render, 0.0)
+
+        if active:
+            response['X-Profile-File'] = os.path.basename(_stop_profiler(active, route))
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timer.time * 1000:.2f};desc="{timer.count} queries"',
+            f'app;dur={app * 1000:.2f}',
+            f'render;dur={render * 1000:.2f};desc="{nbytes} bytes"',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        METRICS.observe(route, request.method, response.status_code, total, timer.time, timer.count, render, nbytes)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before rendering (DRF Response is a SimpleTemplateResponse)
+        started = time.perf_counter()
+
+        def done(rendered):
+            request._render_time += time.perf_counter() - started
+
+        response.add_post_render_callback(done)
+        return response
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole middleware stack
+    "smartcity_backend.instrumentation.RequestProfilingMiddleware",
+    # gzip, or brotli when installed; right after profiling so metrics count wire bytes
+    "smartcity_backend.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -81,11 +87,76 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # The API, the simulators and the job workers write concurrently: wait for locks.
+        # WAL lets readers run during a write (bulk imports, reports) and commits faster.
+        # auto_vacuum only applies to a new file (see api/retention.py for existing ones).
+        "OPTIONS": {
+            "timeout": 20,
+            "init_command": "PRAGMA auto_vacuum=INCREMENTAL; PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+        },
     }
 }
 
+# Cache for API responses and aggregates (see api/caching.py), picked with SMARTCITY_CACHE:
+# - locmem (default): per process, only right when the API server is the sole writer;
+# - file: shared by every process on the host (server, workers, detector, retention,
+#   simulators); launch.sh, which starts them all, picks it;
+# - redis: a local Redis at SMARTCITY_REDIS_URL.
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "smartcity",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("SMARTCITY_CACHE_DIR", str(BASE_DIR / ".cache")),
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("SMARTCITY_REDIS_URL", "redis://127.0.0.1:6379/1"),
+    },
+}
+CACHES = {"default": CACHE_BACKENDS[os.environ.get("SMARTCITY_CACHE", "locmem")]}
+API_CACHE_TIMEOUT = 60  # Seconds; writes invalidate earlier through model versions
+
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Compact formats are negotiated with Accept (or ?format=columnar / ?format=msgpack),
+# see api/renderers.py; msgpack is offered only when the package is installed.
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "rest_framework.renderers.JSONRenderer",
+        "smartcity_backend.api.renderers.ColumnarJSONRenderer",
+        *(["smartcity_backend.api.renderers.MessagePackRenderer"] if find_spec("msgpack") else []),
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Decimals (coordinates, costs, CO2) are sent as numbers, not strings
+    "COERCE_DECIMAL_TO_STRING": False,
+}
+
+# Request profiling (see instrumentation.py). The X-Profile header and sampling are
+# honoured when DEBUG or PROFILING_ENABLED is on.
+PROFILING_ENABLED = False
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_DIR = BASE_DIR / "profiles"
+
+# Owner reports (CSV/Parquet), see reports.py
+REPORT_DIR = BASE_DIR / "rapports"
+
+# Retention (see api/retention.py): rows older than this many days are moved to gzipped
+# CSV files under ARCHIVE_DIR by `manage.py retention`; a table left out is kept whole.
+RETENTION_DAYS = {
+    "trajet": 365,
+    "intervention": 730,
+    "evenementstatut": 730,
+    "mesure": 90,
+    "alerte": 180,
+    "job": 30,
+}
+ARCHIVE_DIR = BASE_DIR / "archives"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators